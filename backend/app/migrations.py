@@ -116,6 +116,43 @@ def migrate_database():
                 logger.info("✅ reading_articles.translation 列添加成功")
                 migration_count += 1
 
+        # ========== asr_jobs 表迁移 ==========
+        if 'asr_jobs' in existing_tables:
+            if not check_column_exists('asr_jobs', 'audio_sha256'):
+                logger.info("🔧 迁移 #11: 给 asr_jobs 表添加 audio_sha256 列")
+                db.execute(text("ALTER TABLE asr_jobs ADD COLUMN audio_sha256 VARCHAR(64)"))
+                db.execute(text("CREATE INDEX IF NOT EXISTS ix_asr_jobs_audio_sha256 ON asr_jobs (audio_sha256)"))
+                db.commit()
+                logger.info("✅ asr_jobs.audio_sha256 列添加成功")
+                migration_count += 1
+
+        # ========== 音频元数据列 ==========
+        if 'audio_uploads' in existing_tables:
+            for column_name in ('bitrate', 'sample_rate', 'channels'):
+                if not check_column_exists('audio_uploads', column_name):
+                    logger.info(f"🔧 迁移 #12: 给 audio_uploads 表添加 {column_name} 列")
+                    db.execute(text(f"ALTER TABLE audio_uploads ADD COLUMN {column_name} INTEGER"))
+                    db.commit()
+                    logger.info(f"✅ audio_uploads.{column_name} 列添加成功")
+                    migration_count += 1
+
+        if 'listening_articles' in existing_tables:
+            for column_name in ('audio_bitrate', 'audio_sample_rate', 'audio_channels'):
+                if not check_column_exists('listening_articles', column_name):
+                    logger.info(f"🔧 迁移 #13: 给 listening_articles 表添加 {column_name} 列")
+                    db.execute(text(f"ALTER TABLE listening_articles ADD COLUMN {column_name} INTEGER"))
+                    db.commit()
+                    logger.info(f"✅ listening_articles.{column_name} 列添加成功")
+                    migration_count += 1
+
+        # ========== 令牌版本号 ==========
+        if not check_column_exists('users', 'token_version'):
+            logger.info("🔧 迁移 #14: 给 users 表添加 token_version 列")
+            db.execute(text("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"))
+            db.commit()
+            logger.info("✅ users.token_version 列添加成功（旧令牌按版本 0 处理）")
+            migration_count += 1
+
         # ========== 完成迁移 ==========
         if migration_count > 0:
             logger.info(f"🎉 数据库迁移完成！共执行 {migration_count} 项迁移")
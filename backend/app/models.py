@@ -2,7 +2,6 @@ from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Foreign
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime, date
-import bcrypt
 
 Base = declarative_base()
 
@@ -18,6 +17,7 @@ class User(Base):
     email = Column(String(255), unique=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     last_login_at = Column(DateTime)
+    token_version = Column(Integer, default=0, nullable=False)  # 改密码/重置密码时加一，旧令牌随之失效
 
     # 关系
     managed_students = relationship("Student", back_populates="teacher", foreign_keys="Student.teacher_id")
@@ -26,12 +26,27 @@ class User(Base):
     schedules = relationship("Schedule", back_populates="teacher")
 
     def set_password(self, password: str):
-        """设置密码（自动哈希）"""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        """设置密码（自动哈希，同步执行；接口里用 password_hashing.hash_password 放到线程池）"""
+        from app.services.password_hashing import hash_password_sync
+        self.password_hash = hash_password_sync(password)
 
     def verify_password(self, password: str) -> bool:
-        """验证密码"""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        """验证密码（同步执行；接口里用 password_hashing.verify_password 放到线程池）"""
+        from app.services.password_hashing import verify_password_sync
+        return verify_password_sync(password, self.password_hash)
+
+
+class RefreshToken(Base):
+    """刷新令牌表 - 访问令牌只有几分钟有效期，过期后凭刷新令牌换新（每次换新都轮换刷新令牌）"""
+    __tablename__ = "refresh_tokens"
+
+    id = Column(String(32), primary_key=True)  # 令牌的公开部分，客户端拿到的是 "<id>.<secret>"
+    user_id = Column(String(50), ForeignKey("users.id"), nullable=False, index=True)
+    token_hash = Column(String(64), nullable=False)  # secret 的 sha256，数据库里不存明文
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, nullable=True)  # 轮换、登出、改密码、删除用户时设置
+    replaced_by = Column(String(32), nullable=True)  # 轮换后的新令牌 id
 
 
 class Student(Base):
@@ -262,6 +277,9 @@ class ListeningArticle(Base):
     audio_original_filename = Column(String(255), nullable=True)
     audio_mimetype = Column(String(100), nullable=True)
     audio_duration_seconds = Column(Float, nullable=True)
+    audio_bitrate = Column(Integer, nullable=True)      # bps
+    audio_sample_rate = Column(Integer, nullable=True)  # Hz
+    audio_channels = Column(Integer, nullable=True)
 
     asr_raw_result = Column(JSON, nullable=True)  # 腾讯云ASR原始返回，供重新对齐复用，避免重复付费调用
     alignment_status = Column(String(20), default="pending")  # pending / auto_aligned / confirmed
@@ -274,6 +292,91 @@ class ListeningArticle(Base):
     creator = relationship("User", foreign_keys=[created_by])
 
 
+class TranslationCache(Base):
+    """翻译缓存表 - 按段落缓存LLM译文，重新生成/编辑文章时只翻译改动过的段落"""
+    __tablename__ = "translation_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), unique=True, nullable=False, index=True)  # sha256(模型名 + 归一化后的段落原文)
+    model = Column(String(100), nullable=False)
+    source_text = Column(Text, nullable=False)    # 归一化后的英文段落
+    translation = Column(Text, nullable=False)    # 该段落的中文译文
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)  # LRU/TTL 淘汰依据
+
+
+class WordLookupCache(Base):
+    """查词缓存表 - 双击查词结果按 (单词, 所在句子) 缓存，同一篇文章里重复点同一个词不再调用LLM"""
+    __tablename__ = "word_lookup_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), unique=True, nullable=False, index=True)  # sha256(模型名 + 小写单词 + 归一化句子)
+    model = Column(String(100), nullable=False)
+    word = Column(String(100), nullable=False)
+    sentence = Column(Text, nullable=False)
+    meaning = Column(String(255), nullable=False)  # LLM 给出的 "词性. 释义"
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class AudioUpload(Base):
+    """听力课音频上传索引 - 按内容哈希去重，同一个音频文件重复上传只保留一份"""
+    __tablename__ = "audio_uploads"
+
+    id = Column(Integer, primary_key=True, index=True)
+    rel_path = Column(String(500), unique=True, nullable=False)   # 相对音频存储根目录的路径
+    sha256 = Column(String(64), nullable=False, index=True)
+    size_bytes = Column(Integer, nullable=False)
+    original_filename = Column(String(255), nullable=True)
+    mimetype = Column(String(100), nullable=True)
+    # 音频元数据，上传时在线程里解析一次（见 app/services/audio_metadata.py），NULL 表示还没解析
+    duration_seconds = Column(Float, nullable=True)
+    bitrate = Column(Integer, nullable=True)      # bps
+    sample_rate = Column(Integer, nullable=True)  # Hz
+    channels = Column(Integer, nullable=True)
+    uploaded_by = Column(String(50), ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class AudioUploadSession(Base):
+    """听力课音频分块上传会话 - 记录已收到的字节数，断线后从下一个分块续传"""
+    __tablename__ = "audio_upload_sessions"
+
+    id = Column(String(36), primary_key=True)  # uuid，前端保存在 localStorage 里用于续传
+    original_filename = Column(String(255), nullable=True)
+    mimetype = Column(String(100), nullable=True)
+    total_size = Column(Integer, nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    received_bytes = Column(Integer, default=0, nullable=False)
+    status = Column(String(20), default="uploading")  # uploading / finalized
+    result_rel_path = Column(String(500), nullable=True)  # finalize 后的音频路径，重复 finalize 直接返回
+    created_by = Column(String(50), ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class AsrJob(Base):
+    """腾讯云录音识别任务表 - 由 asr_jobs.py 的后台轮询器统一提交/轮询，服务重启后可继续"""
+    __tablename__ = "asr_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    audio_file_path = Column(String(500), nullable=False, index=True)  # 相对音频存储根目录的路径
+    audio_sha256 = Column(String(64), nullable=True, index=True)      # 音频内容哈希，内容相同的音频复用识别结果
+    status = Column(String(20), default="pending", index=True)  # pending / submitted / succeeded / failed
+    tencent_task_id = Column(String(64), nullable=True)
+    result = Column(JSON, nullable=True)           # 词级时间戳 [{"text","start_ms","end_ms"}, ...]
+    error = Column(Text, nullable=True)
+    poll_count = Column(Integer, default=0)
+    next_poll_at = Column(DateTime, nullable=True, index=True)  # 轮询器下次处理该任务的时间
+
+    created_by = Column(String(50), ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
 # 用于Excel导入的临时表
 class WordImport(Base):
     __tablename__ = "word_imports"
@@ -7,8 +7,9 @@ from pydantic import BaseModel
 from datetime import datetime
 
 from app.database import get_db
-from app.models import AntiForgetSession, Student, User
-from app.routes.auth import get_current_user
+from app.models import AntiForgetSession, Student
+from app.routes.auth import get_current_principal
+from app.services.principal_cache import Principal
 from app.logger import get_logger
 from app.database_safety import safe_transaction
 
@@ -46,7 +47,7 @@ class SessionResponse(BaseModel):
 @safe_transaction("创建抗遗忘会话")
 async def create_anti_forget_session(
     session_data: SessionCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """创建抗遗忘会话"""
@@ -94,7 +95,7 @@ async def create_anti_forget_session(
 @router.get("/sessions/student/{student_id}", response_model=List[SessionResponse])
 async def get_student_sessions(
     student_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取学生的所有抗遗忘会话"""
@@ -128,7 +129,7 @@ async def get_student_sessions(
 @router.get("/sessions/{session_id}", response_model=SessionResponse)
 async def get_session(
     session_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取特定的抗遗忘会话"""
@@ -157,7 +158,7 @@ async def get_session(
 async def toggle_word_star(
     session_id: str,
     word_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """切换单词的五角星标记状态"""
@@ -199,7 +200,7 @@ async def toggle_word_star(
 @safe_transaction("完成一次复习")
 async def complete_review(
     session_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """完成一次抗遗忘复习"""
@@ -229,7 +230,7 @@ async def complete_review(
 @router.get("/sessions/{session_id}/stats")
 async def get_review_stats(
     session_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取复习统计数据"""
@@ -257,7 +258,7 @@ async def get_review_stats(
 @safe_transaction("删除抗遗忘会话")
 async def delete_session(
     session_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """删除抗遗忘会话（完成所有复习后）"""
@@ -1,5 +1,6 @@
 """用户认证路由"""
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
@@ -11,13 +12,28 @@ from app.database import get_db
 from app.models import User
 from app.logger import get_logger
 from app.database_safety import safe_transaction
+from app.services.password_hashing import hash_password, verify_password, needs_rehash
+from app.services.login_guard import login_limiter, check_password
+from app.services.last_login import last_login_recorder
+from app.services.principal_cache import (
+    Principal, get_cached_principal, cache_principal, current_token_version,
+    load_cached_user, cache_user, invalidate_principal, token_revocations,
+)
+from app.services.refresh_tokens import (
+    issue_refresh_token, rotate_refresh_token, revoke_refresh_token,
+    revoke_user_refresh_tokens, delete_user_refresh_tokens,
+)
 
 logger = get_logger("auth")
 
 # JWT配置
 SECRET_KEY = "your-secret-key-change-this-in-production"  # 生产环境需要更换
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 43200  # 30天
+# 访问令牌只做无状态校验，有效期要短：删除用户/改密码最迟这么久后在所有进程生效，过期后用刷新令牌换新
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+# 后端前面有几层会追加 X-Forwarded-For 的可信反向代理（ngrok / nginx 等）；
+# 0 表示直连，忽略客户端自己填的 X-Forwarded-For，否则换个头就能绕过按 IP 的登录限流
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
 
 router = APIRouter(prefix="/api/auth", tags=["认证"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
@@ -27,6 +43,12 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # 访问令牌有效期（秒）
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
 class TokenData(BaseModel):
@@ -78,29 +100,109 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """获取当前登录用户"""
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="无法验证凭据",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
-
-    user = db.query(User).filter(User.username == token_data.username).first()
+
+
+def _lookup_student_id(db: Session, user_id: str) -> Optional[int]:
+    from app.models import Student
+
+    row = db.query(Student.id).filter(Student.user_id == user_id).first()
+    return row[0] if row else None
+
+
+def resolve_student_id(principal: Principal, db: Session) -> Optional[int]:
+    """学生角色对应的 student_id：优先用令牌里的声明，登录时还没建学生记录的才查库"""
+    if principal.role != "student":
+        return None
+    if principal.student_id is not None:
+        return principal.student_id
+    return _lookup_student_id(db, principal.id)
+
+
+def create_user_token(db: Session, user: User) -> str:
+    """给用户签发带身份声明（用户ID、角色、学生ID、令牌版本号）的访问令牌"""
+    student_id = _lookup_student_id(db, user.id) if user.role == "student" else None
+    return create_access_token(
+        data=Principal.from_user(user, student_id).claims(),
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+
+
+def _issue_tokens(db: Session, user: User) -> dict:
+    """签发访问令牌 + 新的刷新令牌（会 commit）"""
+    refresh_token = issue_refresh_token(db, user.id)
+    db.commit()
+    return {
+        "access_token": create_user_token(db, user),
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+def _revoke_user_sessions(db: Session, user: User) -> None:
+    """改密码/重置密码：令牌版本号加一、吊销全部刷新令牌（由调用方 commit 后调用 _sessions_revoked）"""
+    user.token_version = (user.token_version or 0) + 1
+    revoke_user_refresh_tokens(db, user.id)
+
+
+def _sessions_revoked(user: User) -> None:
+    token_revocations.set_version(user.id, user.token_version)
+    invalidate_principal(user)
+
+
+def forget_deleted_user(db: Session, user: User) -> None:
+    """删除用户前调用：一并删除刷新令牌（由调用方 commit 后调用 user_deleted）"""
+    delete_user_refresh_tokens(db, user.id)
+
+
+def user_deleted(user: User) -> None:
+    """删除用户 commit 后调用：记进吊销表，手里的访问令牌立即失效"""
+    token_revocations.mark_deleted(user.id)
+    invalidate_principal(user)
+
+
+async def get_current_principal(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    """获取当前登录用户的身份信息（令牌声明 + 版本号校验，常规情况下不查库）"""
+    principal = get_cached_principal(token)
+    if principal is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise _credentials_exception()
+        # 只接受带完整身份声明的短期访问令牌（旧版 30 天令牌需要重新登录一次）
+        if payload.get("typ") != "access" or payload.get("sub") is None or payload.get("uid") is None:
+            raise _credentials_exception()
+        principal = Principal(payload["uid"], payload["sub"], payload.get("role"),
+                              payload.get("sid"), payload.get("ver") or 0)
+        cache_principal(token, principal, payload.get("exp"))
+
+    # 改过密码（版本号变了）或用户已被删除时，旧令牌作废
+    if current_token_version(db, principal.id) != principal.token_version:
+        raise _credentials_exception()
+    return principal
+
+
+async def get_current_user(principal: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
+    """获取当前登录用户（完整的 User 对象，只有需要用户资料或改密码的接口才用）"""
+    # 缓存命中时直接挂到当前会话上，不查库
+    user = load_cached_user(db, principal.username)
+    if user is not None:
+        return user
+
+    user = db.query(User).filter(User.username == principal.username).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    cache_user(user)
     return user
 
 
-async def get_current_active_admin(current_user: User = Depends(get_current_user)):
+async def get_current_active_admin(current_user: Principal = Depends(get_current_principal)):
     """验证当前用户是管理员"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="权限不足")
@@ -108,46 +210,105 @@ async def get_current_active_admin(current_user: User = Depends(get_current_user
 
 
 # API路由
+def _client_ip(request: Request) -> Optional[str]:
+    """客户端 IP：配置了可信代理时取 X-Forwarded-For 里最后一个可信代理追加的地址
+
+    每层代理都在末尾追加它看到的来源地址，所以从右往左数第 TRUSTED_PROXY_HOPS 个才是
+    可信的客户端地址，更靠左的部分都可能是客户端伪造的。
+    """
+    if TRUSTED_PROXY_HOPS > 0:
+        forwarded = [ip.strip() for ip in request.headers.get("x-forwarded-for", "").split(",") if ip.strip()]
+        if forwarded:
+            return forwarded[-min(TRUSTED_PROXY_HOPS, len(forwarded))]
+    return request.client.host if request.client else None
+
+
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """用户登录"""
     logger.info(f"用户尝试登录: {form_data.username}")
 
+    # 连续失败太多次的用户名/IP 直接拒绝，不查库也不跑 bcrypt
+    client_ip = _client_ip(request)
+    wait_seconds = login_limiter.retry_after(form_data.username, client_ip)
+    if wait_seconds:
+        logger.warning(f"登录被限流: 用户名={form_data.username}, IP={client_ip}, 剩余 {wait_seconds} 秒")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"登录失败次数过多，请 {max(1, wait_seconds // 60)} 分钟后再试",
+            headers={"Retry-After": str(wait_seconds)},
+        )
+
     user = db.query(User).filter(User.username == form_data.username).first()
 
-    if not user or not user.verify_password(form_data.password):
+    if not user or not await check_password(user, form_data.password):
+        login_limiter.record_failure(form_data.username, client_ip)
         logger.warning(f"登录失败: 用户名或密码错误 - {form_data.username}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    login_limiter.record_success(form_data.username, client_ip)
 
-    # 更新最后登录时间
-    user.last_login_at = datetime.utcnow()
-    db.commit()
+    # BCRYPT_ROUNDS 调整过时，用刚验证过的密码按新强度重新哈希
+    if needs_rehash(user.password_hash):
+        user.password_hash = await hash_password(form_data.password)
+        db.commit()
+        invalidate_principal(user)
+        logger.info(f"密码哈希已按新强度更新: 用户={user.username}")
 
-    # 创建访问令牌
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
+    # 最后登录时间由后台定时批量写入
+    last_login_recorder.record(user.id)
+
+    # 创建访问令牌和刷新令牌
+    tokens = _issue_tokens(db, user)
 
     logger.info(f"登录成功: 用户={user.username}, 角色={user.role}, ID={user.id}")
-    return {"access_token": access_token, "token_type": "bearer"}
+    return tokens
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(body: RefreshRequest, db: Session = Depends(get_db)):
+    """用刷新令牌换一对新的访问令牌和刷新令牌（旧刷新令牌随即失效）"""
+    rotated = rotate_refresh_token(db, body.refresh_token)
+    if rotated is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="登录已过期，请重新登录",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user, refresh_token = rotated
+    return {
+        "access_token": create_user_token(db, user),
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+@router.post("/logout")
+async def logout(body: RefreshRequest, db: Session = Depends(get_db)):
+    """登出：吊销刷新令牌（访问令牌几分钟后自然过期）"""
+    if revoke_refresh_token(db, body.refresh_token):
+        db.commit()
+    return {"message": "已登出"}
+
+
+def _last_login_iso(user: User) -> Optional[str]:
+    last_login_at = last_login_recorder.latest(user.id, user.last_login_at)
+    return last_login_at.isoformat() if last_login_at else None
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_current_user_info(
+    current_user: User = Depends(get_current_user),
+    principal: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
     """获取当前用户信息"""
-    from app.models import Student
-
-    # 如果是学生角色，查找对应的student_id
-    student_id = None
-    if current_user.role == 'student':
-        student = db.query(Student).filter(Student.user_id == current_user.id).first()
-        if student:
-            student_id = student.id
+    # 学生角色的 student_id 直接取令牌里的声明
+    student_id = resolve_student_id(principal, db)
 
     return UserResponse(
         id=current_user.id,
@@ -156,7 +317,7 @@ async def get_current_user_info(current_user: User = Depends(get_current_user),
         display_name=current_user.display_name,
         email=current_user.email,
         created_at=current_user.created_at.isoformat(),
-        last_login_at=current_user.last_login_at.isoformat() if current_user.last_login_at else None,
+        last_login_at=_last_login_iso(current_user),
         student_id=student_id
     )
 
@@ -165,7 +326,7 @@ async def get_current_user_info(current_user: User = Depends(get_current_user),
 @safe_transaction("注册新用户")
 async def register_user(
     user_data: UserCreate,
-    current_user: User = Depends(get_current_active_admin),
+    current_user: Principal = Depends(get_current_active_admin),
     db: Session = Depends(get_db)
 ):
     """注册新用户（仅管理员）"""
@@ -197,7 +358,7 @@ async def register_user(
         display_name=user_data.display_name,
         email=user_data.email
     )
-    new_user.set_password(user_data.password)
+    new_user.password_hash = await hash_password(user_data.password)
 
     db.add(new_user)
     db.commit()
@@ -218,7 +379,7 @@ async def register_user(
 
 @router.get("/users", response_model=list[UserResponse])
 async def get_all_users(
-    current_user: User = Depends(get_current_active_admin),
+    current_user: Principal = Depends(get_current_active_admin),
     db: Session = Depends(get_db)
 ):
     """获取所有用户列表（仅管理员）- 只返回管理员和教师，不包括学生"""
@@ -232,7 +393,7 @@ async def get_all_users(
             display_name=user.display_name,
             email=user.email,
             created_at=user.created_at.isoformat(),
-            last_login_at=user.last_login_at.isoformat() if user.last_login_at else None
+            last_login_at=_last_login_iso(user)
         )
         for user in users
     ]
@@ -241,7 +402,7 @@ async def get_all_users(
 @router.delete("/users/{user_id}")
 async def delete_user(
     user_id: str,
-    current_user: User = Depends(get_current_active_admin),
+    current_user: Principal = Depends(get_current_active_admin),
     db: Session = Depends(get_db)
 ):
     """删除用户（仅管理员）"""
@@ -257,6 +418,7 @@ async def delete_user(
         raise HTTPException(status_code=404, detail="用户不存在")
 
     deleted_username = user.username
+    deleted_users = [user]
 
     # 如果是教师角色，检查并删除关联数据
     if user.role == "teacher":
@@ -274,7 +436,9 @@ async def delete_user(
         for student_user_id in student_user_ids:
             student_user = db.query(User).filter(User.id == student_user_id).first()
             if student_user:
+                forget_deleted_user(db, student_user)
                 db.delete(student_user)
+                deleted_users.append(student_user)
                 logger.info(f"删除学生User账号: {student_user.username}")
 
         # 2. 删除该教师创建的单词集（会级联删除单词）
@@ -295,8 +459,11 @@ async def delete_user(
         logger.info(f"删除教师关联数据: 学生={len(students)}个(含User账号), 单词集={len(word_sets)}个, 课程={len(schedules)}个, 抗遗忘会话={len(sessions)}个")
 
     # 删除用户
+    forget_deleted_user(db, user)
     db.delete(user)
     db.commit()
+    for deleted in deleted_users:
+        user_deleted(deleted)
 
     logger.info(f"用户删除成功: 管理员={current_user.username}, 被删除用户={deleted_username}, ID={user_id}")
     return {"message": "用户删除成功"}
@@ -306,7 +473,7 @@ async def delete_user(
 async def update_user(
     user_id: str,
     user_update: UserUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """更新用户信息"""
@@ -333,6 +500,7 @@ async def update_user(
 
     db.commit()
     db.refresh(user)
+    invalidate_principal(user)
 
     return UserResponse(
         id=user.id,
@@ -341,7 +509,7 @@ async def update_user(
         display_name=user.display_name,
         email=user.email,
         created_at=user.created_at.isoformat(),
-        last_login_at=user.last_login_at.isoformat() if user.last_login_at else None
+        last_login_at=_last_login_iso(user)
     )
 
 
@@ -353,21 +521,23 @@ async def change_password(
 ):
     """修改密码"""
     # 验证旧密码
-    if not current_user.verify_password(password_data.old_password):
+    if not await verify_password(password_data.old_password, current_user.password_hash):
         raise HTTPException(status_code=400, detail="原密码错误")
 
-    # 设置新密码
-    current_user.set_password(password_data.new_password)
+    # 设置新密码，版本号加一让其他设备上的旧令牌失效，并给当前设备换发新令牌
+    current_user.password_hash = await hash_password(password_data.new_password)
+    _revoke_user_sessions(db, current_user)
     db.commit()
+    _sessions_revoked(current_user)
 
-    return {"message": "密码修改成功"}
+    return {"message": "密码修改成功", **_issue_tokens(db, current_user)}
 
 
 @router.post("/reset-password/{user_id}")
 async def reset_user_password(
     user_id: str,
     new_password: str,
-    current_user: User = Depends(get_current_active_admin),
+    current_user: Principal = Depends(get_current_active_admin),
     db: Session = Depends(get_db)
 ):
     """重置用户密码（仅管理员）"""
@@ -375,7 +545,9 @@ async def reset_user_password(
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
 
-    user.set_password(new_password)
+    user.password_hash = await hash_password(new_password)
+    _revoke_user_sessions(db, user)
     db.commit()
+    _sessions_revoked(user)
 
     return {"message": "密码重置成功"}
@@ -1,40 +1,50 @@
 """听力课 API"""
 import os
-import re
 import uuid
-import shutil
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import shutil
 from datetime import datetime, date, timedelta
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
-from fastapi.responses import FileResponse, StreamingResponse
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, BackgroundTasks
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
 from app.database import get_db
-from app.models import ListeningArticle, Schedule, User, AntiForgetSession, Student
-from app.routes.auth import get_current_user
-from app.services.llm_common import (
-    call_llm, call_vision_llm, build_lookup_prompt, generate_translation_sync,
+from app.models import ListeningArticle, Schedule, AntiForgetSession, Student, AsrJob, AudioUploadSession
+from app.routes.auth import get_current_principal
+from app.services.principal_cache import Principal
+from app.services.llm_common import call_vision_llm, generate_translation
+from app.services.word_lookup import lookup_word_meaning
+from app.services.sse import sse_response
+from app.services.audio_storage import (
+    audio_storage_root, audio_abs_path, file_sha256, find_upload_by_hash, get_upload, register_upload,
+    verify_audio_signature,
+)
+from app.services.chunked_upload import (
+    UPLOAD_CHUNK_SIZE, UPLOAD_SESSION_UPLOADING, UPLOAD_SESSION_FINALIZED, discard_session_files,
+    next_chunk_index, partial_path, prune_expired_sessions, session_lock, take_streamed_hash, total_chunks,
+    write_chunk,
+)
+from app.services.audio_metadata import probe_audio_metadata, ensure_upload_metadata, copy_metadata_to_article
+from app.services.audio_range import (
+    AUDIO_IMMUTABLE_MAX_AGE, AudioRangeResponse, audio_version, build_audio_info, cache_audio_info,
+    get_cached_audio_info,
 )
-from app.services.tencent_asr_client import call_tencent_asr
+from app.services.audio_transcode import (
+    RENDITION_MEDIA_TYPE, RENDITION_STREAM, audio_transcoder, existing_rendition,
+)
+from app.services.audio_peaks import generate_peaks_file, peaks_path_for
+from app.services.asr_jobs import asr_poller, latest_succeeded_job, ASR_JOB_SUCCEEDED, ASR_JOB_FAILED
 from app.services.paragraph_alignment import align_paragraphs_to_asr
 
 router = APIRouter(prefix="/api/listening", tags=["听力课"])
 
-# 音频本地存储根目录（相对于backend目录），数据库只存相对路径
-LISTENING_AUDIO_STORAGE_DIR = os.getenv("LISTENING_AUDIO_STORAGE_DIR", "uploads/audio")
 ALLOWED_AUDIO_EXTENSIONS = {".mp3", ".wav", ".ogg", ".m4a"}
 MAX_AUDIO_SIZE_BYTES = 100 * 1024 * 1024  # 100MB
 
 
-def _audio_storage_root() -> str:
-    root = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), LISTENING_AUDIO_STORAGE_DIR)
-    os.makedirs(root, exist_ok=True)
-    return root
-
-
 # ── Pydantic Schemas ──────────────────────────────────────────
 
 class ParagraphTimestamp(BaseModel):
@@ -63,14 +73,41 @@ class UploadAudioResponse(BaseModel):
     original_filename: str
 
 
+class InitUploadRequest(BaseModel):
+    filename: str
+    size: int
+    mimetype: Optional[str] = None
+
+
+class UploadSessionStatus(BaseModel):
+    upload_id: str
+    chunk_size: int
+    total_size: int
+    total_chunks: int
+    received_bytes: int
+    next_chunk: int           # 下一个应该上传的分块序号
+    status: str               # uploading / finalized
+
+
 class AlignTimestampsRequest(BaseModel):
     temp_audio_id: str
     article_content: str
 
 
 class AlignTimestampsResponse(BaseModel):
-    paragraphs: List[ParagraphTimestamp]
+    job_id: int
+    status: str                                  # pending / submitted / succeeded / failed
+    paragraphs: List[ParagraphTimestamp] = []    # 只有识别完成(succeeded)时才有
     audio_duration_seconds: float
+    error: Optional[str] = None
+
+
+class AsrJobResponse(BaseModel):
+    job_id: int
+    status: str
+    error: Optional[str] = None
+    created_at: str
+    finished_at: Optional[str] = None
 
 
 class SaveListeningArticleRequest(BaseModel):
@@ -114,6 +151,7 @@ class ListeningArticleResponse(BaseModel):
 class LookupWordRequest(BaseModel):
     word: str
     article_context: str
+    word_offset: Optional[int] = None  # 被点击的词在 article_context 中的字符位置
 
 
 class LookupWordResponse(BaseModel):
@@ -142,16 +180,24 @@ Output ONLY the extracted text, no explanations, no markdown, no commentary.
 If the image contains no readable text, output an empty string."""
 
 
-def _get_audio_duration_seconds(file_path: str) -> float:
-    """用 mutagen 解析音频时长"""
-    try:
-        from mutagen import File as MutagenFile
-        audio = MutagenFile(file_path)
-        if audio is not None and audio.info is not None:
-            return round(float(audio.info.length), 2)
-    except Exception:
-        pass
-    return 0.0
+async def _ensure_peaks(abs_path: str, duration: float = 0.0) -> Optional[str]:
+    """峰值文件不存在时在线程里计算（解码音频是 CPU 密集操作，不能阻塞事件循环）"""
+    peaks_path = peaks_path_for(abs_path)
+    if os.path.exists(peaks_path):
+        return peaks_path
+    return await asyncio.to_thread(generate_peaks_file, abs_path, duration)
+
+
+async def _post_upload_processing(abs_path: str, duration: float) -> None:
+    """上传完成后的后台处理：先转码出播放版/ASR版（没有 ffmpeg 时跳过），再生成波形峰值"""
+    await audio_transcoder.transcode(abs_path)
+    await _ensure_peaks(abs_path, duration)
+
+
+def _peaks_response(peaks_path: Optional[str]) -> FileResponse:
+    if not peaks_path:
+        raise HTTPException(status_code=404, detail="无法生成该音频的波形数据")
+    return FileResponse(peaks_path, media_type="application/json")
 
 
 # ── API 端点 ──────────────────────────────────────────────────
@@ -159,7 +205,7 @@ def _get_audio_duration_seconds(file_path: str) -> float:
 @router.post("/ocr", response_model=OCRResponse)
 async def ocr_image(
     image: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """截图识别文字（OCR），前端自行决定把识别结果追加到文本框的哪个位置"""
     contents = await image.read()
@@ -169,12 +215,7 @@ async def ocr_image(
     prompt = build_ocr_prompt()
     mimetype = image.content_type or "image/png"
 
-    # call_vision_llm 是同步网络调用，放到线程池跑，避免阻塞事件循环
-    loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as executor:
-        recognized_text = await loop.run_in_executor(
-            executor, call_vision_llm, prompt, contents, mimetype
-        )
+    recognized_text = await call_vision_llm(prompt, contents, mimetype)
 
     return OCRResponse(recognized_text=recognized_text.strip())
 
@@ -182,7 +223,7 @@ async def ocr_image(
 @router.post("/translate", response_model=TranslateResponse)
 async def translate_article(
     req: TranslateRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """按段落翻译（老师上传的原文可能没有翻译，点击按钮补上）"""
     if not req.article_content.strip():
@@ -191,36 +232,117 @@ async def translate_article(
     # 听力课按单个换行分段（不是空行），显式传入避免与阅读课的双换行规则冲突
     paragraphs = [p.strip() for p in req.article_content.split("\n") if p.strip()]
 
-    # generate_translation_sync 内部是同步网络调用，放到线程池跑，避免阻塞事件循环
-    loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as executor:
-        translation = await loop.run_in_executor(
-            executor, generate_translation_sync, req.article_content, paragraphs
-        )
+    translation = await generate_translation(req.article_content, paragraphs)
     return TranslateResponse(translation=translation)
 
 
-@router.post("/upload-audio", response_model=UploadAudioResponse)
-async def upload_audio(
-    audio: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
+@router.post("/translate-stream")
+async def translate_article_stream(
+    req: TranslateRequest,
+    current_user: Principal = Depends(get_current_principal),
 ):
-    """上传音频文件，落盘到本地固定目录，返回临时ID供后续保存文章时绑定"""
-    ext = os.path.splitext(audio.filename or "")[1].lower()
-    if ext not in ALLOWED_AUDIO_EXTENSIONS:
-        raise HTTPException(status_code=400, detail=f"不支持的音频格式，仅支持: {', '.join(ALLOWED_AUDIO_EXTENSIONS)}")
+    """流式按段落翻译（SSE）：每翻译完一段推送 paragraph {index, text}，最后 done {translation}
 
+    同一 index 可能推送多次（分块重试），以最后一次为准。
+    """
+    if not req.article_content.strip():
+        raise HTTPException(status_code=400, detail="原文内容不能为空")
+
+    paragraphs = [p.strip() for p in req.article_content.split("\n") if p.strip()]
+
+    async def producer(emit):
+        async def on_paragraph(index: int, text: str):
+            await emit("paragraph", {"index": index, "text": text})
+
+        translation = await generate_translation(req.article_content, paragraphs, on_paragraph=on_paragraph)
+        return TranslateResponse(translation=translation).dict()
+
+    return sse_response(producer)
+
+
+def _new_audio_rel_path(ext: str) -> str:
+    """按年月分目录生成新音频的相对路径（文件名为 UUID，内容永远不变）"""
     today = date.today()
     rel_dir = os.path.join(str(today.year), f"{today.month:02d}")
-    abs_dir = os.path.join(_audio_storage_root(), rel_dir)
-    os.makedirs(abs_dir, exist_ok=True)
+    os.makedirs(os.path.join(audio_storage_root(), rel_dir), exist_ok=True)
+    return os.path.join(rel_dir, f"{uuid.uuid4()}{ext}")
+
+
+def _write_and_hash(f, hasher, chunk: bytes) -> None:
+    hasher.update(chunk)
+    f.write(chunk)
+
+
+async def _register_uploaded_file(
+    db: Session,
+    background_tasks: BackgroundTasks,
+    abs_path: str,
+    rel_path: str,
+    sha256: str,
+    size: int,
+    original_filename: str,
+    mimetype: Optional[str],
+    user_id: str,
+) -> UploadAudioResponse:
+    """文件已完整落盘后的公共收尾：按哈希去重、在线程里解析元数据、登记上传记录、后台生成波形峰值"""
+    existing = find_upload_by_hash(db, sha256)
+    if existing:
+        os.remove(abs_path)
+        # 刷新修改时间：旧文件被重新交给老师使用，存储清理器要重新计算宽限期
+        os.utime(audio_abs_path(existing.rel_path))
+        existing = await ensure_upload_metadata(db, existing)
+        duration = existing.duration_seconds
+        background_tasks.add_task(_post_upload_processing, audio_abs_path(existing.rel_path), duration)
+        return UploadAudioResponse(
+            temp_audio_id=existing.rel_path,
+            duration_seconds=duration,
+            original_filename=original_filename,
+        )
+
+    # mutagen 解析大文件要几百毫秒，放到线程里，结果存库供之后复用
+    metadata = await asyncio.to_thread(probe_audio_metadata, abs_path)
+    duration = metadata["duration_seconds"]
+    register_upload(
+        db, rel_path, sha256, size, user_id,
+        original_filename=original_filename, mimetype=mimetype, **metadata,
+    )
+    background_tasks.add_task(_post_upload_processing, abs_path, duration)
+
+    return UploadAudioResponse(
+        temp_audio_id=rel_path,
+        duration_seconds=duration,
+        original_filename=original_filename,
+    )
+
+
+def _check_audio_extension(filename: Optional[str]) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in ALLOWED_AUDIO_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"不支持的音频格式，仅支持: {', '.join(ALLOWED_AUDIO_EXTENSIONS)}")
+    return ext
 
-    filename = f"{uuid.uuid4()}{ext}"
-    rel_path = os.path.join(rel_dir, filename)
-    abs_path = os.path.join(abs_dir, filename)
 
-    # 分块写入磁盘，避免大文件一次性读入内存
+@router.post("/upload-audio", response_model=UploadAudioResponse)
+async def upload_audio(
+    background_tasks: BackgroundTasks,
+    audio: UploadFile = File(...),
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """一次性上传音频文件，落盘到本地固定目录，返回临时ID供后续保存文章时绑定
+
+    大文件/网络不稳定时前端走下面的分块续传接口（/uploads/...），这里保留给小文件和旧客户端。
+    边写边算 sha256，内容与已上传过的音频完全相同时删掉新文件、直接返回已有文件的ID，
+    这样重新上传同一个音频也能复用之前的ASR识别结果。
+    返回后在后台生成波形峰值文件，供时间轴编辑器直接绘制波形。
+    """
+    ext = _check_audio_extension(audio.filename)
+    rel_path = _new_audio_rel_path(ext)
+    abs_path = audio_abs_path(rel_path)
+
+    # 分块写入磁盘，避免大文件一次性读入内存；写文件和算哈希放到线程里，不阻塞事件循环
     size = 0
+    hasher = hashlib.sha256()
     with open(abs_path, "wb") as f:
         while chunk := await audio.read(1024 * 1024):
             size += len(chunk)
@@ -228,55 +350,257 @@ async def upload_audio(
                 f.close()
                 os.remove(abs_path)
                 raise HTTPException(status_code=400, detail="音频文件过大，最大支持100MB")
-            f.write(chunk)
+            await asyncio.to_thread(_write_and_hash, f, hasher, chunk)
 
-    duration = _get_audio_duration_seconds(abs_path)
+    return await _register_uploaded_file(
+        db, background_tasks, abs_path, rel_path, hasher.hexdigest(), size,
+        audio.filename or os.path.basename(rel_path), audio.content_type, current_user.id,
+    )
 
-    return UploadAudioResponse(
-        temp_audio_id=rel_path,
-        duration_seconds=duration,
-        original_filename=audio.filename or filename,
+
+# ── 分块断点续传（见 app/services/chunked_upload.py） ──────────────
+
+def _upload_session_status(session: AudioUploadSession) -> UploadSessionStatus:
+    return UploadSessionStatus(
+        upload_id=session.id,
+        chunk_size=session.chunk_size,
+        total_size=session.total_size,
+        total_chunks=total_chunks(session),
+        received_bytes=session.received_bytes,
+        next_chunk=next_chunk_index(session),
+        status=session.status,
+    )
+
+
+def _get_upload_session(db: Session, upload_id: str, user: Principal) -> AudioUploadSession:
+    session = db.query(AudioUploadSession).filter(AudioUploadSession.id == upload_id).first()
+    if not session or session.created_by != user.id:
+        raise HTTPException(status_code=404, detail="上传会话不存在或已过期，请重新上传")
+    return session
+
+
+@router.post("/uploads/init", response_model=UploadSessionStatus)
+async def init_chunked_upload(
+    req: InitUploadRequest,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """创建分块上传会话，返回 upload_id 和分块大小"""
+    _check_audio_extension(req.filename)
+    if req.size <= 0:
+        raise HTTPException(status_code=400, detail="音频文件为空")
+    if req.size > MAX_AUDIO_SIZE_BYTES:
+        raise HTTPException(status_code=400, detail="音频文件过大，最大支持100MB")
+
+    prune_expired_sessions(db)
+    session = AudioUploadSession(
+        id=str(uuid.uuid4()),
+        original_filename=req.filename,
+        mimetype=req.mimetype,
+        total_size=req.size,
+        chunk_size=UPLOAD_CHUNK_SIZE,
+        received_bytes=0,
+        status=UPLOAD_SESSION_UPLOADING,
+        created_by=current_user.id,
     )
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+    return _upload_session_status(session)
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionStatus)
+async def get_chunked_upload(
+    upload_id: str,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """查询已收到的字节数，断线/刷新页面后从 next_chunk 继续上传"""
+    return _upload_session_status(_get_upload_session(db, upload_id, current_user))
+
+
+@router.put("/uploads/{upload_id}/chunks/{index}", response_model=UploadSessionStatus)
+async def put_upload_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """上传第 index 个分块（请求体为原始字节）。重复上传已收到的分块直接确认，跳号返回 409"""
+    session = _get_upload_session(db, upload_id, current_user)
+    if session.status != UPLOAD_SESSION_UPLOADING:
+        return _upload_session_status(session)
+
+    chunk_count = total_chunks(session)
+    if index < 0 or index >= chunk_count:
+        raise HTTPException(status_code=400, detail="分块序号超出范围")
+    offset = index * session.chunk_size
+    expected_size = min(session.chunk_size, session.total_size - offset)
+
+    # 边收边检查大小，不接受超过分块大小的请求体
+    body = bytearray()
+    async for part in request.stream():
+        body.extend(part)
+        if len(body) > expected_size:
+            raise HTTPException(status_code=413, detail="分块大小超出限制")
+    if len(body) != expected_size:
+        raise HTTPException(status_code=400, detail=f"分块不完整：应为 {expected_size} 字节，收到 {len(body)} 字节")
+
+    async with session_lock(upload_id):
+        db.refresh(session)
+        expected_index = next_chunk_index(session)
+        if index < expected_index:
+            return _upload_session_status(session)
+        if index > expected_index:
+            raise HTTPException(status_code=409, detail=f"分块顺序错误，应上传第 {expected_index} 块")
+
+        await asyncio.to_thread(write_chunk, upload_id, offset, bytes(body))
+        session.received_bytes = offset + len(body)
+        session.updated_at = datetime.utcnow()
+        db.commit()
+    return _upload_session_status(session)
+
+
+@router.post("/uploads/{upload_id}/finalize", response_model=UploadAudioResponse)
+async def finalize_chunked_upload(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """所有分块到齐后合成正式音频文件：去重、解析元数据、登记上传记录，返回值与 /upload-audio 相同"""
+    session = _get_upload_session(db, upload_id, current_user)
+    async with session_lock(upload_id):
+        db.refresh(session)
+        if session.status == UPLOAD_SESSION_FINALIZED and session.result_rel_path:
+            # 前端没收到上次 finalize 的响应又重试了一次
+            upload = get_upload(db, session.result_rel_path)
+            return UploadAudioResponse(
+                temp_audio_id=session.result_rel_path,
+                duration_seconds=(upload.duration_seconds if upload else None) or 0.0,
+                original_filename=session.original_filename or os.path.basename(session.result_rel_path),
+            )
+        if session.received_bytes < session.total_size:
+            raise HTTPException(
+                status_code=409,
+                detail=f"还有分块未上传，应继续上传第 {next_chunk_index(session)} 块",
+            )
+
+        part_path = partial_path(upload_id)
+        if not os.path.exists(part_path):
+            raise HTTPException(status_code=404, detail="上传的临时文件已丢失，请重新上传")
+        sha256 = take_streamed_hash(upload_id, session.total_size)
+        if sha256 is None:
+            sha256 = await asyncio.to_thread(file_sha256, part_path)
+
+        ext = _check_audio_extension(session.original_filename)
+        rel_path = _new_audio_rel_path(ext)
+        abs_path = audio_abs_path(rel_path)
+        os.replace(part_path, abs_path)
+
+        result = await _register_uploaded_file(
+            db, background_tasks, abs_path, rel_path, sha256, session.total_size,
+            session.original_filename or os.path.basename(rel_path), session.mimetype, current_user.id,
+        )
+        session.status = UPLOAD_SESSION_FINALIZED
+        session.result_rel_path = result.temp_audio_id
+        db.commit()
+    discard_session_files(upload_id)
+    return result
 
 
 @router.post("/align-timestamps", response_model=AlignTimestampsResponse)
 async def align_timestamps(
     req: AlignTimestampsRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
 ):
-    """调用腾讯云ASR + 文本相似度匹配，返回段落级时间戳预览（不写数据库）"""
+    """登记腾讯云ASR识别任务并返回任务ID（不写文章表）
+
+    内容相同的音频已经识别过时不再调用腾讯云，直接用缓存的词级结果重新做段落匹配（毫秒级）。
+    识别由后台轮询器完成（见 app/services/asr_jobs.py），前端轮询 GET /asr-jobs/{job_id}，
+    完成后再调一次本接口：同一音频的识别结果会被复用，直接返回文本相似度匹配后的段落级时间戳预览。
+    """
     # 按单个换行分段（老师手动换行决定分段，不是空行/双换行）
     paragraphs = [p.strip() for p in req.article_content.split("\n") if p.strip()]
     if not paragraphs:
         raise HTTPException(status_code=400, detail="原文内容不能为空")
 
-    abs_path = os.path.join(_audio_storage_root(), req.temp_audio_id)
+    abs_path = os.path.join(audio_storage_root(), req.temp_audio_id)
     if not os.path.exists(abs_path):
         raise HTTPException(status_code=404, detail="音频文件不存在，请重新上传")
 
-    # call_tencent_asr 内部用同步轮询（time.sleep），必须放到线程池跑，
-    # 否则会阻塞整个事件循环，导致服务器在识别期间无法处理任何其他请求
-    loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as executor:
-        asr_words = await loop.run_in_executor(executor, call_tencent_asr, abs_path)
+    # 按内容哈希复用识别结果；本功能上线前上传的音频没有索引，补算一次哈希登记
+    upload = get_upload(db, req.temp_audio_id)
+    if upload is None:
+        sha256 = await asyncio.to_thread(file_sha256, abs_path)
+        upload = register_upload(db, req.temp_audio_id, sha256, os.path.getsize(abs_path), current_user.id)
+    upload = await ensure_upload_metadata(db, upload)
 
-    aligned = align_paragraphs_to_asr(paragraphs, asr_words)
-    duration = _get_audio_duration_seconds(abs_path)
+    job = asr_poller.submit(db, req.temp_audio_id, upload.sha256, current_user.id)
+    duration = upload.duration_seconds
+
+    aligned = []
+    if job.status == ASR_JOB_SUCCEEDED:
+        aligned = align_paragraphs_to_asr(paragraphs, job.result or [])
 
     return AlignTimestampsResponse(
+        job_id=job.id,
+        status=job.status,
         paragraphs=[ParagraphTimestamp(**p) for p in aligned],
         audio_duration_seconds=duration,
+        error=job.error if job.status == ASR_JOB_FAILED else None,
+    )
+
+
+@router.get("/asr-audio/{rel_path:path}")
+async def serve_asr_audio(rel_path: str, expires: int, sig: str):
+    """供腾讯云录音识别下载音频（SourceType=0）：不需要登录，凭带过期时间的签名链接访问
+
+    FileResponse 从磁盘分块发送，不会把整个文件读进内存。
+    """
+    if not verify_audio_signature(rel_path, expires, sig):
+        raise HTTPException(status_code=403, detail="链接无效或已过期")
+
+    root = os.path.realpath(audio_storage_root())
+    abs_path = os.path.realpath(audio_abs_path(rel_path))
+    if not abs_path.startswith(root + os.sep) or not os.path.isfile(abs_path):
+        raise HTTPException(status_code=404, detail="音频文件不存在")
+    return FileResponse(abs_path)
+
+
+@router.get("/asr-jobs/{job_id}", response_model=AsrJobResponse)
+async def get_asr_job(
+    job_id: int,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """查询ASR识别任务状态（只能查自己登记的任务，管理员不限）"""
+    query = db.query(AsrJob).filter(AsrJob.id == job_id)
+    if current_user.role != "admin":
+        query = query.filter(AsrJob.created_by == current_user.id)
+    job = query.first()
+    if not job:
+        raise HTTPException(status_code=404, detail="识别任务不存在")
+
+    return AsrJobResponse(
+        job_id=job.id,
+        status=job.status,
+        error=job.error,
+        created_at=job.created_at.isoformat(),
+        finished_at=job.finished_at.isoformat() if job.finished_at else None,
     )
 
 
 @router.post("/articles", response_model=SaveListeningArticleResponse)
 async def save_article(
     req: SaveListeningArticleRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """保存听力课文章（含确认后的时间戳）"""
-    abs_path = os.path.join(_audio_storage_root(), req.temp_audio_id)
+    abs_path = os.path.join(audio_storage_root(), req.temp_audio_id)
     if not os.path.exists(abs_path):
         raise HTTPException(status_code=404, detail="音频文件不存在，请重新上传")
 
@@ -292,6 +616,12 @@ async def save_article(
         alignment_status="confirmed",
         created_by=current_user.id,
     )
+    # 带上这段音频的识别结果，之后重新对齐不必再付费识别
+    upload = get_upload(db, req.temp_audio_id)
+    copy_metadata_to_article(article, upload)
+    asr_job = latest_succeeded_job(db, req.temp_audio_id, upload.sha256 if upload else None)
+    if asr_job:
+        article.asr_raw_result = asr_job.result
     db.add(article)
     db.commit()
     db.refresh(article)
@@ -306,7 +636,7 @@ async def save_article(
 async def update_article(
     article_id: int,
     req: UpdateListeningArticleRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """编辑文章（排课时小修改）"""
@@ -334,7 +664,7 @@ async def update_article(
 async def bind_schedule(
     article_id: int,
     req: BindScheduleRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """将文章绑定到课程"""
@@ -349,7 +679,7 @@ async def bind_schedule(
 @router.get("/articles/by-schedule/{schedule_id}", response_model=ListeningArticleResponse)
 async def get_article_by_schedule(
     schedule_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """根据课程ID获取文章（上课时使用）"""
@@ -366,112 +696,125 @@ async def get_article_by_schedule(
         article_content=article.article_content,
         translation=article.translation,
         paragraph_timestamps=article.paragraph_timestamps,
-        audio_url=f"/api/listening/audio/{article.id}",
+        audio_url=_article_audio_url(article),
         audio_duration_seconds=article.audio_duration_seconds,
         created_at=article.created_at.isoformat()
     )
 
 
-RANGE_CHUNK_SIZE = 1024 * 1024  # 1MB，Range响应分块读取，避免大文件一次性读入内存
+def _article_audio_source(article: ListeningArticle, original: bool = False) -> Tuple[str, str, str]:
+    """文章音频实际发送的文件：(绝对路径, MIME, URL版本号)；默认优先用转码后的小体积播放版"""
+    abs_path = os.path.join(audio_storage_root(), article.audio_file_path)
+    version = audio_version(article.audio_file_path)
+    if not original:
+        stream_path = existing_rendition(abs_path, RENDITION_STREAM)
+        if stream_path:
+            return stream_path, RENDITION_MEDIA_TYPE, f"{version}-{RENDITION_STREAM}"
+    return abs_path, article.audio_mimetype or "audio/mpeg", version
 
 
-def _iter_file_range(path: str, start: int, end: int):
-    """按字节范围分块读取文件，供 StreamingResponse 使用"""
-    with open(path, "rb") as f:
-        f.seek(start)
-        remaining = end - start + 1
-        while remaining > 0:
-            chunk_size = min(RANGE_CHUNK_SIZE, remaining)
-            data = f.read(chunk_size)
-            if not data:
-                break
-            remaining -= len(data)
-            yield data
+def _article_audio_url(article: ListeningArticle) -> str:
+    """带版本号的音频地址，浏览器可以长期缓存；播放版转码完成后版本号随之变化"""
+    return f"/api/listening/audio/{article.id}?v={_article_audio_source(article)[2]}"
 
 
 @router.get("/audio/{article_id}")
 async def stream_audio(
     article_id: int,
     request: Request,
+    v: Optional[str] = None,
+    original: bool = False,
     db: Session = Depends(get_db)
 ):
-    """流式提供音频文件，手动支持HTTP Range请求（不鉴权：<audio>标签原生请求不带Authorization头）
+    """提供音频文件，支持 Range / 多段 Range / If-Range / ETag 条件请求（不鉴权：<audio>标签原生请求不带Authorization头）
 
-    项目固定的 starlette==0.27.0 版本的 FileResponse 不支持 Range 请求
-    （旧版本 Starlette 的已知限制，升级会影响全站所有接口，风险较大，
-    所以在这个音频接口单独手动实现，不改动全局依赖版本）。
+    项目固定的 starlette==0.27.0 版本的 FileResponse 不支持 Range 请求，
+    所以在这个音频接口单独实现（见 app/services/audio_range.py），不改动全局依赖版本。
     没有 Range 支持，<audio> 标签的 seek/跳转播放会在网络较慢或音频文件
     较大时失效，表现为"怎么点都从头播放"。
+    文件信息按文章ID缓存，拖动进度条时不再查库；URL 里的版本号 v 与当前文件一致时返回 immutable 缓存头。
+    默认返回转码后的播放版（见 app/services/audio_transcode.py），?original=1 返回老师上传的原文件。
     """
+    cache_key = (article_id, original)
+    info = get_cached_audio_info(cache_key)
+    if info is None:
+        article = db.query(ListeningArticle).filter(ListeningArticle.id == article_id).first()
+        if not article or not article.audio_file_path:
+            raise HTTPException(status_code=404, detail="音频不存在")
+
+        abs_path = os.path.join(audio_storage_root(), article.audio_file_path)
+        if not os.path.exists(abs_path):
+            raise HTTPException(status_code=404, detail="音频文件不存在")
+        serve_path, media_type, version = _article_audio_source(article, original)
+        if serve_path == abs_path and not original:
+            # 旧音频还没有播放版：这次先发原文件，后台补转码（播放版生成后版本号会变）
+            audio_transcoder.schedule(abs_path)
+        upload = get_upload(db, article.audio_file_path)
+        etag_key = None
+        if upload:
+            etag_key = upload.sha256[:32] if serve_path == abs_path else f"{upload.sha256[:32]}-{RENDITION_STREAM}"
+        info = build_audio_info(serve_path, version, media_type, etag_key)
+        # 播放版还没生成时只短暂缓存，转码完成后尽快切换过去
+        cache_audio_info(cache_key, info, None if serve_path != abs_path or original else 60)
+
+    if v and v == info.version:
+        cache_control = f"public, max-age={AUDIO_IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        # 不带版本号的旧地址：允许缓存但每次用 ETag 校验，未变化时只回 304
+        cache_control = "public, no-cache"
+    return AudioRangeResponse(info, request.headers, cache_control)
+
+
+@router.get("/audio/{article_id}/peaks")
+async def get_article_audio_peaks(
+    article_id: int,
+    db: Session = Depends(get_db)
+):
+    """已保存文章音频的波形峰值（与 /audio/{article_id} 一样不鉴权）；旧音频没有峰值文件时现算一次"""
     article = db.query(ListeningArticle).filter(ListeningArticle.id == article_id).first()
     if not article or not article.audio_file_path:
         raise HTTPException(status_code=404, detail="音频不存在")
 
-    abs_path = os.path.join(_audio_storage_root(), article.audio_file_path)
+    abs_path = os.path.join(audio_storage_root(), article.audio_file_path)
     if not os.path.exists(abs_path):
         raise HTTPException(status_code=404, detail="音频文件不存在")
+    return _peaks_response(await _ensure_peaks(abs_path, article.audio_duration_seconds or 0.0))
 
-    media_type = article.audio_mimetype or "audio/mpeg"
-    file_size = os.path.getsize(abs_path)
-    range_header = request.headers.get("range")
-
-    if range_header:
-        match = re.match(r"bytes=(\d+)-(\d*)", range_header)
-        if match:
-            start = int(match.group(1))
-            end = int(match.group(2)) if match.group(2) else file_size - 1
-            end = min(end, file_size - 1)
-
-            if start >= file_size or start > end:
-                # 请求范围不合法，返回416并附带真实文件大小供客户端重新请求
-                raise HTTPException(
-                    status_code=416,
-                    headers={"Content-Range": f"bytes */{file_size}"},
-                )
-
-            headers = {
-                "Content-Range": f"bytes {start}-{end}/{file_size}",
-                "Accept-Ranges": "bytes",
-                "Content-Length": str(end - start + 1),
-            }
-            return StreamingResponse(
-                _iter_file_range(abs_path, start, end),
-                status_code=206,
-                media_type=media_type,
-                headers=headers,
-            )
 
-    # 没有 Range 请求头：返回整个文件，同时声明支持 Range（供浏览器后续按需请求）
-    return FileResponse(
-        abs_path,
-        media_type=media_type,
-        headers={"Accept-Ranges": "bytes"},
-    )
+@router.get("/peaks")
+async def get_temp_audio_peaks(
+    temp_audio_id: str,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """排课预览阶段（文章还没保存）按上传返回的 temp_audio_id 取波形峰值"""
+    root = os.path.realpath(audio_storage_root())
+    abs_path = os.path.realpath(audio_abs_path(temp_audio_id))
+    if not abs_path.startswith(root + os.sep) or not os.path.isfile(abs_path):
+        raise HTTPException(status_code=404, detail="音频文件不存在，请重新上传")
+    upload = get_upload(db, temp_audio_id)
+    duration = upload.duration_seconds if upload else None
+    return _peaks_response(await _ensure_peaks(abs_path, duration or 0.0))
 
 
 @router.post("/lookup-word", response_model=LookupWordResponse)
 async def lookup_word(
     req: LookupWordRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    """双击单词 → AI 给出文章上下文中的中文释义（与阅读课共用同一套prompt）"""
-    prompt = build_lookup_prompt(req.word, req.article_context)
-
-    # call_llm 是同步网络调用，放到线程池跑，避免阻塞事件循环
-    loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as executor:
-        meaning = await loop.run_in_executor(executor, call_llm, prompt)
+    """双击单词 → AI 给出文章上下文中的中文释义（与阅读课共用同一套prompt和查词缓存）"""
+    meaning = await lookup_word_meaning(req.word, req.article_context, req.word_offset)
 
     return LookupWordResponse(
         word=req.word,
-        chinese_meaning=meaning.strip()
+        chinese_meaning=meaning
     )
 
 
 @router.post("/create-anti-forget")
 async def create_listening_anti_forget(
     req: CreateListeningAntiForgetRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """听力课结课后创建抗遗忘（老师审查后调用），结构与阅读课的create-anti-forget一致"""
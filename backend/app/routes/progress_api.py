@@ -5,8 +5,9 @@ from typing import List, Optional
 from pydantic import BaseModel
 
 from app.database import get_db
-from app.models import LearningProgress, Student, User
-from app.routes.auth import get_current_user
+from app.models import LearningProgress, Student
+from app.routes.auth import get_current_principal
+from app.services.principal_cache import Principal
 from app.logger import get_logger
 from app.database_safety import safe_transaction
 
@@ -38,7 +39,7 @@ class ProgressResponse(BaseModel):
 @safe_transaction("保存学习进度")
 async def create_or_update_progress(
     progress_data: ProgressCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """创建或更新学习进度"""
@@ -90,7 +91,7 @@ async def create_or_update_progress(
 async def get_student_progress(
     student_id: int,
     word_set_name: Optional[str] = None,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取学生的学习进度"""
@@ -127,7 +128,7 @@ async def get_word_progress(
     student_id: int,
     word_set_name: str,
     word_index: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取单个单词的学习进度"""
@@ -165,7 +166,7 @@ async def get_word_progress(
 async def get_grid_stats(
     student_id: int,
     word_set_name: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取九宫格统计数据（按学习阶段分组）"""
@@ -228,7 +229,7 @@ class BatchProgressUpdate(BaseModel):
 @safe_transaction("批量更新学习进度")
 async def batch_update_progress(
     batch_data: BatchProgressUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """批量更新学习进度（训后检测使用）"""
@@ -286,7 +287,7 @@ class CompleteTaskRequest(BaseModel):
 @safe_transaction("标记任务完成")
 async def complete_task(
     task_data: CompleteTaskRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """标记某个任务完成（用于阶段切换）"""
@@ -1,24 +1,32 @@
 """阅读课 API"""
 import re
 import json
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Any, Awaitable, Callable, List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
 from app.database import get_db
-from app.models import ReadingArticle, Schedule, User, LearningProgress, Word, WordSet, AntiForgetSession, Student
-from app.routes.auth import get_current_user
+from app.models import ReadingArticle, Schedule, LearningProgress, Word, WordSet, AntiForgetSession, Student
+from app.routes.auth import get_current_principal
+from app.services.principal_cache import Principal
+from app.services.llm_scheduler import PRIORITY_BULK
 from app.services.llm_common import (
-    count_words, call_llm, build_translation_prompt, build_lookup_prompt,
-    generate_translation_sync as _generate_translation_sync,
+    count_words, call_llm, stream_llm, build_translation_prompt, generate_translation,
 )
+from app.services.sse import sse_response
+from app.services.article_validation import (
+    find_missing_words, trim_to_max_words, append_patch, validation_issues,
+)
+from app.services.word_lookup import lookup_word_meaning, prewarm_word_lookups
+from app.services.job_queue import job_queue
 
 router = APIRouter(prefix="/api/reading", tags=["阅读课"])
 
+# 首次生成后最多定点修补几次（每次修补是一次很短的 LLM 调用）
+ARTICLE_MAX_PATCH_ATTEMPTS = 2
+
 
 # word count 目标范围
 def get_word_count_range(num_words: int):
@@ -46,6 +54,17 @@ class GenerateResponse(BaseModel):
     word_count: int
     words_used: List[WordItem]
 
+class GenerateJobResponse(BaseModel):
+    job_id: str
+    status: str
+    stage: Optional[str] = None
+    stages: List[str] = []
+    partial: dict = {}                             # 阶段性结果：文章生成完即可先展示 article/word_count
+    result: Optional[GenerateResponse] = None      # 全部阶段完成后的最终结果
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
+
 class SaveArticleRequest(BaseModel):
     word_set_name: str
     words_used: List[WordItem]
@@ -78,6 +97,7 @@ class BindScheduleRequest(BaseModel):
 class LookupWordRequest(BaseModel):
     word: str
     article_context: str   # 整篇文章，用于上下文理解
+    word_offset: Optional[int] = None  # 被点击的词在 article_context 中的字符位置，用于只截取附近几句送 LLM
 
 class LookupWordResponse(BaseModel):
     word: str
@@ -96,7 +116,7 @@ class CreateReadingAntiForgetRequest(BaseModel):
 
 
 # ── 工具函数 ──────────────────────────────────────────────────
-# count_words / call_llm / build_translation_prompt / build_lookup_prompt / generate_translation_sync
+# count_words / call_llm / build_translation_prompt / build_lookup_prompt / generate_translation
 # 已抽取到 app/services/llm_common.py，供阅读课和听力课共用
 
 def build_article_prompt(words: List[WordItem], min_wc: int, max_wc: int) -> str:
@@ -117,41 +137,87 @@ Requirements:
 """
 
 
-def generate_article_sync(words: List[WordItem], min_wc: int, max_wc: int) -> str:
-    """同步生成文章（在 executor 中运行）"""
-    prompt = build_article_prompt(words, min_wc, max_wc)
-    article = ""
-    max_retries = 3
-
-    for attempt in range(max_retries):
-        article = call_llm(prompt).strip()
-        wc = count_words(article)
+def build_patch_prompt(article: str, words: List[WordItem], target_words: int, new_paragraph: bool) -> str:
+    """修补 prompt：只让 LLM 补写一段/一两句接在原文后面，而不是整篇重写"""
+    if words:
+        word_list = ", ".join([f"{w.english} ({w.chinese})" for w in words])
+        use_words = f"\nYou MUST use ALL of these words naturally: {word_list}\n"
+    else:
+        use_words = ""
+    if new_paragraph:
+        shape = f"ONE new paragraph of about {target_words} words that continues the passage naturally"
+    else:
+        shape = "ONE or TWO short sentences that can be appended to the end of the last paragraph"
+    return f"""You are an English teacher extending a reading passage for a student.
 
-        article_lower = article.lower()
-        missing = [w.english for w in words if w.english.lower() not in article_lower]
+Here is the passage so far:
+{article}
 
-        print(f"第{attempt+1}次生成: {wc}词, 缺失: {missing}")
+Write {shape}.{use_words}
+Requirements:
+1. Use ONLY elementary/middle-school level vocabulary (apart from the words listed above) and simple sentence structure.
+2. Keep the same topic, characters and style as the passage.
+3. Output ONLY the new text. Do NOT repeat the passage, no titles, no explanations, no markdown formatting.
+"""
 
-        if min_wc <= wc <= max_wc and len(missing) == 0:
-            break
 
-        issues = []
-        if wc < min_wc:
-            issues.append(f"too short ({wc} words, minimum {min_wc})")
-        elif wc > max_wc:
-            issues.append(f"too long ({wc} words, maximum {max_wc})")
-        if missing:
-            issues.append(f"forgot to use: {', '.join(missing)}")
+async def _generate_text(prompt: str, attempt: int,
+                         on_event: Optional[Callable[[str, Any], Awaitable[None]]]) -> str:
+    if on_event is None:
+        return (await call_llm(prompt, priority=PRIORITY_BULK)).strip()
+    parts = []
+    async for delta in stream_llm(prompt, priority=PRIORITY_BULK):
+        parts.append(delta)
+        await on_event("article_delta", {"attempt": attempt, "delta": delta})
+    return "".join(parts).strip()
+
+
+async def generate_article_text(words: List[WordItem], min_wc: int, max_wc: int,
+                                on_event: Optional[Callable[[str, Any], Awaitable[None]]] = None) -> str:
+    """生成文章，再在本地校验并做定点修补（见 app/services/article_validation.py）
+
+    - 超出字数上限：本地删掉不含目标词的句子，不调 LLM；
+    - 漏用目标词 / 字数不足：只让 LLM 补一两句或一段接到文末，最多修补 ARTICLE_MAX_PATCH_ATTEMPTS 次；
+    一篇文章最多调用 LLM 1 + ARTICLE_MAX_PATCH_ATTEMPTS 次，与以前整篇重写3次的上限相同，
+    但通常一次生成 + 本地删句就能达标。
+
+    on_event（可选）：流式模式，首次生成时逐段推送 article_delta，
+    每次修补/删句后推送 article_revised（data 为修改后的整篇文章，前端直接替换显示）。
+    """
+    targets = [w.english for w in words]
+    article = await _generate_text(build_article_prompt(words, min_wc, max_wc), 1, on_event)
+
+    for attempt in range(ARTICLE_MAX_PATCH_ATTEMPTS + 1):
+        if count_words(article) > max_wc:
+            trimmed = trim_to_max_words(article, targets, min_wc, max_wc)
+            if trimmed != article:
+                article = trimmed
+                if on_event is not None:
+                    await on_event("article_revised", {"article": article, "reason": "trim"})
 
-        prompt = build_article_prompt(words, min_wc, max_wc) + \
-            f"\n\nIMPORTANT - fix these problems from your previous attempt: {'; '.join(issues)}."
+        wc = count_words(article)
+        missing = find_missing_words(article, targets)
+        issues = validation_issues(article, targets, min_wc, max_wc, missing)
+        print(f"第{attempt+1}次校验: {wc}词, 问题: {issues}")
 
-    return article
+        # 只剩"太长且删不动"（每句都含目标词）时修补也无济于事，直接接受
+        if not missing and wc >= min_wc:
+            break
+        if attempt == ARTICLE_MAX_PATCH_ATTEMPTS:
+            break
 
+        too_short = wc < min_wc
+        target_words = max((min_wc + max_wc) // 2 - wc, 12 * len(missing)) if too_short else 0
+        missing_items = [w for w in words if w.english in missing]
+        patch = await call_llm(
+            build_patch_prompt(article, missing_items, target_words, new_paragraph=too_short),
+            priority=PRIORITY_BULK,
+        )
+        article = append_patch(article, patch, as_new_paragraph=too_short)
+        if on_event is not None:
+            await on_event("article_revised", {"article": article, "reason": "patch"})
 
-def generate_translation_sync(article: str) -> List[str]:
-    """同步生成翻译（委托给 llm_common 的共用实现）"""
-    return _generate_translation_sync(article)
+    return article
 
 
 # ── API 端点 ──────────────────────────────────────────────────
@@ -159,7 +225,7 @@ def generate_translation_sync(article: str) -> List[str]:
 @router.post("/generate", response_model=GenerateResponse)
 async def generate_article(
     req: GenerateRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """并行生成文章 + 中文翻译"""
     if not req.words:
@@ -172,17 +238,10 @@ async def generate_article(
     print(f"目标字数: {min_wc}-{max_wc}")
 
     # 第一步：先生成文章
-    loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as executor:
-        article = await loop.run_in_executor(
-            executor, generate_article_sync, req.words, min_wc, max_wc
-        )
+    article = await generate_article_text(req.words, min_wc, max_wc)
 
-    # 第二步：并行生成翻译
-    with ThreadPoolExecutor() as executor:
-        translation = await loop.run_in_executor(
-            executor, generate_translation_sync, article
-        )
+    # 第二步：生成翻译（长文章内部会分块并行）
+    translation = await generate_translation(article)
 
     wc = count_words(article)
     print(f"最终: {wc}词, {len(translation)}段翻译")
@@ -195,31 +254,129 @@ async def generate_article(
     )
 
 
+@router.post("/generate-stream")
+async def generate_article_stream(
+    req: GenerateRequest,
+    current_user: Principal = Depends(get_current_principal),
+):
+    """流式生成文章 + 翻译（SSE）
+
+    事件顺序：article_delta* → article_revised*（本地删句/补写后的整篇文章）→ article → paragraph* → done，
+    出错时以 error 结束。paragraph 的 data 是 {index, text}，同一 index 可能推送多次，以最后一次为准；
+    done 的 data 与 /generate 的返回值相同。
+    """
+    if not req.words:
+        raise HTTPException(status_code=400, detail="单词列表不能为空")
+
+    min_wc, max_wc = get_word_count_range(len(req.words))
+
+    async def producer(emit):
+        article = await generate_article_text(req.words, min_wc, max_wc, on_event=emit)
+        wc = count_words(article)
+        await emit("article", {"article": article, "word_count": wc})
+
+        async def on_paragraph(index: int, text: str):
+            await emit("paragraph", {"index": index, "text": text})
+
+        translation = await generate_translation(article, on_paragraph=on_paragraph)
+        return GenerateResponse(
+            article=article,
+            translation=translation,
+            word_count=wc,
+            words_used=req.words,
+        ).dict()
+
+    return sse_response(producer)
+
+
+def _build_generate_stages(req: GenerateRequest):
+    """生成文章的后台任务流水线：先生成文章，再生成翻译"""
+    min_wc, max_wc = get_word_count_range(len(req.words))
+
+    async def stage_article(job):
+        article = await generate_article_text(req.words, min_wc, max_wc)
+        job.partial["article"] = article
+        job.partial["word_count"] = count_words(article)
+
+    async def stage_translation(job):
+        article = job.partial["article"]
+        translation = await generate_translation(article)
+        job.partial["translation"] = translation
+        job.result = GenerateResponse(
+            article=article,
+            translation=translation,
+            word_count=job.partial["word_count"],
+            words_used=req.words,
+        ).dict()
+
+    return [("article", stage_article), ("translation", stage_translation)]
+
+
+def _get_owned_job(job_id: str, current_user: Principal):
+    job = job_queue.get(job_id)
+    if not job or job.kind != "reading_generate":
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    if job.owner_id != current_user.id and current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="权限不足")
+    return job
+
+
+@router.post("/generate-jobs", response_model=GenerateJobResponse)
+async def submit_generate_job(
+    req: GenerateRequest,
+    current_user: Principal = Depends(get_current_principal),
+):
+    """提交后台生成任务（文章 + 翻译），立即返回 job_id，前端轮询进度"""
+    if not req.words:
+        raise HTTPException(status_code=400, detail="单词列表不能为空")
+
+    job = job_queue.submit("reading_generate", current_user.id, _build_generate_stages(req))
+    return GenerateJobResponse(**job.to_dict())
+
+
+@router.get("/generate-jobs/{job_id}", response_model=GenerateJobResponse)
+async def get_generate_job(
+    job_id: str,
+    current_user: Principal = Depends(get_current_principal),
+):
+    """查询后台生成任务的状态、当前阶段和阶段性结果"""
+    job = _get_owned_job(job_id, current_user)
+    return GenerateJobResponse(**job.to_dict())
+
+
+@router.delete("/generate-jobs/{job_id}", response_model=GenerateJobResponse)
+async def cancel_generate_job(
+    job_id: str,
+    current_user: Principal = Depends(get_current_principal),
+):
+    """取消后台生成任务（已结束的任务原样返回）"""
+    job = _get_owned_job(job_id, current_user)
+    job_queue.cancel(job_id)
+    return GenerateJobResponse(**job.to_dict())
+
+
 @router.post("/lookup-word", response_model=LookupWordResponse)
 async def lookup_word(
     req: LookupWordRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    """双击单词 → AI 给出文章上下文中的中文释义"""
-    prompt = build_lookup_prompt(req.word, req.article_context)
-
-    loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as executor:
-        meaning = await loop.run_in_executor(executor, call_llm, prompt)
+    """双击单词 → AI 给出文章上下文中的中文释义（按单词+所在句子缓存）"""
+    meaning = await lookup_word_meaning(req.word, req.article_context, req.word_offset)
 
     return LookupWordResponse(
         word=req.word,
-        chinese_meaning=meaning.strip()
+        chinese_meaning=meaning
     )
 
 
 @router.post("/articles", response_model=SaveArticleResponse)
 async def save_article(
     req: SaveArticleRequest,
-    current_user: User = Depends(get_current_user),
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
-    """保存文章（含翻译）"""
+    """保存文章（含翻译），并在后台把目标词预热进查词缓存"""
     article = ReadingArticle(
         word_set_name=req.word_set_name,
         words_used=[w.dict() for w in req.words_used],
@@ -232,6 +389,10 @@ async def save_article(
     db.commit()
     db.refresh(article)
 
+    background_tasks.add_task(
+        prewarm_word_lookups, [w.english for w in req.words_used], req.article_content
+    )
+
     return SaveArticleResponse(
         id=article.id,
         word_count=article.word_count,
@@ -243,10 +404,11 @@ async def save_article(
 async def update_article(
     article_id: int,
     req: UpdateArticleRequest,
-    current_user: User = Depends(get_current_user),
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
-    """编辑文章（排课时小修改）"""
+    """编辑文章（排课时小修改），改动过的句子重新预热目标词"""
     article = db.query(ReadingArticle).filter(ReadingArticle.id == article_id).first()
     if not article:
         raise HTTPException(status_code=404, detail="文章不存在")
@@ -259,6 +421,12 @@ async def update_article(
     db.commit()
     db.refresh(article)
 
+    background_tasks.add_task(
+        prewarm_word_lookups,
+        [w.get("english", "") for w in (article.words_used or [])],
+        article.article_content,
+    )
+
     return SaveArticleResponse(
         id=article.id,
         word_count=article.word_count,
@@ -270,7 +438,7 @@ async def update_article(
 async def bind_schedule(
     article_id: int,
     req: BindScheduleRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """将文章绑定到课程"""
@@ -285,7 +453,7 @@ async def bind_schedule(
 @router.get("/articles/by-schedule/{schedule_id}", response_model=ArticleResponse)
 async def get_article_by_schedule(
     schedule_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """根据课程ID获取文章（上课时使用）"""
@@ -311,7 +479,7 @@ async def get_article_by_schedule(
 async def get_learned_words(
     student_id: int,
     word_set_name: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取学生格子1-7的已学单词"""
@@ -345,7 +513,7 @@ async def get_learned_words(
 @router.post("/create-anti-forget")
 async def create_reading_anti_forget(
     req: CreateReadingAntiForgetRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """阅读课结课后创建抗遗忘（老师审查后调用）"""
@@ -7,7 +7,8 @@ from datetime import datetime, date
 
 from app.database import get_db
 from app.models import Schedule, Student, User
-from app.routes.auth import get_current_user
+from app.routes.auth import get_current_principal
+from app.services.principal_cache import Principal
 from app.logger import get_logger
 from app.database_safety import safe_transaction
 
@@ -53,7 +54,7 @@ class ScheduleResponse(BaseModel):
 @safe_transaction("创建课程安排")
 async def create_schedule(
     schedule_data: ScheduleCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """创建课程安排
@@ -147,7 +148,7 @@ async def create_schedule(
 @router.get("", response_model=List[ScheduleResponse])
 async def get_schedules(
     teacher_id: Optional[str] = None,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取课程列表
@@ -189,7 +190,7 @@ async def get_schedules(
 @router.put("/{schedule_id}/complete")
 async def complete_schedule(
     schedule_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """标记课程为已完成
@@ -247,7 +248,7 @@ async def complete_schedule(
 @router.delete("/{schedule_id}")
 async def delete_schedule(
     schedule_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """删除课程
@@ -276,7 +277,7 @@ async def delete_schedule(
 @router.put("/{schedule_id}/reset-timer")
 async def reset_schedule_timer(
     schedule_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """重置课程计时器（仅管理员）
@@ -7,8 +7,9 @@ from pydantic import BaseModel
 from datetime import datetime, date
 
 from app.database import get_db
-from app.models import StudentReview, Student, User
-from app.routes.auth import get_current_user
+from app.models import StudentReview, Student
+from app.routes.auth import get_current_principal, resolve_student_id
+from app.services.principal_cache import Principal
 from app.logger import get_logger
 from app.database_safety import safe_transaction
 
@@ -44,7 +45,7 @@ class ReviewResponse(BaseModel):
 @safe_transaction("创建学生复习记录")
 async def create_student_review(
     review_data: ReviewCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """创建学生复习记录（训后检测完成时调用）"""
@@ -88,17 +89,13 @@ async def create_student_review(
 @router.get("/student/{student_id}", response_model=List[ReviewResponse])
 async def get_student_reviews(
     student_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取学生的所有复习记录"""
-    # 学生端：验证是否是自己的记录
+    # 学生端：验证是否是自己的记录（student_id 来自令牌声明，不用查库）
     if current_user.role == 'student':
-        student = db.query(Student).filter(
-            Student.id == student_id,
-            Student.user_id == current_user.id
-        ).first()
-        if not student:
+        if resolve_student_id(current_user, db) != student_id:
             raise HTTPException(status_code=403, detail="无权访问")
     else:
         # 教师/管理员：验证学生归属
@@ -129,7 +126,7 @@ async def get_student_reviews(
 @router.get("/{review_id}", response_model=ReviewResponse)
 async def get_review(
     review_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取特定复习记录"""
@@ -140,15 +137,14 @@ async def get_review(
     if not review:
         raise HTTPException(status_code=404, detail="复习记录不存在")
 
-    # 权限验证
-    student = db.query(Student).filter(Student.id == review.student_id).first()
-    if not student:
-        raise HTTPException(status_code=404, detail="学生不存在")
-
+    # 权限验证（学生只能看自己的记录，直接比对令牌里的 student_id）
     if current_user.role == 'student':
-        if student.user_id != current_user.id:
+        if resolve_student_id(current_user, db) != review.student_id:
             raise HTTPException(status_code=403, detail="无权访问")
     else:
+        student = db.query(Student).filter(Student.id == review.student_id).first()
+        if not student:
+            raise HTTPException(status_code=404, detail="学生不存在")
         if student.teacher_id != current_user.id:
             raise HTTPException(status_code=403, detail="无权访问")
 
@@ -167,7 +163,7 @@ async def get_review(
 async def toggle_word_star(
     review_id: str,
     word_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """切换单词的星标状态"""
@@ -178,15 +174,14 @@ async def toggle_word_star(
     if not review:
         raise HTTPException(status_code=404, detail="复习记录不存在")
 
-    # 权限验证
-    student = db.query(Student).filter(Student.id == review.student_id).first()
-    if not student:
-        raise HTTPException(status_code=404, detail="学生不存在")
-
+    # 权限验证（学生只能看自己的记录，直接比对令牌里的 student_id）
     if current_user.role == 'student':
-        if student.user_id != current_user.id:
+        if resolve_student_id(current_user, db) != review.student_id:
             raise HTTPException(status_code=403, detail="无权访问")
     else:
+        student = db.query(Student).filter(Student.id == review.student_id).first()
+        if not student:
+            raise HTTPException(status_code=404, detail="学生不存在")
         if student.teacher_id != current_user.id:
             raise HTTPException(status_code=403, detail="无权访问")
 
@@ -219,7 +214,7 @@ async def toggle_word_star(
 @safe_transaction("删除复习记录")
 async def delete_review(
     review_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """删除复习记录"""
@@ -7,7 +7,8 @@ from datetime import datetime
 
 from app.database import get_db
 from app.models import Student, User
-from app.routes.auth import get_current_user
+from app.routes.auth import get_current_principal, forget_deleted_user, user_deleted
+from app.services.principal_cache import Principal
 from app.logger import get_logger
 from app.database_safety import safe_transaction, validate_business_rule
 
@@ -48,7 +49,7 @@ class StudentResponse(BaseModel):
 @safe_transaction("创建学生")
 async def create_student(
     student_data: StudentCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """创建学生
@@ -134,7 +135,7 @@ async def create_student(
 @router.get("", response_model=List[StudentResponse])
 async def get_students(
     teacher_id: Optional[str] = None,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取学生列表
@@ -172,7 +173,7 @@ async def get_students(
 @router.get("/{student_id}", response_model=StudentResponse)
 async def get_student(
     student_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取单个学生信息"""
@@ -205,7 +206,7 @@ async def get_student(
 async def update_student(
     student_id: int,
     student_update: StudentUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """更新学生信息"""
@@ -273,7 +274,7 @@ async def update_student(
 @safe_transaction("删除学生")
 async def delete_student(
     student_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """删除学生及其关联的用户账号"""
@@ -298,11 +299,14 @@ async def delete_student(
     # 删除关联的用户账号
     if user:
         logger.info(f"删除学生 {student.name} (ID={student.id}) 及其用户账号 {user.username} (ID={user.id})")
+        forget_deleted_user(db, user)
         db.delete(user)
     else:
         logger.warning(f"删除学生 {student.name} (ID={student.id})，但未找到关联的用户账号 (user_id={student.user_id})")
 
     db.commit()
+    if user:
+        user_deleted(user)
 
     return {"message": "学生删除成功"}
 
@@ -312,7 +316,7 @@ async def delete_student(
 async def deduct_student_hours(
     student_id: int,
     hours: float,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """
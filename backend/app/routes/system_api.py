@@ -0,0 +1,38 @@
+"""系统运行状态 API（仅管理员）"""
+import asyncio
+
+from fastapi import APIRouter, Depends
+
+from app.routes.auth import get_current_active_admin
+from app.services.principal_cache import Principal
+from app.services.audio_gc import audio_gc, storage_report
+from app.services.llm_scheduler import llm_scheduler
+
+router = APIRouter(prefix="/api/system", tags=["系统状态"])
+
+
+@router.get("/llm-queue")
+async def get_llm_queue_stats(
+    current_user: Principal = Depends(get_current_active_admin),
+):
+    """查看 GLM 调用调度器的排队深度、在途请求数和等待时间"""
+    return llm_scheduler.stats()
+
+
+@router.get("/audio-storage")
+async def get_audio_storage_report(
+    current_user: Principal = Depends(get_current_active_admin),
+):
+    """听力课音频存储占用：总量、未绑定文章的孤儿文件，按老师和按月份的字节数，以及上次自动清理的结果"""
+    report = await asyncio.to_thread(storage_report)
+    report["last_sweep"] = audio_gc.last_result
+    return report
+
+
+@router.post("/audio-storage/sweep")
+async def sweep_audio_storage(
+    dry_run: bool = True,
+    current_user: Principal = Depends(get_current_active_admin),
+):
+    """立即清理一次孤儿音频；默认只演练（dry_run=true）返回会删除多少，传 dry_run=false 才真正删除"""
+    return await audio_gc.sweep(dry_run=dry_run)
@@ -7,8 +7,9 @@ import pandas as pd
 import io
 
 from app.database import get_db
-from app.models import WordSet, Word, User
-from app.routes.auth import get_current_user
+from app.models import WordSet, Word
+from app.routes.auth import get_current_principal
+from app.services.principal_cache import Principal
 from app.logger import get_logger
 
 logger = get_logger("words")
@@ -52,7 +53,7 @@ class WordSetResponse(BaseModel):
 @router.post("/sets", response_model=WordSetResponse)
 async def create_word_set(
     word_set_data: WordSetCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """创建单词集"""
@@ -80,7 +81,7 @@ async def create_word_set(
 
 @router.get("/sets", response_model=List[WordSetResponse])
 async def get_word_sets(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取所有单词集（全局共享）"""
@@ -101,7 +102,7 @@ async def get_word_sets(
 @router.get("/sets/{word_set_name}/words", response_model=List[WordResponse])
 async def get_words_by_set(
     word_set_name: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取指定单词集的所有单词"""
@@ -124,7 +125,7 @@ async def get_words_by_set(
 async def add_word_to_set(
     word_set_name: str,
     word_data: WordCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """添加单词到单词集"""
@@ -153,7 +154,7 @@ async def add_word_to_set(
 async def import_words_from_excel(
     word_set_name: str,
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """从Excel导入单词"""
@@ -195,7 +196,7 @@ async def import_words_from_excel(
 async def update_word(
     word_id: int,
     word_data: WordUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """更新单词（只改英文/中文）"""
@@ -213,7 +214,7 @@ async def update_word(
 @router.delete("/words/{word_id}")
 async def delete_word(
     word_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """删除单词"""
@@ -230,7 +231,7 @@ async def delete_word(
 async def rename_word_set(
     word_set_name: str,
     rename_data: dict,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """重命名单词集"""
@@ -258,7 +259,7 @@ async def rename_word_set(
 @router.delete("/sets/{word_set_name}")
 async def delete_word_set(
     word_set_name: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """删除单词集及其所有单词"""
@@ -284,7 +285,7 @@ async def delete_word_set(
 async def batch_add_words(
     word_set_name: str,
     words: List[WordCreate],
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """批量添加单词到单词集"""
@@ -0,0 +1,269 @@
+"""生成文章的本地校验与修补 - 代替"不达标就整篇重写"
+
+以前字数不对或漏用目标词就把整篇文章重新生成（最多3次），而且用子串 `in` 判断是否用到目标词：
+"cat" 会被 "category" 误判为已使用，"study" 写成 "studied" 又会被误判为漏用。这里：
+- 按单词切分后匹配目标词及其常见屈折变化（复数、过去式、进行时、比较级，少量常用不规则动词），
+  词组按词序整体匹配；
+- 超出字数上限时在本地删掉不含目标词的句子，不需要再调 LLM；
+- 漏词或字数不足时只让 LLM 补一两句/一段（见 reading_api 里的修补 prompt），再拼回原文。
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from app.services.llm_common import count_words
+
+_VOWELS = set("aeiou")
+
+# 常用不规则动词/形容词变化（只列课本高频词，其余按规则变化处理）
+_IRREGULAR_FORMS: Dict[str, Sequence[str]] = {
+    "be": ("am", "is", "are", "was", "were", "been", "being"),
+    "have": ("has", "had", "having"),
+    "do": ("does", "did", "done", "doing"),
+    "go": ("goes", "went", "gone", "going"),
+    "begin": ("began", "begun"),
+    "break": ("broke", "broken"),
+    "bring": ("brought",),
+    "build": ("built",),
+    "buy": ("bought",),
+    "catch": ("caught",),
+    "choose": ("chose", "chosen"),
+    "come": ("came",),
+    "draw": ("drew", "drawn"),
+    "drink": ("drank", "drunk"),
+    "drive": ("drove", "driven"),
+    "eat": ("ate", "eaten"),
+    "fall": ("fell", "fallen"),
+    "feel": ("felt",),
+    "fight": ("fought",),
+    "find": ("found",),
+    "fly": ("flew", "flown", "flies"),
+    "forget": ("forgot", "forgotten"),
+    "get": ("got", "gotten"),
+    "give": ("gave", "given"),
+    "grow": ("grew", "grown"),
+    "hear": ("heard",),
+    "hide": ("hid", "hidden"),
+    "hold": ("held",),
+    "keep": ("kept",),
+    "know": ("knew", "known"),
+    "leave": ("left",),
+    "lose": ("lost",),
+    "make": ("made",),
+    "mean": ("meant",),
+    "meet": ("met",),
+    "pay": ("paid",),
+    "ride": ("rode", "ridden"),
+    "rise": ("rose", "risen"),
+    "run": ("ran",),
+    "say": ("said",),
+    "see": ("saw", "seen"),
+    "seek": ("sought",),
+    "sell": ("sold",),
+    "send": ("sent",),
+    "sing": ("sang", "sung"),
+    "sit": ("sat",),
+    "sleep": ("slept",),
+    "speak": ("spoke", "spoken"),
+    "spend": ("spent",),
+    "stand": ("stood",),
+    "steal": ("stole", "stolen"),
+    "swim": ("swam", "swum"),
+    "take": ("took", "taken"),
+    "teach": ("taught",),
+    "tell": ("told",),
+    "think": ("thought",),
+    "throw": ("threw", "thrown"),
+    "understand": ("understood",),
+    "wake": ("woke", "woken"),
+    "wear": ("wore", "worn"),
+    "win": ("won",),
+    "write": ("wrote", "written"),
+    "good": ("better", "best"),
+    "bad": ("worse", "worst"),
+    "child": ("children",),
+    "man": ("men",),
+    "woman": ("women",),
+    "person": ("people",),
+    "foot": ("feet",),
+    "tooth": ("teeth",),
+    "mouse": ("mice",),
+}
+
+# 有比较级/最高级/-ly 副词的常用形容词（只列课本高频词）；其他词不加 -er/-est/-ly，
+# 否则名词/动词会误配到无关的单词（car → carer、cat → cater）
+_GRADABLE_ADJECTIVES: Set[str] = {
+    "big", "small", "tall", "short", "long", "fast", "slow", "quick", "high", "low",
+    "old", "young", "new", "hot", "cold", "warm", "cool", "wet", "dry", "thin", "fat",
+    "large", "late", "safe", "wide", "nice", "fine", "wise", "brave", "close", "simple",
+    "strong", "weak", "hard", "soft", "kind", "clean", "clear", "cheap", "rich", "poor",
+    "near", "loud", "quiet", "bright", "dark", "deep", "great", "sad", "sweet", "smart",
+    "strange", "light", "heavy", "happy", "easy", "busy", "early", "funny", "angry",
+    "lucky", "pretty", "dirty", "noisy", "lazy", "friendly", "healthy",
+}
+
+# 句末标点（可跟右引号/括号）后的空白；第 1 组是留在句子里的右引号/括号，第 2 组是句间分隔
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])([\"')\]]*)(\s+)")
+
+
+def tokenize(text: str) -> List[str]:
+    """小写单词序列；撇号、连字符处断开（"don't" → don, t；"well-known" → well, known）"""
+    return re.findall(r"[a-z]+", text.lower())
+
+
+def word_forms(word: str) -> Set[str]:
+    """单个单词的原形 + 常见屈折变化
+
+    只加真正的屈折词尾：-d 只用于以 e 结尾的词（like → liked），比较级/最高级/-ly 只用于
+    _GRADABLE_ADJECTIVES 里的形容词，否则 "car" 会匹配 "card"、"cat" 会匹配 "cater"。
+    有不规则变化的词（be / have / go ...）不再套用过去式规则，避免 "be" → "bed"。
+    """
+    w = word.lower()
+    irregular = _IRREGULAR_FORMS.get(w, ())
+    adjective = w in _GRADABLE_ADJECTIVES
+    forms = {w, w + "s", w + "es", w + "ing"}
+    if not irregular:
+        forms.add(w + "ed")
+        if w.endswith("e"):
+            forms.add(w + "d")
+    if adjective:
+        forms |= {w + "er", w + "est", w + "ly"}
+
+    if len(w) > 2 and w.endswith("y") and w[-2] not in _VOWELS:
+        stem = w[:-1]
+        forms |= {stem + "ies", stem + "ied"}
+        if adjective:
+            forms |= {stem + "ier", stem + "iest", stem + "ily"}
+    if w.endswith("ie"):
+        forms.add(w[:-2] + "ying")
+    if w.endswith("e"):
+        stem = w[:-1]
+        forms.add(stem + "ing")
+        if adjective:
+            forms |= {stem + "er", stem + "est"}
+    if w.endswith("fe"):
+        forms.add(w[:-2] + "ves")
+    elif w.endswith("f"):
+        forms.add(w[:-1] + "ves")
+    # 重读闭音节双写末尾辅音：stop → stopped / stopping，big → bigger
+    if (len(w) >= 3 and w[-1] not in _VOWELS and w[-1] not in "wxy"
+            and w[-2] in _VOWELS and w[-3] not in _VOWELS):
+        doubled = w + w[-1]
+        forms.add(doubled + "ing")
+        if not irregular:
+            forms.add(doubled + "ed")
+        if adjective:
+            forms |= {doubled + "er", doubled + "est"}
+
+    forms.update(irregular)
+    return forms
+
+
+def _phrase_forms(target: str) -> List[Set[str]]:
+    """目标词（可能是词组）→ 每个位置允许的词形集合"""
+    return [word_forms(token) for token in tokenize(target)]
+
+
+def _contains(tokens: Sequence[str], phrase: List[Set[str]]) -> bool:
+    if not phrase:
+        return True
+    n = len(phrase)
+    for i in range(len(tokens) - n + 1):
+        if all(tokens[i + k] in phrase[k] for k in range(n)):
+            return True
+    return False
+
+
+def find_missing_words(article: str, targets: Iterable[str]) -> List[str]:
+    """返回文章中没有用到（含屈折变化）的目标词，保持原顺序"""
+    tokens = tokenize(article)
+    return [t for t in targets if not _contains(tokens, _phrase_forms(t))]
+
+
+def split_paragraphs(article: str) -> List[str]:
+    return [p.strip() for p in re.split(r"\n{2,}", article) if p.strip()]
+
+
+def _split_sentences(paragraph: str) -> List[List[str]]:
+    """段落 → [[句子, 句子后面原来的分隔空白], ...]，最后一句的分隔为空，按顺序拼回就是原段落"""
+    sentences = []
+    pos = 0
+    for match in _SENTENCE_SPLIT.finditer(paragraph):
+        sentences.append([paragraph[pos:match.end(1)], match.group(2)])
+        pos = match.end()
+    sentences.append([paragraph[pos:], ""])
+    return sentences
+
+
+def trim_to_max_words(article: str, targets: Iterable[str], min_wc: int, max_wc: int) -> str:
+    """本地删句把文章压到 max_wc 以内，不调 LLM
+
+    只删不含任何目标词的句子，每段至少保留一句，删完不能低于 min_wc；
+    每次优先删"删掉后刚好达标"的最短句，没有就删最长的可删句。
+    压不下来时返回尽量删减后的结果，由调用方决定是否接受。
+    """
+    phrases = [_phrase_forms(t) for t in targets]
+    paragraphs = [_split_sentences(p) for p in split_paragraphs(article)]
+    wc = count_words(article)
+    removed = False
+
+    while wc > max_wc:
+        candidates = []
+        for p_idx, sentences in enumerate(paragraphs):
+            if len(sentences) <= 1:
+                continue
+            for s_idx, (sentence, _) in enumerate(sentences):
+                tokens = tokenize(sentence)
+                if any(_contains(tokens, phrase) for phrase in phrases):
+                    continue
+                s_wc = count_words(sentence)
+                if wc - s_wc >= min_wc:
+                    candidates.append((s_wc, p_idx, s_idx))
+        if not candidates:
+            break
+
+        fitting = [c for c in candidates if wc - c[0] <= max_wc]
+        # 同样长度时优先删靠后的句子，尽量保留开头的铺垫
+        if fitting:
+            s_wc, p_idx, s_idx = min(fitting, key=lambda c: (c[0], -c[1], -c[2]))
+        else:
+            s_wc, p_idx, s_idx = max(candidates, key=lambda c: (c[0], c[1], c[2]))
+        sentences = paragraphs[p_idx]
+        del sentences[s_idx]
+        if s_idx == len(sentences):
+            # 删的是段落最后一句：前一句变成结尾，去掉它后面的分隔
+            sentences[-1][1] = ""
+        wc -= s_wc
+        removed = True
+
+    if not removed:
+        return article
+    return "\n\n".join("".join(text + sep for text, sep in sentences) for sentences in paragraphs)
+
+
+def append_patch(article: str, patch: str, as_new_paragraph: bool) -> str:
+    """把 LLM 补写的句子接到最后一段末尾，或作为新的一段"""
+    patch = re.sub(r"\s+", " ", patch).strip()
+    if not patch:
+        return article
+    paragraphs = split_paragraphs(article)
+    if as_new_paragraph or not paragraphs:
+        paragraphs.append(patch)
+    else:
+        paragraphs[-1] = f"{paragraphs[-1]} {patch}"
+    return "\n\n".join(paragraphs)
+
+
+def validation_issues(article: str, targets: Iterable[str], min_wc: int, max_wc: int,
+                      missing: Optional[List[str]] = None) -> List[str]:
+    """生成日志/提示用的问题描述，空列表表示达标"""
+    wc = count_words(article)
+    if missing is None:
+        missing = find_missing_words(article, targets)
+    issues = []
+    if wc < min_wc:
+        issues.append(f"too short ({wc} words, minimum {min_wc})")
+    elif wc > max_wc:
+        issues.append(f"too long ({wc} words, maximum {max_wc})")
+    if missing:
+        issues.append(f"forgot to use: {', '.join(missing)}")
+    return issues
@@ -0,0 +1,307 @@
+"""腾讯云录音识别任务管理 - 持久化任务表 + 单个 asyncio 轮询器
+
+以前每次"自动对齐时间戳"都开一个线程池，在线程里 time.sleep(2) 轮询最多5分钟：
+每个请求占一个线程，客户端断开后识别结果也跟着丢失。现在：
+- align-timestamps 只登记一条 AsrJob，立即返回任务ID。任务只对创建者可见：同一音频——路径相同
+  或内容 sha256 相同——本人已有进行中/已成功的任务则直接复用；别人识别成功过的结果复制一份
+  给本人；别人的任务还在识别时，本人的任务排在后面等它完成后复制结果，都不重复付费识别；
+- 全局只有一个轮询协程，按 next_poll_at 挑出到期的任务，批量提交/查询（SDK 调用放到线程里，
+  同时最多 ASR_MAX_PARALLEL_REQUESTS 个），轮询间隔随次数指数增长到 ASR_POLL_MAX_INTERVAL_SECONDS；
+- 任务存在数据库里，服务重启后已提交的任务继续轮询；
+- 识别完成时把结果写进已保存的听力课文章（ListeningArticle.asr_raw_result），保存文章时也会带上。
+"""
+import os
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import or_
+
+from app.database import SessionLocal
+from app.logger import get_logger
+from app.models import AsrJob, AudioUpload, ListeningArticle
+from app.services.audio_storage import audio_abs_path, signed_audio_url
+from app.services.audio_transcode import RENDITION_ASR, RENDITION_SUFFIXES, audio_transcoder, existing_rendition
+from app.services.tencent_asr_client import create_rec_task, describe_task_status
+
+logger = get_logger("asr_jobs")
+
+ASR_JOB_PENDING = "pending"        # 已登记，等待提交给腾讯云
+ASR_JOB_SUBMITTED = "submitted"    # 已提交，等待识别完成
+ASR_JOB_SUCCEEDED = "succeeded"
+ASR_JOB_FAILED = "failed"
+
+# 首次查询前等待的秒数，以及之后每次的退避倍数和上限
+ASR_POLL_INITIAL_INTERVAL_SECONDS = 3.0
+ASR_POLL_BACKOFF_FACTOR = 1.5
+ASR_POLL_MAX_INTERVAL_SECONDS = 20.0
+# 提交后超过这么久仍未完成视为失败（腾讯云长音频一般几十秒内完成）
+ASR_JOB_TIMEOUT_SECONDS = int(os.getenv("ASR_JOB_TIMEOUT_SECONDS", "1800"))
+# 同时在线程里执行的腾讯云 SDK 调用数
+ASR_MAX_PARALLEL_REQUESTS = 4
+# 轮询器空闲时最长睡多久再检查一次（有新任务时会被立即唤醒）
+ASR_IDLE_SLEEP_SECONDS = 30.0
+
+
+def _poll_interval(poll_count: int) -> float:
+    return min(ASR_POLL_MAX_INTERVAL_SECONDS,
+               ASR_POLL_INITIAL_INTERVAL_SECONDS * (ASR_POLL_BACKOFF_FACTOR ** poll_count))
+
+
+def _match_audio(query, audio_file_path: str, audio_sha256: Optional[str]):
+    if audio_sha256:
+        return query.filter(or_(AsrJob.audio_sha256 == audio_sha256, AsrJob.audio_file_path == audio_file_path))
+    return query.filter(AsrJob.audio_file_path == audio_file_path)
+
+
+def _add_succeeded_job(db, audio_file_path: str, audio_sha256: Optional[str], user_id: str, result) -> AsrJob:
+    job = AsrJob(
+        audio_file_path=audio_file_path,
+        audio_sha256=audio_sha256,
+        status=ASR_JOB_SUCCEEDED,
+        result=result,
+        finished_at=datetime.utcnow(),
+        created_by=user_id,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def find_reusable_job(db, audio_file_path: str, audio_sha256: Optional[str], user_id: str) -> Optional[AsrJob]:
+    """同一音频（路径相同或内容哈希相同）已有识别结果或本人进行中的任务时直接复用，不重复付费识别
+
+    已成功的任务优先，别人的任务复制一份记在本人名下；都没有时，如果已保存的文章里存着这段音频的
+    asr_raw_result，就用它补一条已成功的任务。
+    """
+    candidates = _match_audio(db.query(AsrJob), audio_file_path, audio_sha256).filter(
+        AsrJob.status.in_([ASR_JOB_PENDING, ASR_JOB_SUBMITTED, ASR_JOB_SUCCEEDED])
+    ).order_by(AsrJob.id.desc()).all()
+    succeeded = [job for job in candidates if job.status == ASR_JOB_SUCCEEDED]
+    for job in succeeded:
+        if job.created_by == user_id:
+            return job
+    if succeeded:
+        return _add_succeeded_job(db, audio_file_path, audio_sha256, user_id, succeeded[0].result)
+    for job in candidates:
+        if job.created_by == user_id:
+            return job
+
+    article = db.query(ListeningArticle).filter(
+        ListeningArticle.audio_file_path == audio_file_path,
+        ListeningArticle.asr_raw_result.isnot(None),
+    ).first()
+    if article and isinstance(article.asr_raw_result, list):
+        return _add_succeeded_job(db, audio_file_path, audio_sha256, user_id, article.asr_raw_result)
+    return None
+
+
+def _asr_source_path(audio_file_path: str) -> str:
+    """提交识别用的音频：有 16kHz 单声道的 ASR 版时用它（体积小一个数量级），否则用原文件"""
+    if existing_rendition(audio_abs_path(audio_file_path), RENDITION_ASR):
+        return audio_file_path + RENDITION_SUFFIXES[RENDITION_ASR]
+    return audio_file_path
+
+
+def _shared_job(db, job: AsrJob) -> Optional[AsrJob]:
+    """同一音频别人的任务：已成功的，或者比本任务早登记、还在识别中的（本任务等它完成）"""
+    others = _match_audio(db.query(AsrJob), job.audio_file_path, job.audio_sha256).filter(AsrJob.id != job.id)
+    done = others.filter(AsrJob.status == ASR_JOB_SUCCEEDED).order_by(AsrJob.id.desc()).first()
+    if done is not None:
+        return done
+    return others.filter(
+        AsrJob.id < job.id,
+        AsrJob.status.in_([ASR_JOB_PENDING, ASR_JOB_SUBMITTED]),
+    ).first()
+
+
+def latest_succeeded_job(db, audio_file_path: str, audio_sha256: Optional[str] = None) -> Optional[AsrJob]:
+    return (
+        _match_audio(db.query(AsrJob), audio_file_path, audio_sha256)
+        .filter(AsrJob.status == ASR_JOB_SUCCEEDED)
+        .order_by(AsrJob.id.desc())
+        .first()
+    )
+
+
+class _Deferred(Exception):
+    """本轮先不处理这个任务，按正常间隔下次再看"""
+
+
+class AsrPoller:
+    """全局唯一的识别任务轮询器，在应用启动时 start()，关闭时 stop()"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._sdk_slots: Optional[asyncio.Semaphore] = None
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._sdk_slots = asyncio.Semaphore(ASR_MAX_PARALLEL_REQUESTS)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info("ASR 轮询器已启动")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def submit(self, db, audio_file_path: str, audio_sha256: Optional[str], user_id: str) -> AsrJob:
+        """登记识别任务（可复用时返回已有任务），并唤醒轮询器"""
+        job = find_reusable_job(db, audio_file_path, audio_sha256, user_id)
+        if job is None:
+            job = AsrJob(
+                audio_file_path=audio_file_path,
+                audio_sha256=audio_sha256,
+                status=ASR_JOB_PENDING,
+                next_poll_at=datetime.utcnow(),
+                created_by=user_id,
+            )
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                delay = await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"ASR 轮询出错: {e}")
+                delay = ASR_POLL_INITIAL_INTERVAL_SECONDS
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _tick(self) -> float:
+        """处理所有到期任务，返回距离下一个到期任务的秒数"""
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            due_ids: List[int] = [
+                job_id for (job_id,) in db.query(AsrJob.id)
+                .filter(AsrJob.status.in_([ASR_JOB_PENDING, ASR_JOB_SUBMITTED]))
+                .filter(or_(AsrJob.next_poll_at.is_(None), AsrJob.next_poll_at <= now))
+                .all()
+            ]
+        finally:
+            db.close()
+
+        if due_ids:
+            await asyncio.gather(*[self._process(job_id) for job_id in due_ids])
+
+        db = SessionLocal()
+        try:
+            next_job = (
+                db.query(AsrJob.next_poll_at)
+                .filter(AsrJob.status.in_([ASR_JOB_PENDING, ASR_JOB_SUBMITTED]))
+                .order_by(AsrJob.next_poll_at.asc())
+                .first()
+            )
+        finally:
+            db.close()
+        if not next_job or next_job[0] is None:
+            return ASR_IDLE_SLEEP_SECONDS if not next_job else 0.0
+        return max(0.0, min(ASR_IDLE_SLEEP_SECONDS, (next_job[0] - datetime.utcnow()).total_seconds()))
+
+    async def _process(self, job_id: int) -> None:
+        db = SessionLocal()
+        try:
+            job = db.query(AsrJob).filter(AsrJob.id == job_id).first()
+            if not job:
+                return
+            try:
+                async with self._sdk_slots:
+                    shared = _shared_job(db, job) if job.status == ASR_JOB_PENDING else None
+                    if shared is not None and shared.status == ASR_JOB_SUCCEEDED:
+                        self._finish(db, job, shared.result)
+                    elif shared is not None:
+                        # 别人正在识别同一段音频，等它完成后直接复制结果
+                        raise _Deferred()
+                    elif job.status == ASR_JOB_PENDING:
+                        if audio_transcoder.is_pending(audio_abs_path(job.audio_file_path)):
+                            # 刚上传的音频还在转码，等 ASR 版生成后再提交
+                            raise _Deferred()
+                        source = _asr_source_path(job.audio_file_path)
+                        task_id = await asyncio.to_thread(
+                            create_rec_task, audio_abs_path(source), signed_audio_url(source),
+                        )
+                        job.tencent_task_id = task_id
+                        job.status = ASR_JOB_SUBMITTED
+                        job.poll_count = 0
+                        logger.info(f"ASR 任务已提交: job={job.id} task={task_id}")
+                    else:
+                        status, words, error = await asyncio.to_thread(describe_task_status, job.tencent_task_id)
+                        job.poll_count = (job.poll_count or 0) + 1
+                        if status == "succeeded":
+                            self._finish(db, job, words)
+                        elif status == "failed":
+                            self._fail(job, error)
+                        elif (datetime.utcnow() - job.created_at).total_seconds() > ASR_JOB_TIMEOUT_SECONDS:
+                            self._fail(job, "腾讯云语音识别超时，请重试")
+            except _Deferred:
+                pass
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e)
+                if job.status == ASR_JOB_PENDING:
+                    self._fail(job, detail)
+                else:
+                    # 已提交的任务查询失败（网络抖动等）不放弃，按退避间隔继续查，直到超时
+                    logger.warning(f"查询 ASR 任务状态失败，稍后重试: job={job.id} - {detail}")
+                    job.poll_count = (job.poll_count or 0) + 1
+                    if (datetime.utcnow() - job.created_at).total_seconds() > ASR_JOB_TIMEOUT_SECONDS:
+                        self._fail(job, detail)
+
+            if job.status in (ASR_JOB_PENDING, ASR_JOB_SUBMITTED):
+                job.next_poll_at = datetime.utcnow() + timedelta(seconds=_poll_interval(job.poll_count or 0))
+            job.updated_at = datetime.utcnow()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"更新 ASR 任务失败: job={job_id} - {e}")
+        finally:
+            db.close()
+
+    @staticmethod
+    def _finish(db, job: AsrJob, words) -> None:
+        job.status = ASR_JOB_SUCCEEDED
+        job.result = words
+        job.finished_at = datetime.utcnow()
+        job.next_poll_at = None
+        # 已经保存过的文章（老师没等识别完就先保存了）补上识别结果
+        paths = [job.audio_file_path]
+        if job.audio_sha256:
+            paths += [rel_path for (rel_path,) in db.query(AudioUpload.rel_path)
+                      .filter(AudioUpload.sha256 == job.audio_sha256)]
+        db.query(ListeningArticle).filter(
+            ListeningArticle.audio_file_path.in_(paths),
+            ListeningArticle.asr_raw_result.is_(None),
+        ).update({ListeningArticle.asr_raw_result: words}, synchronize_session=False)
+        logger.info(f"ASR 任务完成: job={job.id}, {len(words or [])} 个词")
+
+    @staticmethod
+    def _fail(job: AsrJob, error: str) -> None:
+        job.status = ASR_JOB_FAILED
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        job.next_poll_at = None
+        logger.warning(f"ASR 任务失败: job={job.id} - {error}")
+
+
+asr_poller = AsrPoller()
@@ -0,0 +1,299 @@
+"""听力课音频存储回收 - 定期清理没有绑定到任何文章的上传音频，并统计存储占用
+
+上传接口一收到文件就落盘到 uploads/audio/YYYY/MM，老师中途放弃（没保存文章）的音频以前永远不会被删。
+后台清理器每隔 AUDIO_GC_INTERVAL_SECONDS 扫一遍存储目录，和数据库对账：
+- 被 listening_articles.audio_file_path 引用的文件保留（去重后多篇文章可能共用同一个文件）；
+- 还有进行中的ASR任务（腾讯云可能正在下载）的文件保留；
+- 其余文件修改时间超过 AUDIO_GC_GRACE_HOURS 才删除（老师上传后可能隔天才保存文章；
+  去重命中旧文件时会刷新它的修改时间），连同波形峰值、转码版本等附属文件、audio_uploads 记录一起删；
+- 附属文件的主文件已不存在时一起清掉，空的年月目录也删掉；
+- 顺带清理过期的分块上传会话（_partial 目录由 chunked_upload 自己管理，这里不扫）。
+
+扫描和删除都是阻塞的文件系统操作，整个过程放到线程里执行。
+"""
+import os
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.database import SessionLocal
+from app.logger import get_logger
+from app.models import AsrJob, AudioUpload, ListeningArticle, User
+from app.services.asr_jobs import ASR_JOB_PENDING, ASR_JOB_SUBMITTED
+from app.services.audio_peaks import PEAKS_FILE_SUFFIX
+from app.services.audio_storage import audio_storage_root
+from app.services.audio_transcode import RENDITION_SUFFIXES
+from app.services.chunked_upload import PARTIAL_DIR_NAME, prune_expired_sessions
+
+logger = get_logger("audio_gc")
+
+# 未绑定文章的音频保留多久才删除
+AUDIO_GC_GRACE_HOURS = int(os.getenv("AUDIO_GC_GRACE_HOURS", "72"))
+# 两次清理的间隔；设为 0 关闭自动清理（仍可由管理员手动触发）
+AUDIO_GC_INTERVAL_SECONDS = int(os.getenv("AUDIO_GC_INTERVAL_SECONDS", str(6 * 3600)))
+# 启动后等一会儿再做第一次清理，避开启动时的迁移等操作
+AUDIO_GC_STARTUP_DELAY_SECONDS = 120
+
+# 主音频文件的附属文件后缀（波形峰值、转码版本），文件名形如 "<音频文件名><后缀>"
+AUDIO_SIDECAR_SUFFIXES = (PEAKS_FILE_SUFFIX, *RENDITION_SUFFIXES.values())
+
+_UNKNOWN_OWNER = "unknown"
+
+
+def _is_sidecar(name: str) -> bool:
+    return any(name.endswith(suffix) for suffix in AUDIO_SIDECAR_SUFFIXES) or name.endswith(".tmp")
+
+
+def _sidecar_owner(name: str) -> str:
+    """附属文件对应的主文件名（临时文件形如 "<主文件名><后缀>.<随机串>.tmp"）"""
+    for suffix in AUDIO_SIDECAR_SUFFIXES:
+        idx = name.find(suffix)
+        if idx > 0:
+            return name[:idx]
+    return name
+
+
+def _scan_storage(root: str) -> Tuple[Dict[str, os.stat_result], Dict[str, List[str]]]:
+    """遍历存储目录，返回 (主文件相对路径 → stat, 主文件相对路径 → 附属文件相对路径列表)"""
+    audio_files: Dict[str, os.stat_result] = {}
+    sidecars: Dict[str, List[str]] = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        if dirpath == root and PARTIAL_DIR_NAME in dirnames:
+            dirnames.remove(PARTIAL_DIR_NAME)
+        for name in filenames:
+            abs_path = os.path.join(dirpath, name)
+            rel_path = os.path.relpath(abs_path, root)
+            if _is_sidecar(name):
+                owner = os.path.join(os.path.dirname(rel_path), _sidecar_owner(name))
+                sidecars.setdefault(owner, []).append(rel_path)
+                continue
+            try:
+                audio_files[rel_path] = os.stat(abs_path)
+            except FileNotFoundError:
+                pass
+    return audio_files, sidecars
+
+
+def _referenced_paths(db) -> Set[str]:
+    paths = {
+        path for (path,) in db.query(ListeningArticle.audio_file_path)
+        .filter(ListeningArticle.audio_file_path.isnot(None))
+    }
+    # 识别中的音频腾讯云可能还要来下载，不能删
+    paths.update(
+        path for (path,) in db.query(AsrJob.audio_file_path)
+        .filter(AsrJob.status.in_([ASR_JOB_PENDING, ASR_JOB_SUBMITTED]))
+    )
+    return {os.path.normpath(p) for p in paths}
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        logger.warning(f"删除音频文件失败: {path} - {e}")
+        return False
+
+
+def sweep_orphaned_audio(dry_run: bool = False, grace_hours: Optional[int] = None) -> Dict:
+    """对账并删除孤儿音频（同步，调用方放到线程里执行），返回清理统计"""
+    grace_hours = AUDIO_GC_GRACE_HOURS if grace_hours is None else grace_hours
+    cutoff = time.time() - grace_hours * 3600
+    root = audio_storage_root()
+    started = time.monotonic()
+
+    db = SessionLocal()
+    try:
+        if not dry_run:
+            prune_expired_sessions(db)
+
+        audio_files, sidecars = _scan_storage(root)
+        referenced = _referenced_paths(db)
+
+        orphans = [
+            (rel_path, st) for rel_path, st in audio_files.items()
+            if rel_path not in referenced and st.st_mtime < cutoff
+        ]
+        deleted_files = 0
+        freed_bytes = 0
+        for rel_path, st in orphans:
+            if dry_run:
+                deleted_files += 1
+                freed_bytes += st.st_size
+                continue
+            if _remove(os.path.join(root, rel_path)):
+                deleted_files += 1
+                freed_bytes += st.st_size
+            for sidecar in sidecars.pop(rel_path, []):
+                sidecar_abs = os.path.join(root, sidecar)
+                size = os.path.getsize(sidecar_abs) if os.path.exists(sidecar_abs) else 0
+                if _remove(sidecar_abs):
+                    freed_bytes += size
+
+        # 主文件已不存在的附属文件（比如手工删过音频）
+        dangling = [s for owner, items in sidecars.items() if owner not in audio_files for s in items]
+        if not dry_run:
+            for sidecar in dangling:
+                _remove(os.path.join(root, sidecar))
+
+        # 文件已不在磁盘上的上传记录（含刚删掉的孤儿）
+        orphan_paths = {rel_path for rel_path, _ in orphans}
+        stale_uploads = [
+            upload for upload in db.query(AudioUpload)
+            if os.path.normpath(upload.rel_path) in orphan_paths
+            or not os.path.exists(os.path.join(root, upload.rel_path))
+        ]
+        if not dry_run:
+            for upload in stale_uploads:
+                db.delete(upload)
+            db.commit()
+            _remove_empty_dirs(root)
+    finally:
+        db.close()
+
+    result = {
+        "dry_run": dry_run,
+        "grace_hours": grace_hours,
+        "scanned_files": len(audio_files),
+        "deleted_files": deleted_files,
+        "freed_bytes": freed_bytes,
+        "dangling_sidecars": len(dangling),
+        "stale_upload_records": len(stale_uploads),
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+        "finished_at": datetime.utcnow().isoformat(),
+    }
+    if deleted_files or dangling or stale_uploads:
+        logger.info(f"音频存储清理{'（演练）' if dry_run else ''}: {result}")
+    return result
+
+
+def _remove_empty_dirs(root: str) -> None:
+    # 自底向上遍历：子目录删掉后父目录（年份目录）可能也空了，所以用 listdir 现查
+    for dirpath, _, _ in os.walk(root, topdown=False):
+        if dirpath == root or os.path.basename(dirpath) == PARTIAL_DIR_NAME:
+            continue
+        try:
+            if not os.listdir(dirpath):
+                os.rmdir(dirpath)
+        except OSError:
+            pass
+
+
+def storage_report() -> Dict:
+    """存储占用统计：总量、孤儿文件，以及按老师、按月份的字节数（同步，放到线程里执行）"""
+    root = audio_storage_root()
+    db = SessionLocal()
+    try:
+        audio_files, sidecars = _scan_storage(root)
+        referenced = _referenced_paths(db)
+
+        owners: Dict[str, str] = {}
+        for rel_path, user_id in db.query(AudioUpload.rel_path, AudioUpload.uploaded_by):
+            if user_id:
+                owners[os.path.normpath(rel_path)] = user_id
+        # 已保存文章的创建人优先（上传人和保存人一般是同一位老师，去重后共用文件时算在保存人头上）
+        for rel_path, user_id in db.query(ListeningArticle.audio_file_path, ListeningArticle.created_by):
+            if rel_path:
+                owners[os.path.normpath(rel_path)] = user_id
+        names = {user_id: name for user_id, name in db.query(User.id, User.display_name)}
+    finally:
+        db.close()
+
+    total_bytes = 0
+    orphan_bytes = 0
+    orphan_files = 0
+    by_teacher: Dict[str, Dict] = {}
+    by_month: Dict[str, Dict] = {}
+    for rel_path, st in audio_files.items():
+        size = st.st_size
+        for sidecar in sidecars.get(rel_path, []):
+            try:
+                size += os.path.getsize(os.path.join(root, sidecar))
+            except FileNotFoundError:
+                pass
+        total_bytes += size
+        if rel_path not in referenced:
+            orphan_bytes += size
+            orphan_files += 1
+
+        owner = owners.get(rel_path, _UNKNOWN_OWNER)
+        teacher = by_teacher.setdefault(owner, {
+            "user_id": owner, "display_name": names.get(owner, "未知"), "bytes": 0, "files": 0,
+        })
+        teacher["bytes"] += size
+        teacher["files"] += 1
+
+        # 目录结构是 YYYY/MM/文件名，不符合的（旧数据）按文件修改时间归月
+        parts = rel_path.split(os.sep)
+        if len(parts) == 3 and parts[0].isdigit() and parts[1].isdigit():
+            month = f"{parts[0]}-{parts[1]}"
+        else:
+            month = datetime.fromtimestamp(st.st_mtime).strftime("%Y-%m")
+        bucket = by_month.setdefault(month, {"month": month, "bytes": 0, "files": 0})
+        bucket["bytes"] += size
+        bucket["files"] += 1
+
+    return {
+        "total_bytes": total_bytes,
+        "total_files": len(audio_files),
+        "referenced_files": len(audio_files) - orphan_files,
+        "orphan_files": orphan_files,
+        "orphan_bytes": orphan_bytes,
+        "by_teacher": sorted(by_teacher.values(), key=lambda t: t["bytes"], reverse=True),
+        "by_month": sorted(by_month.values(), key=lambda m: m["month"]),
+        "grace_hours": AUDIO_GC_GRACE_HOURS,
+    }
+
+
+class AudioGarbageCollector:
+    """后台定时清理器，在应用启动时 start()，关闭时 stop()"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self.last_result: Optional[Dict] = None
+
+    def start(self) -> None:
+        if self._task is not None or AUDIO_GC_INTERVAL_SECONDS <= 0:
+            return
+        self._lock = asyncio.Lock()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"音频存储清理器已启动（每 {AUDIO_GC_INTERVAL_SECONDS} 秒，宽限 {AUDIO_GC_GRACE_HOURS} 小时）")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def sweep(self, dry_run: bool = False) -> Dict:
+        """立即清理一次（定时任务和管理员手动触发共用，同一时间只跑一个）"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            result = await asyncio.to_thread(sweep_orphaned_audio, dry_run)
+        if not dry_run:
+            self.last_result = result
+        return result
+
+    async def _run(self) -> None:
+        await asyncio.sleep(AUDIO_GC_STARTUP_DELAY_SECONDS)
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"音频存储清理失败: {e}")
+            await asyncio.sleep(AUDIO_GC_INTERVAL_SECONDS)
+
+
+audio_gc = AudioGarbageCollector()
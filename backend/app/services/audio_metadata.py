@@ -0,0 +1,58 @@
+"""音频元数据 - 时长、码率、采样率、声道数，每个文件只解析一次
+
+以前每次上传和每次"自动对齐时间戳"都在事件循环线程里用 mutagen 解析同一个文件，
+100MB 的 WAV 解析期间所有请求都被卡住。现在解析放到线程里执行，结果存进 audio_uploads 表，
+保存文章时再复制到 listening_articles，之后各处直接读数据库。
+
+duration_seconds 为 NULL 表示还没解析过；解析失败时存 0.0，避免每次都重新解析一个坏文件。
+"""
+import asyncio
+from typing import Dict, Optional
+
+from app.logger import get_logger
+from app.models import AudioUpload, ListeningArticle
+from app.services.audio_storage import audio_abs_path
+
+logger = get_logger("audio_metadata")
+
+
+def probe_audio_metadata(path: str) -> Dict[str, Optional[float]]:
+    """用 mutagen 解析音频头信息（同步，调用方放到线程里执行）"""
+    metadata: Dict[str, Optional[float]] = {
+        "duration_seconds": 0.0, "bitrate": None, "sample_rate": None, "channels": None,
+    }
+    try:
+        from mutagen import File as MutagenFile
+        audio = MutagenFile(path)
+        info = audio.info if audio is not None else None
+        if info is not None:
+            metadata["duration_seconds"] = round(float(info.length or 0.0), 2)
+            # 不同格式的 info 对象字段不全（比如部分格式没有 bitrate），缺的就留空
+            for key in ("bitrate", "sample_rate", "channels"):
+                value = getattr(info, key, None)
+                metadata[key] = int(value) if value else None
+    except Exception as e:
+        logger.warning(f"解析音频元数据失败: {path} - {e}")
+    return metadata
+
+
+async def ensure_upload_metadata(db, upload: AudioUpload) -> AudioUpload:
+    """上传记录还没有元数据时在线程里解析并写回数据库；已有时直接返回"""
+    if upload.duration_seconds is not None:
+        return upload
+    metadata = await asyncio.to_thread(probe_audio_metadata, audio_abs_path(upload.rel_path))
+    for key, value in metadata.items():
+        setattr(upload, key, value)
+    db.commit()
+    return upload
+
+
+def copy_metadata_to_article(article: ListeningArticle, upload: Optional[AudioUpload]) -> None:
+    """保存文章时带上音频元数据（没有上传记录时保留前端传来的时长）"""
+    if upload is None or upload.duration_seconds is None:
+        return
+    if upload.duration_seconds:
+        article.audio_duration_seconds = upload.duration_seconds
+    article.audio_bitrate = upload.bitrate
+    article.audio_sample_rate = upload.sample_rate
+    article.audio_channels = upload.channels
@@ -0,0 +1,227 @@
+"""音频波形峰值索引 - 上传时预先算好多级缩放的 min/max 峰值，时间轴编辑器不用先下载整段音频
+
+峰值文件与音频放在同一目录，文件名为 "<音频文件名>.peaks.json"：
+    {
+      "version": 1,
+      "sample_rate": 8000,            # 计算峰值时的采样率
+      "duration": 183.2,              # 秒
+      "levels": [                     # 从细到粗，每级桶大小是上一级的 PEAKS_LEVEL_FACTOR 倍
+        {"samples_per_bucket": 256, "min": [-12, ...], "max": [15, ...]},
+        ...
+      ]
+    }
+min/max 归一化到 -127..127 的整数，30分钟音频最细一级也只有几百KB。
+桶对应的时间 = 桶下标 * samples_per_bucket / sample_rate。
+
+解码：WAV 用标准库 wave 直接读 PCM；其他格式（mp3/m4a/ogg）需要服务器装有 ffmpeg，
+转成 8kHz 单声道 PCM 流式读取；都不行时不生成峰值文件，前端退回无波形的时间轴。
+"""
+import os
+import sys
+import uuid
+import json
+import math
+import wave
+import shutil
+import subprocess
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+from app.logger import get_logger
+
+logger = get_logger("audio_peaks")
+
+PEAKS_FILE_SUFFIX = ".peaks.json"
+PEAKS_FORMAT_VERSION = 1
+# 用 ffmpeg 解码时统一重采样到这个采样率（只画波形，不需要高采样率）
+PEAKS_DECODE_SAMPLE_RATE = 8000
+# 最细一级每桶至少这么多采样，且总桶数不超过 PEAKS_MAX_BUCKETS（超长音频自动加大桶）
+PEAKS_MIN_SAMPLES_PER_BUCKET = 256
+PEAKS_MAX_BUCKETS = 20000
+# 缩放级数，以及相邻两级桶大小的倍数
+PEAKS_LEVELS = 4
+PEAKS_LEVEL_FACTOR = 4
+
+_READ_CHUNK_BYTES = 256 * 1024
+_FULL_SCALE = 32768
+
+
+def peaks_path_for(audio_abs_path: str) -> str:
+    return audio_abs_path + PEAKS_FILE_SUFFIX
+
+
+def _base_samples_per_bucket(total_samples: int) -> int:
+    """最细一级的桶大小：取 2 的整数次幂，保证总桶数不超过 PEAKS_MAX_BUCKETS"""
+    spb = PEAKS_MIN_SAMPLES_PER_BUCKET
+    if total_samples > 0:
+        needed = total_samples / PEAKS_MAX_BUCKETS
+        if needed > spb:
+            spb = 1 << math.ceil(math.log2(needed))
+    return spb
+
+
+class _PeakAccumulator:
+    """按桶累计 16 位 PCM 采样的 min/max；多声道交错的采样直接混在一个桶里"""
+
+    def __init__(self, samples_per_bucket: int):
+        self.samples_per_bucket = samples_per_bucket
+        self.mins = array("h")
+        self.maxs = array("h")
+        self._pending = array("h")
+
+    def feed(self, samples: array) -> None:
+        if self._pending:
+            self._pending.extend(samples)
+            samples, self._pending = self._pending, array("h")
+        spb = self.samples_per_bucket
+        full = len(samples) - len(samples) % spb
+        for i in range(0, full, spb):
+            bucket = samples[i:i + spb]
+            self.mins.append(min(bucket))
+            self.maxs.append(max(bucket))
+        self._pending = samples[full:]
+
+    def finish(self) -> None:
+        if self._pending:
+            self.mins.append(min(self._pending))
+            self.maxs.append(max(self._pending))
+            self._pending = array("h")
+
+
+def _to_int8(values: Iterable[int]) -> List[int]:
+    return [max(-127, min(127, round(v * 127 / _FULL_SCALE))) for v in values]
+
+
+def _build_levels(acc: _PeakAccumulator) -> List[Dict]:
+    levels = []
+    mins, maxs = list(acc.mins), list(acc.maxs)
+    spb = acc.samples_per_bucket
+    for _ in range(PEAKS_LEVELS):
+        levels.append({"samples_per_bucket": spb, "min": _to_int8(mins), "max": _to_int8(maxs)})
+        if len(mins) <= 1:
+            break
+        f = PEAKS_LEVEL_FACTOR
+        mins = [min(mins[i:i + f]) for i in range(0, len(mins), f)]
+        maxs = [max(maxs[i:i + f]) for i in range(0, len(maxs), f)]
+        spb *= f
+    return levels
+
+
+def _pcm16_from_bytes(data: bytes, sample_width: int) -> array:
+    """把小端 PCM 字节转成 16 位采样（8/24/32 位只保留高 16 位精度，画波形足够）"""
+    if sample_width == 2:
+        samples = array("h", data[:len(data) - len(data) % 2])
+    elif sample_width == 1:
+        # 8 位 WAV 是无符号的，128 为零点
+        samples = array("h", ((b - 128) << 8 for b in data))
+        return samples
+    elif sample_width in (3, 4):
+        n = len(data) // sample_width
+        high = bytearray(n * 2)
+        high[0::2] = data[sample_width - 2:n * sample_width:sample_width]
+        high[1::2] = data[sample_width - 1:n * sample_width:sample_width]
+        samples = array("h", bytes(high))
+    else:
+        raise ValueError(f"不支持的采样位宽: {sample_width}")
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return samples
+
+
+def _peaks_from_wav(path: str) -> Dict:
+    with wave.open(path, "rb") as wf:
+        channels = wf.getnchannels()
+        sample_width = wf.getsampwidth()
+        sample_rate = wf.getframerate()
+        n_frames = wf.getnframes()
+
+        acc = _PeakAccumulator(_base_samples_per_bucket(n_frames) * channels)
+        frames_per_read = max(1, _READ_CHUNK_BYTES // (channels * sample_width))
+        while True:
+            data = wf.readframes(frames_per_read)
+            if not data:
+                break
+            acc.feed(_pcm16_from_bytes(data, sample_width))
+        acc.finish()
+
+    levels = _build_levels(acc)
+    for level in levels:
+        level["samples_per_bucket"] //= channels  # 对外按"每声道采样数"描述桶大小
+    return {
+        "version": PEAKS_FORMAT_VERSION,
+        "sample_rate": sample_rate,
+        "duration": round(n_frames / sample_rate, 2) if sample_rate else 0.0,
+        "levels": levels,
+    }
+
+
+def _peaks_from_ffmpeg(path: str, duration_seconds: float) -> Optional[Dict]:
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return None
+
+    sample_rate = PEAKS_DECODE_SAMPLE_RATE
+    acc = _PeakAccumulator(_base_samples_per_bucket(int(duration_seconds * sample_rate)))
+    proc = subprocess.Popen(
+        [ffmpeg, "-v", "error", "-i", path, "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    total_samples = 0
+    leftover = b""
+    try:
+        while True:
+            data = proc.stdout.read(_READ_CHUNK_BYTES)
+            if not data:
+                break
+            data = leftover + data
+            usable = len(data) - len(data) % 2
+            leftover = data[usable:]
+            samples = _pcm16_from_bytes(data[:usable], 2)
+            total_samples += len(samples)
+            acc.feed(samples)
+    finally:
+        proc.stdout.close()
+        proc.wait()
+    if proc.returncode != 0 or total_samples == 0:
+        return None
+    acc.finish()
+
+    return {
+        "version": PEAKS_FORMAT_VERSION,
+        "sample_rate": sample_rate,
+        "duration": round(total_samples / sample_rate, 2),
+        "levels": _build_levels(acc),
+    }
+
+
+def compute_peaks(path: str, duration_seconds: float = 0.0) -> Optional[Dict]:
+    """解码音频并计算峰值（同步、CPU 密集，调用方放到线程里执行）；无法解码时返回 None"""
+    if path.lower().endswith(".wav"):
+        try:
+            return _peaks_from_wav(path)
+        except (wave.Error, EOFError, ValueError) as e:
+            # 压缩编码的 WAV（如 ADPCM）wave 模块读不了，交给 ffmpeg
+            logger.info(f"wave 无法解析，尝试 ffmpeg: {path} - {e}")
+    return _peaks_from_ffmpeg(path, duration_seconds)
+
+
+def generate_peaks_file(audio_abs_path: str, duration_seconds: float = 0.0) -> Optional[str]:
+    """计算并写入峰值文件（先写临时文件再改名，读到的永远是完整文件），返回峰值文件路径"""
+    target = peaks_path_for(audio_abs_path)
+    if os.path.exists(target):
+        return target
+    try:
+        peaks = compute_peaks(audio_abs_path, duration_seconds)
+    except Exception as e:
+        logger.warning(f"计算波形峰值失败: {audio_abs_path} - {e}")
+        return None
+    if peaks is None:
+        logger.info(f"无法解码音频（WAV 以外的格式需要安装 ffmpeg），跳过波形峰值: {audio_abs_path}")
+        return None
+
+    # 上传后的后台任务和前端请求可能同时在算，临时文件名各不相同，最后一个 os.replace 生效即可
+    tmp = f"{target}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(peaks, f, separators=(",", ":"))
+    os.replace(tmp, target)
+    return target
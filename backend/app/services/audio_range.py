@@ -0,0 +1,264 @@
+"""音频文件的 Range/条件请求响应 - 给 <audio> 拖动进度条用
+
+以前 stream_audio 每次 seek 都查一次数据库、stat 一次文件，再用 Python 生成器按 1MB 读进内存，
+而且不带 ETag/Last-Modified，学生每次打开页面都要重新下载整段音频。现在：
+- 文章ID → 文件信息（路径、大小、ETag 等）缓存在进程内，拖动进度条不再查库和 stat；
+- 支持 If-None-Match / If-Modified-Since（304）、If-Range，以及多段 Range（multipart/byteranges）；
+- 音频文件名是上传时生成的 UUID、内容永远不变，URL 带上版本号 v 时返回一年的 immutable 缓存头；
+- 发送文件内容：ASGI 服务器支持 http.response.zerocopysend 扩展时交给服务器零拷贝发送，
+  否则用 os.pread 在线程里按块读取（同一个 fd 多段并发读不需要 seek，也不阻塞事件循环）。
+  uvicorn 不把 socket 暴露给应用，所以拿不到 os.sendfile，这是 ASGI 下能做到的最接近的方式。
+"""
+import os
+import re
+import uuid
+import asyncio
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.services.lru_cache import TTLCache
+
+# 每次 pread 读取的块大小
+AUDIO_READ_CHUNK_SIZE = 256 * 1024
+# 一次请求最多接受的 Range 段数，超过时忽略 Range 返回整个文件（防止构造大量小段的请求）
+AUDIO_MAX_RANGES = 16
+# URL 带版本号时的缓存时长（一年，文件名是 UUID，内容不会变）
+AUDIO_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# 文章ID → 音频文件信息的进程内缓存
+AUDIO_INFO_CACHE_SIZE = 1024
+AUDIO_INFO_CACHE_TTL_SECONDS = 3600
+
+_info_cache = TTLCache(AUDIO_INFO_CACHE_SIZE, AUDIO_INFO_CACHE_TTL_SECONDS)
+
+_RANGE_SPEC_RE = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+
+class AudioFileInfo:
+    """响应一个音频文件需要的全部元数据，缓存后拖动进度条时不再查库/stat"""
+
+    __slots__ = ("abs_path", "media_type", "size", "mtime", "etag", "version")
+
+    def __init__(self, abs_path: str, media_type: str, size: int, mtime: float,
+                 etag: str, version: str):
+        self.abs_path = abs_path
+        self.media_type = media_type
+        self.size = size
+        self.mtime = mtime
+        self.etag = etag
+        self.version = version
+
+    @property
+    def last_modified(self) -> str:
+        return formatdate(self.mtime, usegmt=True)
+
+
+def audio_version(rel_path: str) -> str:
+    """URL 上的版本号：存储文件名（UUID）本身，换了音频文件就换了版本号"""
+    return os.path.splitext(os.path.basename(rel_path))[0]
+
+
+def build_audio_info(abs_path: str, version: str, media_type: str,
+                     etag_key: Optional[str] = None) -> AudioFileInfo:
+    """stat 一次文件生成元数据；有稳定的内容标识（如 sha256）时用它做强 ETag，否则用 mtime+大小"""
+    st = os.stat(abs_path)
+    etag = f'"{etag_key}"' if etag_key else f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    return AudioFileInfo(abs_path, media_type, st.st_size, st.st_mtime, etag, version)
+
+
+def get_cached_audio_info(key) -> Optional[AudioFileInfo]:
+    return _info_cache.get(key)
+
+
+def cache_audio_info(key, info: AudioFileInfo, ttl_seconds: Optional[float] = None) -> None:
+    _info_cache.set(key, info, ttl_seconds)
+
+
+def invalidate_audio_info(key=None) -> None:
+    """文件被删除/替换时清掉缓存；不传 key 时全部清空"""
+    if key is None:
+        _info_cache.clear()
+    else:
+        _info_cache.delete(key)
+
+
+def parse_range_header(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """解析 Range 请求头，返回按起点排序、合并了重叠/相邻段的 [(start, end)]（end 含）
+
+    返回 None 表示忽略 Range（格式不对、不是 bytes 单位或段数过多），按普通 200 返回整个文件；
+    返回空列表表示所有段都不可满足（416）。
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges: List[Tuple[int, int]] = []
+    parts = spec.split(",")
+    if len(parts) > AUDIO_MAX_RANGES:
+        return None
+    for part in parts:
+        match = _RANGE_SPEC_RE.match(part)
+        if not match:
+            return None
+        first, last = match.group(1), match.group(2)
+        if first == "" and last == "":
+            return None
+        if first == "":
+            # 后缀形式 bytes=-500：最后 500 字节
+            length = int(last)
+            if length == 0:
+                continue
+            start, end = max(0, size - length), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and end < start:
+                return None
+            end = min(end, size - 1)
+        if start < size:
+            ranges.append((start, end))
+
+    ranges.sort()
+    merged: List[Tuple[int, int]] = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match 用弱比较：去掉 W/ 前缀后比较"""
+    if header.strip() == "*":
+        return True
+    candidates = [t.strip() for t in header.split(",")]
+    return any(t.removeprefix("W/") == etag for t in candidates)
+
+
+def _not_modified(headers, info: AudioFileInfo) -> bool:
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, info.etag)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(info.mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _if_range_ok(headers, info: AudioFileInfo) -> bool:
+    """If-Range 与当前文件一致时才按 Range 返回，否则返回整个文件（If-Range 用强比较）"""
+    if_range = headers.get("if-range")
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == info.etag
+    return if_range == info.last_modified
+
+
+class AudioRangeResponse(Response):
+    """按请求头决定返回 200 / 206 / 304 / 416，并以零拷贝或 pread 的方式发送文件内容"""
+
+    def __init__(self, info: AudioFileInfo, request_headers, cache_control: str):
+        self.info = info
+        self.status_code = 200
+        self.background = None
+        self._parts: List[Tuple[int, int, bytes]] = []  # (start, end, 该段前面的 multipart 头)
+        self._closing = b""
+
+        headers: Dict[str, str] = {
+            "accept-ranges": "bytes",
+            "etag": info.etag,
+            "last-modified": info.last_modified,
+            "cache-control": cache_control,
+        }
+
+        ranges = None
+        if _not_modified(request_headers, info):
+            self.status_code = 304
+        else:
+            range_header = request_headers.get("range")
+            if range_header and _if_range_ok(request_headers, info):
+                ranges = parse_range_header(range_header, info.size)
+
+        if self.status_code == 304:
+            pass
+        elif ranges == []:
+            self.status_code = 416
+            headers["content-range"] = f"bytes */{info.size}"
+            headers["content-length"] = "0"
+        elif ranges and len(ranges) == 1:
+            start, end = ranges[0]
+            self.status_code = 206
+            self._parts = [(start, end, b"")]
+            headers["content-type"] = info.media_type
+            headers["content-range"] = f"bytes {start}-{end}/{info.size}"
+            headers["content-length"] = str(end - start + 1)
+        elif ranges:
+            self.status_code = 206
+            boundary = uuid.uuid4().hex
+            length = 0
+            for i, (start, end) in enumerate(ranges):
+                part_header = (b"\r\n" if i else b"") + (
+                    f"--{boundary}\r\n"
+                    f"Content-Type: {info.media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{info.size}\r\n\r\n"
+                ).encode("latin-1")
+                self._parts.append((start, end, part_header))
+                length += len(part_header) + end - start + 1
+            self._closing = f"\r\n--{boundary}--\r\n".encode("latin-1")
+            length += len(self._closing)
+            headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+            headers["content-length"] = str(length)
+        else:
+            self._parts = [(0, info.size - 1, b"")] if info.size else []
+            headers["content-type"] = info.media_type
+            headers["content-length"] = str(info.size)
+
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.status_code in (304, 416) or scope.get("method") == "HEAD":
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        # 先打开文件再发响应头：文件已被清理时还能改成 404
+        try:
+            fd = os.open(self.info.abs_path, os.O_RDONLY)
+        except FileNotFoundError:
+            invalidate_audio_info()
+            await Response("音频文件不存在", status_code=404)(scope, receive, send)
+            return
+
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+            for start, end, part_header in self._parts:
+                if part_header:
+                    await send({"type": "http.response.body", "body": part_header, "more_body": True})
+                if zerocopy:
+                    await send({
+                        "type": "http.response.zerocopysend", "file": fd,
+                        "offset": start, "count": end - start + 1, "more_body": True,
+                    })
+                    continue
+                offset = start
+                while offset <= end:
+                    chunk = await asyncio.to_thread(
+                        os.pread, fd, min(AUDIO_READ_CHUNK_SIZE, end - offset + 1), offset
+                    )
+                    if not chunk:
+                        break  # 文件被截断：提前结束，Content-Length 对不上时客户端会自行重试
+                    offset += len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            # 最后统一发一个结束帧（multipart 时带上结尾分隔符）
+            await send({"type": "http.response.body", "body": self._closing})
+        finally:
+            os.close(fd)
@@ -0,0 +1,109 @@
+"""听力课音频本地存储 - 存储根目录、相对路径换算、按内容哈希去重的上传索引
+
+数据库里只存相对存储根目录的路径（如 "2026/07/uuid.mp3"），
+上传、播放、ASR 识别等各处都通过这里换算成绝对路径。
+
+audio_uploads 表记录每个落盘音频的 sha256：老师重新上传同一个 MP3 时直接复用已有文件，
+ASR 识别结果也按哈希复用（见 asr_jobs.py），不会为同一段音频重复付费识别。
+
+签名链接：腾讯云录音识别可以按 URL 自己来下载音频（SourceType=0），不必把整个文件
+base64 塞进请求体。这里生成带过期时间的 HMAC 签名链接，由 listening_api 的公开接口校验后直接从磁盘流式返回。
+"""
+import os
+import hmac
+import time
+import hashlib
+from typing import Optional
+from urllib.parse import quote
+
+from app.models import AudioUpload
+
+# 音频本地存储根目录（相对于backend目录），数据库只存相对路径
+LISTENING_AUDIO_STORAGE_DIR = os.getenv("LISTENING_AUDIO_STORAGE_DIR", "uploads/audio")
+
+_HASH_CHUNK_BYTES = 1024 * 1024
+
+# 腾讯云能访问到的本服务外网地址（如 http://47.108.248.168:8000），不配置时只能内联上传小文件
+ASR_AUDIO_PUBLIC_BASE_URL = os.getenv("ASR_AUDIO_PUBLIC_BASE_URL", "").rstrip("/")
+# 签名密钥，默认沿用 SECRET_KEY
+ASR_AUDIO_URL_SECRET = os.getenv("ASR_AUDIO_URL_SECRET") or os.getenv("SECRET_KEY", "")
+# 签名链接有效期：腾讯云提交后很快就会拉取，留足排队时间即可
+ASR_AUDIO_URL_TTL_SECONDS = int(os.getenv("ASR_AUDIO_URL_TTL_SECONDS", str(6 * 3600)))
+
+
+def audio_storage_root() -> str:
+    root = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), LISTENING_AUDIO_STORAGE_DIR)
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def audio_abs_path(rel_path: str) -> str:
+    return os.path.join(audio_storage_root(), rel_path)
+
+
+def file_sha256(path: str) -> str:
+    """分块计算文件哈希（同步，调用方按需放到线程里）"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK_BYTES):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def find_upload_by_hash(db, sha256: str) -> Optional[AudioUpload]:
+    """按内容哈希找一个文件仍在磁盘上的已上传音频"""
+    for upload in db.query(AudioUpload).filter(AudioUpload.sha256 == sha256).order_by(AudioUpload.id.asc()):
+        if os.path.exists(audio_abs_path(upload.rel_path)):
+            return upload
+    return None
+
+
+def get_upload(db, rel_path: str) -> Optional[AudioUpload]:
+    return db.query(AudioUpload).filter(AudioUpload.rel_path == rel_path).first()
+
+
+def register_upload(db, rel_path: str, sha256: str, size_bytes: int, user_id: Optional[str],
+                    original_filename: Optional[str] = None, mimetype: Optional[str] = None,
+                    duration_seconds: Optional[float] = None, bitrate: Optional[int] = None,
+                    sample_rate: Optional[int] = None, channels: Optional[int] = None) -> AudioUpload:
+    upload = AudioUpload(
+        rel_path=rel_path,
+        sha256=sha256,
+        size_bytes=size_bytes,
+        original_filename=original_filename,
+        mimetype=mimetype,
+        duration_seconds=duration_seconds,
+        bitrate=bitrate,
+        sample_rate=sample_rate,
+        channels=channels,
+        uploaded_by=user_id,
+    )
+    db.add(upload)
+    db.commit()
+    db.refresh(upload)
+    return upload
+
+
+# ── 签名链接 ──────────────────────────────────────────────────
+
+def _audio_signature(rel_path: str, expires: int) -> str:
+    message = f"{rel_path}\n{expires}".encode("utf-8")
+    return hmac.new(ASR_AUDIO_URL_SECRET.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+
+def signed_audio_url(rel_path: str) -> Optional[str]:
+    """生成供腾讯云拉取音频的签名链接；未配置外网地址或签名密钥时返回 None"""
+    if not ASR_AUDIO_PUBLIC_BASE_URL or not ASR_AUDIO_URL_SECRET:
+        return None
+    rel_path = rel_path.replace(os.sep, "/")
+    expires = int(time.time()) + ASR_AUDIO_URL_TTL_SECONDS
+    return (
+        f"{ASR_AUDIO_PUBLIC_BASE_URL}/api/listening/asr-audio/{quote(rel_path)}"
+        f"?expires={expires}&sig={_audio_signature(rel_path, expires)}"
+    )
+
+
+def verify_audio_signature(rel_path: str, expires: int, sig: str) -> bool:
+    if not ASR_AUDIO_URL_SECRET or expires < time.time():
+        return False
+    return hmac.compare_digest(_audio_signature(rel_path, expires), sig)
@@ -0,0 +1,147 @@
+"""听力课音频转码 - 上传后用 ffmpeg 生成小体积的播放版和 ASR 版
+
+老师上传的 WAV / 高码率 M4A 动辄几十上百MB，以前原样推给每个用手机流量听课的学生，
+ASR 识别也要把整个原文件交给腾讯云。现在上传完成后在后台生成两个附属文件（与原文件同目录）：
+- "<音频文件名>.stream.mp3"：单声道 64kbps MP3，人声足够清晰，所有浏览器都能播放；
+  stream_audio 默认播放它，加 ?original=1 才返回原文件；
+- "<音频文件名>.asr.mp3"：16kHz 单声道，正好是 EngineModelType="16k_en" 需要的采样率，
+  识别任务优先提交它，内联上传的 5MB 上限也能覆盖二十分钟左右的音频。
+
+ffmpeg 本身就是独立进程，这里用 asyncio 子进程直接调用，用信号量限制同时运行的转码数
+（不需要再套一层进程池）。服务器没装 ffmpeg 时整个阶段跳过，一切照旧使用原文件；
+转出来的文件不比原文件小（原文件本来就是低码率 MP3）时也不保留。
+"""
+import os
+import uuid
+import shutil
+import asyncio
+from typing import Dict, Optional, Set, Tuple
+
+from app.logger import get_logger
+
+logger = get_logger("audio_transcode")
+
+# 是否在上传后自动转码（没有 ffmpeg 时自动跳过）
+AUDIO_TRANSCODE_ENABLED = os.getenv("AUDIO_TRANSCODE_ENABLED", "true").lower() == "true"
+# 同时运行的 ffmpeg 进程数
+AUDIO_TRANSCODE_MAX_PROCS = int(os.getenv("AUDIO_TRANSCODE_MAX_PROCS", "2"))
+# 单个文件转码超时（秒）
+AUDIO_TRANSCODE_TIMEOUT_SECONDS = int(os.getenv("AUDIO_TRANSCODE_TIMEOUT_SECONDS", "600"))
+# 播放版码率
+AUDIO_STREAM_BITRATE = os.getenv("AUDIO_STREAM_BITRATE", "64k")
+
+RENDITION_STREAM = "stream"
+RENDITION_ASR = "asr"
+
+# 附属文件后缀 → ffmpeg 输出参数
+RENDITION_SUFFIXES = {
+    RENDITION_STREAM: ".stream.mp3",
+    RENDITION_ASR: ".asr.mp3",
+}
+_RENDITION_ARGS = {
+    RENDITION_STREAM: ["-ac", "1", "-c:a", "libmp3lame", "-b:a", AUDIO_STREAM_BITRATE, "-f", "mp3"],
+    RENDITION_ASR: ["-ac", "1", "-ar", "16000", "-c:a", "libmp3lame", "-b:a", "32k", "-f", "mp3"],
+}
+RENDITION_MEDIA_TYPE = "audio/mpeg"
+
+
+def rendition_path(audio_abs_path: str, kind: str) -> str:
+    return audio_abs_path + RENDITION_SUFFIXES[kind]
+
+
+def existing_rendition(audio_abs_path: str, kind: str) -> Optional[str]:
+    """已生成的转码文件路径，没有时返回 None"""
+    path = rendition_path(audio_abs_path, kind)
+    return path if os.path.exists(path) else None
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+class AudioTranscoder:
+    """后台转码器：同一个文件同时只转一次，全局最多 AUDIO_TRANSCODE_MAX_PROCS 个 ffmpeg 进程"""
+
+    def __init__(self):
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # 转码失败或不值得转码的文件，本进程内不再重试
+        self._skipped: Set[Tuple[str, str]] = set()
+
+    def is_pending(self, audio_abs_path: str) -> bool:
+        return audio_abs_path in self._inflight
+
+    async def transcode(self, audio_abs_path: str) -> Dict[str, Optional[str]]:
+        """生成缺少的转码文件，返回 {类型: 转码文件路径或 None}；未启用或没有 ffmpeg 时直接返回已有的"""
+        task = self.schedule(audio_abs_path)
+        if task is None:
+            return {kind: existing_rendition(audio_abs_path, kind) for kind in RENDITION_SUFFIXES}
+        return await asyncio.shield(task)
+
+    def schedule(self, audio_abs_path: str) -> Optional[asyncio.Task]:
+        """在后台开始转码（不等待结果），已在转码时返回同一个任务；未启用或没有 ffmpeg 时返回 None"""
+        if not AUDIO_TRANSCODE_ENABLED or not ffmpeg_available():
+            return None
+        task = self._inflight.get(audio_abs_path)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._transcode_all(audio_abs_path))
+            self._inflight[audio_abs_path] = task
+            task.add_done_callback(lambda _: self._inflight.pop(audio_abs_path, None))
+        return task
+
+    async def _transcode_all(self, audio_abs_path: str) -> Dict[str, Optional[str]]:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(AUDIO_TRANSCODE_MAX_PROCS)
+        results: Dict[str, Optional[str]] = {}
+        for kind in RENDITION_SUFFIXES:
+            path = existing_rendition(audio_abs_path, kind)
+            if path is None and (audio_abs_path, kind) not in self._skipped and os.path.exists(audio_abs_path):
+                async with self._slots:
+                    path = await self._run_ffmpeg(audio_abs_path, kind)
+                if path is None:
+                    self._skipped.add((audio_abs_path, kind))
+            results[kind] = path
+        return results
+
+    async def _run_ffmpeg(self, audio_abs_path: str, kind: str) -> Optional[str]:
+        target = rendition_path(audio_abs_path, kind)
+        tmp = f"{target}.{uuid.uuid4().hex}.tmp"
+        cmd = [shutil.which("ffmpeg") or "ffmpeg", "-nostdin", "-v", "error", "-y", "-i", audio_abs_path,
+               "-vn", "-map_metadata", "-1", *_RENDITION_ARGS[kind], tmp]
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, stderr = await asyncio.wait_for(proc.communicate(), timeout=AUDIO_TRANSCODE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            stderr = b"timeout"
+        except asyncio.CancelledError:
+            proc.kill()
+            await proc.wait()
+            _discard(tmp)
+            raise
+
+        if proc.returncode != 0 or not os.path.exists(tmp) or os.path.getsize(tmp) == 0:
+            logger.warning(f"音频转码失败({kind}): {audio_abs_path} - {stderr.decode('utf-8', 'ignore')[-500:]}")
+            _discard(tmp)
+            return None
+        if os.path.getsize(tmp) >= os.path.getsize(audio_abs_path):
+            # 原文件本来就很小（低码率 MP3），转码没有意义
+            _discard(tmp)
+            return None
+        os.replace(tmp, target)
+        logger.info(f"音频转码完成({kind}): {os.path.basename(audio_abs_path)} "
+                    f"{os.path.getsize(audio_abs_path)} → {os.path.getsize(target)} 字节")
+        return target
+
+
+def _discard(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+audio_transcoder = AudioTranscoder()
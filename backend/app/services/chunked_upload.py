@@ -0,0 +1,122 @@
+"""听力课音频分块断点续传 - init / 按序号上传分块 / 查询进度 / finalize
+
+老师常在手机热点下上传几十MB的音频，快传完时断线就得从头再来。现在前端把文件切成
+UPLOAD_CHUNK_SIZE 大小的分块逐个上传，会话（已收到多少字节）记在 audio_upload_sessions 表里，
+断线或刷新页面后查询进度，从下一个分块继续传。
+
+- 分块必须按顺序到达：已收到的分块重复上传直接确认（请求成功但响应丢失时前端会重传），
+  跳号返回 409 并告知应该上传的序号；
+- 分块用 os.pwrite 在线程里写到 "_partial/<upload_id>.part" 的对应偏移，不阻塞事件循环；
+- 按到达顺序增量计算 sha256，finalize 时直接得到哈希用于去重；服务重启后内存里的
+  哈希状态丢失，finalize 时再在线程里补算一遍整个文件。
+"""
+import os
+import asyncio
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from app.logger import get_logger
+from app.models import AudioUploadSession
+from app.services.audio_storage import audio_storage_root
+
+logger = get_logger("chunked_upload")
+
+# 每个分块的大小：手机网络下单个请求几秒内能传完，断线时最多重传这么多
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(4 * 1024 * 1024)))
+# 超过这么久没有新分块的会话视为放弃，连同临时文件一起清理
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+
+UPLOAD_SESSION_UPLOADING = "uploading"
+UPLOAD_SESSION_FINALIZED = "finalized"
+
+PARTIAL_DIR_NAME = "_partial"
+
+# upload_id → (已计入哈希的字节数, hasher)；只在本进程内有效
+_hashers: Dict[str, Tuple[int, "hashlib._Hash"]] = {}
+_hashers_lock = threading.Lock()
+# upload_id → 锁：同一会话的分块请求串行处理（前端超时重发时可能同时到达两个相同分块）
+_session_locks: Dict[str, asyncio.Lock] = {}
+
+
+def partial_dir() -> str:
+    path = os.path.join(audio_storage_root(), PARTIAL_DIR_NAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def partial_path(upload_id: str) -> str:
+    return os.path.join(partial_dir(), f"{upload_id}.part")
+
+
+def total_chunks(session: AudioUploadSession) -> int:
+    return max(1, -(-session.total_size // session.chunk_size))
+
+
+def next_chunk_index(session: AudioUploadSession) -> int:
+    """下一个应该上传的分块序号；全部收齐时等于总块数"""
+    if session.received_bytes >= session.total_size:
+        return total_chunks(session)
+    return session.received_bytes // session.chunk_size
+
+
+def session_lock(upload_id: str) -> asyncio.Lock:
+    lock = _session_locks.get(upload_id)
+    if lock is None:
+        lock = _session_locks[upload_id] = asyncio.Lock()
+    return lock
+
+
+def write_chunk(upload_id: str, offset: int, data: bytes) -> None:
+    """把分块写到临时文件的指定偏移，并按顺序更新哈希（同步，调用方放到线程里执行）"""
+    fd = os.open(partial_path(upload_id), os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        view = memoryview(data)
+        written = 0
+        while written < len(view):
+            written += os.pwrite(fd, view[written:], offset + written)
+    finally:
+        os.close(fd)
+
+    with _hashers_lock:
+        hashed, hasher = _hashers.get(upload_id, (0, hashlib.sha256()))
+        if hashed == offset:
+            hasher.update(data)
+            _hashers[upload_id] = (offset + len(data), hasher)
+        else:
+            # 服务重启过，之前的哈希状态丢了：放弃增量哈希，finalize 时整体补算
+            _hashers.pop(upload_id, None)
+
+
+def take_streamed_hash(upload_id: str, total_size: int) -> Optional[str]:
+    """取走增量计算好的哈希；没有覆盖整个文件时返回 None"""
+    with _hashers_lock:
+        hashed, hasher = _hashers.pop(upload_id, (0, None))
+    if hasher is None or hashed != total_size:
+        return None
+    return hasher.hexdigest()
+
+
+def discard_session_files(upload_id: str) -> None:
+    with _hashers_lock:
+        _hashers.pop(upload_id, None)
+    _session_locks.pop(upload_id, None)
+    try:
+        os.remove(partial_path(upload_id))
+    except FileNotFoundError:
+        pass
+
+
+def prune_expired_sessions(db) -> int:
+    """删除超时未完成的会话和它们的临时文件，返回删除数量"""
+    cutoff = datetime.utcnow() - timedelta(hours=UPLOAD_SESSION_TTL_HOURS)
+    expired = db.query(AudioUploadSession).filter(AudioUploadSession.updated_at < cutoff).all()
+    for session in expired:
+        if session.status == UPLOAD_SESSION_UPLOADING:
+            discard_session_files(session.id)
+        db.delete(session)
+    if expired:
+        db.commit()
+        logger.info(f"清理过期的分块上传会话 {len(expired)} 个")
+    return len(expired)
@@ -0,0 +1,133 @@
+"""进程内后台任务队列 - 生成文章这类耗时几十秒到几分钟的操作改为"提交 → 轮询"
+
+以前 POST /api/reading/generate 要一直挂着 HTTP 请求，直到文章生成（最多重试3次）
+和翻译都完成，慢的时候会被反向代理超时断开，老师也只能干等。现在：
+- 提交后立刻返回 job_id，任务在事件循环里后台执行；
+- 任务由若干阶段（stage）顺序组成，每个阶段可以把阶段性结果写进 job.partial，
+  前端轮询时能先看到已经生成好的文章，再等翻译；
+- 支持取消：正在运行的阶段会被 CancelledError 中断。
+
+任务只保存在内存里（服务是单进程部署），重启后未完成的任务会丢失，前端重新提交即可；
+结束超过 JOB_RETENTION_SECONDS 的任务会被清理。
+"""
+import time
+import uuid
+import asyncio
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.logger import get_logger
+
+logger = get_logger("job_queue")
+
+# 同时运行的后台任务上限（真正的 LLM 并发还受 llm_scheduler 限制，这里只防止任务无限堆积）
+JOB_MAX_CONCURRENT = 4
+# 已结束任务保留多久供前端取结果
+JOB_RETENTION_SECONDS = 3600
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_SUCCEEDED = "succeeded"
+JOB_STATUS_FAILED = "failed"
+JOB_STATUS_CANCELLED = "cancelled"
+_FINISHED_STATUSES = {JOB_STATUS_SUCCEEDED, JOB_STATUS_FAILED, JOB_STATUS_CANCELLED}
+
+StageFunc = Callable[["Job"], Awaitable[None]]
+
+
+class Job:
+    """一个后台任务：按顺序执行各阶段，阶段函数通过 job.partial / job.result 回写结果"""
+
+    def __init__(self, kind: str, owner_id: str, stages: List[Tuple[str, StageFunc]]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner_id = owner_id
+        self.stages = stages
+        self.status = JOB_STATUS_QUEUED
+        self.stage: Optional[str] = None
+        self.partial: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.updated_at = self.created_at
+        self.finished_monotonic: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in _FINISHED_STATUSES
+
+    def _set_status(self, status: str) -> None:
+        self.status = status
+        self.updated_at = datetime.utcnow()
+        if self.finished:
+            self.finished_monotonic = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "stages": [name for name, _ in self.stages],
+            "partial": self.partial,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat(),
+        }
+
+
+class JobQueue:
+    def __init__(self, max_concurrent: int):
+        self._jobs: Dict[str, Job] = {}
+        self._slots = asyncio.Semaphore(max_concurrent)
+
+    def submit(self, kind: str, owner_id: str, stages: List[Tuple[str, StageFunc]]) -> Job:
+        """登记任务并在当前事件循环里后台启动，立即返回"""
+        self._prune()
+        job = Job(kind, owner_id, stages)
+        self._jobs[job.id] = job
+        job.task = asyncio.get_running_loop().create_task(self._run(job))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if not job or job.finished:
+            return False
+        if job.task is not None:
+            job.task.cancel()
+        return True
+
+    async def _run(self, job: Job) -> None:
+        try:
+            async with self._slots:
+                job._set_status(JOB_STATUS_RUNNING)
+                for name, stage_func in job.stages:
+                    job.stage = name
+                    job.updated_at = datetime.utcnow()
+                    await stage_func(job)
+            job._set_status(JOB_STATUS_SUCCEEDED)
+        except asyncio.CancelledError:
+            job._set_status(JOB_STATUS_CANCELLED)
+            logger.info(f"后台任务已取消: {job.kind} {job.id} (阶段: {job.stage})")
+        except Exception as e:
+            # HTTPException 等带 detail 的异常，给前端展示 detail 而不是整个对象
+            job.error = getattr(e, "detail", None) or str(e)
+            job._set_status(JOB_STATUS_FAILED)
+            logger.error(f"后台任务失败: {job.kind} {job.id} (阶段: {job.stage}): {job.error}")
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and now - job.finished_monotonic > JOB_RETENTION_SECONDS
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+job_queue = JobQueue(JOB_MAX_CONCURRENT)
@@ -0,0 +1,96 @@
+"""最后登录时间 - 合并成定时批量写入，登录请求本身不再 commit
+
+以前每次登录成功都立刻 UPDATE users + commit 一次，上课开始全班同时登录时就是一连串
+抢 SQLite 写锁的小事务。现在登录只把时间记在内存里，LastLoginRecorder 每隔
+LAST_LOGIN_FLUSH_SECONDS 用一条批量 UPDATE 写回；应用关闭时再写一次。
+读取最后登录时间的接口用 latest() 叠加还没写回（或刚写回、用户缓存还没刷新）的时间。
+"""
+import os
+import asyncio
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam
+
+from app.database import SessionLocal
+from app.logger import get_logger
+from app.models import User
+from app.services.lru_cache import TTLCache
+
+logger = get_logger("last_login")
+
+# 批量写回的间隔（秒）
+LAST_LOGIN_FLUSH_SECONDS = int(os.getenv("LAST_LOGIN_FLUSH_SECONDS", "30"))
+# 写回后仍在内存里保留多久用于叠加显示（覆盖用户快照缓存的存活时间）
+LAST_LOGIN_RECENT_SECONDS = 600
+
+
+def _write_batch(batch: Dict[str, datetime]) -> None:
+    # 用 Core 的 executemany：写回前被删除的用户直接跳过（ORM 批量更新会因行数对不上报错）
+    users = User.__table__
+    statement = users.update().where(users.c.id == bindparam("user_id")).values(last_login_at=bindparam("at"))
+    db = SessionLocal()
+    try:
+        db.execute(statement, [{"user_id": user_id, "at": at} for user_id, at in batch.items()])
+        db.commit()
+    finally:
+        db.close()
+
+
+class LastLoginRecorder:
+    """后台批量写入器，在应用启动时 start()，关闭时 stop()（关闭前把剩下的写完）"""
+
+    def __init__(self):
+        self._pending: Dict[str, datetime] = {}
+        self._recent = TTLCache(10000, LAST_LOGIN_RECENT_SECONDS)
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, user_id: str, at: Optional[datetime] = None) -> None:
+        at = at or datetime.utcnow()
+        self._pending[user_id] = at
+        self._recent.set(user_id, at)
+
+    def latest(self, user_id: str, stored: Optional[datetime]) -> Optional[datetime]:
+        """数据库里的值和内存里最近一次登录时间中较新的一个"""
+        recent = self._recent.get(user_id)
+        if recent is None or (stored is not None and stored >= recent):
+            return stored
+        return recent
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> int:
+        """把攒下的登录时间写回数据库，返回写入的用户数"""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(_write_batch, batch)
+        except Exception as e:
+            # 写失败时放回去下次再写（期间又登录过的以新时间为准）
+            for user_id, at in batch.items():
+                self._pending.setdefault(user_id, at)
+            logger.error(f"写入最后登录时间失败（{len(batch)} 个用户）: {e}")
+            return 0
+        return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(LAST_LOGIN_FLUSH_SECONDS)
+            await self.flush()
+
+
+last_login_recorder = LastLoginRecorder()
@@ -0,0 +1,145 @@
+"""智谱 GLM 异步 HTTP 客户端 - 进程内共用一个长连接池
+
+以前每次调用都新建 urllib 请求（每次一次 TCP+TLS 握手），并且每个路由都临时
+new 一个 ThreadPoolExecutor 来跑这个同步调用。课堂上学生集中查词时，大部分延迟
+都耗在握手和线程上。现在改为：
+- 应用启动时创建一个 httpx.AsyncClient（keep-alive 连接池），关闭时释放；
+- 阅读课、听力课、llm_common 都通过 zhipu_client.chat() 直接 await，不再占线程；
+- 并发上限、限速和429退避交给 llm_scheduler 统一调度。
+"""
+import os
+import json
+from typing import AsyncIterator, Optional
+
+import httpx
+from fastapi import HTTPException
+
+from app.logger import get_logger
+from app.services.llm_scheduler import llm_scheduler, PRIORITY_NORMAL, LLM_MAX_CONCURRENCY
+
+logger = get_logger("llm_client")
+
+# ZHIPU_API_KEY 从环境变量读取，配置在 backend/.env.local（不进git，需在本地和服务器上各自创建）
+ZHIPU_API_KEY = os.getenv("ZHIPU_API_KEY", "")
+ZHIPU_API_URL = "https://open.bigmodel.cn/api/paas/v4/chat/completions"
+
+# 429限流最多重新排队几次（每次都会触发调度器的全局暂停）
+RATE_LIMIT_MAX_RETRIES = 3
+
+# 连接池：保持的空闲长连接数与并发上限一致即可，空闲超过 keepalive_expiry 秒才断开
+_POOL_LIMITS = httpx.Limits(
+    max_connections=LLM_MAX_CONCURRENCY * 2,
+    max_keepalive_connections=LLM_MAX_CONCURRENCY,
+    keepalive_expiry=120,
+)
+
+
+class ZhipuClient:
+    """对智谱 chat/completions 接口的异步封装，整个进程共用一个实例"""
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self) -> None:
+        """应用启动时调用：建立连接池"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=_POOL_LIMITS,
+                headers={"Content-Type": "application/json"},
+            )
+
+    async def close(self) -> None:
+        """应用关闭时调用：关闭连接池中的所有连接"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def chat(self, payload: dict, timeout: int, error_prefix: str,
+                   priority: int = PRIORITY_NORMAL) -> str:
+        """发起一次对话补全请求，返回 choices[0].message.content
+
+        请求先在 llm_scheduler 按 priority 排队；收到429时通知调度器全局暂停，
+        然后重新排队（最多 RATE_LIMIT_MAX_RETRIES 次）。
+        """
+        if self._client is None:
+            # 没走应用启动流程（如脚本里直接调用）时按需创建
+            await self.start()
+
+        headers = {"Authorization": f"Bearer {ZHIPU_API_KEY}"}
+        last_error_detail = ""
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            try:
+                async with llm_scheduler.slot(priority):
+                    resp = await self._client.post(
+                        ZHIPU_API_URL, json=payload, headers=headers, timeout=timeout
+                    )
+            except Exception as e:
+                last_error_detail = str(e) or type(e).__name__
+                break
+
+            if resp.status_code == 429:
+                llm_scheduler.report_rate_limited()
+                if attempt < RATE_LIMIT_MAX_RETRIES:
+                    continue
+            if resp.status_code >= 400:
+                raise HTTPException(status_code=502, detail=f"{error_prefix}: {resp.status_code} {resp.text}")
+
+            llm_scheduler.report_success()
+            try:
+                return resp.json()["choices"][0]["message"]["content"]
+            except Exception as e:
+                last_error_detail = str(e)
+                break
+
+        raise HTTPException(status_code=502, detail=f"{error_prefix}: {last_error_detail}")
+
+    async def chat_stream(self, payload: dict, timeout: int, error_prefix: str,
+                          priority: int = PRIORITY_NORMAL) -> AsyncIterator[str]:
+        """流式对话补全（stream=True），逐段 yield choices[0].delta.content
+
+        429 只可能发生在开始输出之前，处理方式与 chat() 相同；开始输出后占用的
+        调度名额一直保持到流结束（或调用方提前关闭生成器）。
+        """
+        if self._client is None:
+            await self.start()
+
+        payload = {**payload, "stream": True}
+        headers = {"Authorization": f"Bearer {ZHIPU_API_KEY}"}
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            async with llm_scheduler.slot(priority):
+                try:
+                    async with self._client.stream(
+                        "POST", ZHIPU_API_URL, json=payload, headers=headers, timeout=timeout
+                    ) as resp:
+                        if resp.status_code == 429:
+                            llm_scheduler.report_rate_limited()
+                            if attempt < RATE_LIMIT_MAX_RETRIES:
+                                continue
+                        if resp.status_code >= 400:
+                            body = (await resp.aread()).decode("utf-8", errors="replace")
+                            raise HTTPException(status_code=502, detail=f"{error_prefix}: {resp.status_code} {body}")
+
+                        llm_scheduler.report_success()
+                        async for line in resp.aiter_lines():
+                            # SSE 格式：每条是 "data: {...}"，以 "data: [DONE]" 结束
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            try:
+                                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                            except Exception:
+                                continue
+                            if delta:
+                                yield delta
+                        return
+                except HTTPException:
+                    raise
+                except Exception as e:
+                    raise HTTPException(status_code=502, detail=f"{error_prefix}: {str(e) or type(e).__name__}")
+
+        raise HTTPException(status_code=502, detail=f"{error_prefix}: 429 限流重试次数用尽")
+
+
+zhipu_client = ZhipuClient()
@@ -4,73 +4,46 @@
 （错误码 github_models_retirement_brownout），改用智谱AI GLM（open.bigmodel.cn）：
 永久免费、国内直连稳定、同时支持文本(GLM-4.7-Flash)和视觉(GLM-4.6V-Flash)。
 
-注意：免费额度并发限制较低，容易触发429限流，call_llm/call_vision_llm内置了
-简单的429自动重试（指数退避），调用方不需要自己处理限流重试。
+注意：免费额度并发限制较低，容易触发429限流。所有调用都经过 llm_scheduler 统一
+排队限速，429时全局暂停后自动重试，调用方不需要自己处理限流重试，只需按场景传 priority。
+所有调用都是 async 的，走 llm_client.zhipu_client 共用的长连接池，路由里直接 await 即可。
+需要边生成边推给前端（SSE）时用 stream_llm，按 token 增量 yield。
 """
 import os
 import re
 import json
-import time
 import base64
-import urllib.request
-import urllib.error
-from typing import List, Optional
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
 from fastapi import HTTPException
 
+from app.services.llm_client import zhipu_client, ZHIPU_API_KEY
+from app.services.llm_scheduler import PRIORITY_NORMAL, PRIORITY_BULK
+from app.services.translation_cache import get_cached_translations, store_translations
+
 # ── LLM 配置 ─────────────────────────────────────────────────
-# ZHIPU_API_KEY 从环境变量读取，配置在 backend/.env.local（不进git，需在本地和服务器上各自创建）
-ZHIPU_API_KEY = os.getenv("ZHIPU_API_KEY", "")
 ZHIPU_MODEL = os.getenv("ZHIPU_MODEL", "glm-4.7-flash")
 ZHIPU_VISION_MODEL = os.getenv("ZHIPU_VISION_MODEL", "glm-4.6v-flash")
-ZHIPU_API_URL = "https://open.bigmodel.cn/api/paas/v4/chat/completions"
 
-# 429限流重试设置：免费额度并发数很低，简单退避重试几次即可缓解
-RATE_LIMIT_MAX_RETRIES = 3
-RATE_LIMIT_BACKOFF_SECONDS = 3
+# 长文翻译分块：每块不超过这么多英文单词/段落，保证单块译文远低于 4096 token 上限
+TRANSLATION_CHUNK_MAX_WORDS = 500
+TRANSLATION_CHUNK_MAX_PARAGRAPHS = 8
+# 单个分块解析不完整（段数对不上/JSON被截断）时只重试这个分块
+TRANSLATION_CHUNK_MAX_ATTEMPTS = 2
+
+# 流式翻译时每完成一段就回调一次：(段落下标, 译文)
+ParagraphCallback = Callable[[int, str], Awaitable[None]]
 
 
 def count_words(text: str) -> int:
     return len(re.findall(r"\b[a-zA-Z']+\b", text))
 
 
-def _call_zhipu_api(payload: dict, timeout: int, error_prefix: str) -> str:
-    """向智谱GLM发起请求，内置429限流自动重试（指数退避）"""
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        ZHIPU_API_URL,
-        data=data,
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {ZHIPU_API_KEY}",
-        },
-        method="POST"
-    )
-
-    last_error_detail = ""
-    for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
-        try:
-            with urllib.request.urlopen(req, timeout=timeout) as resp:
-                result = json.loads(resp.read().decode("utf-8"))
-                return result["choices"][0]["message"]["content"]
-        except urllib.error.HTTPError as e:
-            body = e.read().decode("utf-8")
-            if e.code == 429 and attempt < RATE_LIMIT_MAX_RETRIES:
-                time.sleep(RATE_LIMIT_BACKOFF_SECONDS * (attempt + 1))
-                continue
-            raise HTTPException(status_code=502, detail=f"{error_prefix}: {e.code} {body}")
-        except Exception as e:
-            last_error_detail = str(e)
-            break
-
-    raise HTTPException(status_code=502, detail=f"{error_prefix}: {last_error_detail}")
-
-
-def call_llm(prompt: str, max_tokens: int = 1024, model: Optional[str] = None) -> str:
-    """调用智谱GLM文本模型（同步，供 executor 使用）"""
+def _text_payload(prompt: str, max_tokens: int, model: Optional[str]) -> dict:
     if not ZHIPU_API_KEY:
         raise HTTPException(status_code=500, detail="ZHIPU_API_KEY 未配置，请在 backend/.env.local 中设置")
 
-    payload = {
+    return {
         "model": model or ZHIPU_MODEL,
         "messages": [{"role": "user", "content": prompt}],
         "temperature": 0.7,
@@ -80,11 +53,27 @@ def call_llm(prompt: str, max_tokens: int = 1024, model: Optional[str] = None) -
         # 关掉思考模式：既省token，也保证max_tokens都用在真正需要的输出内容上
         "thinking": {"type": "disabled"},
     }
-    return _call_zhipu_api(payload, timeout=60, error_prefix="LLM API 错误")
 
 
-def call_vision_llm(prompt: str, image_bytes: bytes, mimetype: str, max_tokens: int = 2048) -> str:
-    """调用智谱GLM视觉模型（同步，用于 OCR 图片识别）"""
+async def call_llm(prompt: str, max_tokens: int = 1024, model: Optional[str] = None,
+                   priority: int = PRIORITY_NORMAL) -> str:
+    """调用智谱GLM文本模型"""
+    payload = _text_payload(prompt, max_tokens, model)
+    return await zhipu_client.chat(payload, timeout=60, error_prefix="LLM API 错误", priority=priority)
+
+
+async def stream_llm(prompt: str, max_tokens: int = 1024, model: Optional[str] = None,
+                     priority: int = PRIORITY_NORMAL) -> AsyncIterator[str]:
+    """流式调用智谱GLM文本模型，逐段 yield 生成的文本增量"""
+    payload = _text_payload(prompt, max_tokens, model)
+    async for delta in zhipu_client.chat_stream(
+        payload, timeout=60, error_prefix="LLM API 错误", priority=priority
+    ):
+        yield delta
+
+
+async def call_vision_llm(prompt: str, image_bytes: bytes, mimetype: str, max_tokens: int = 2048) -> str:
+    """调用智谱GLM视觉模型（用于 OCR 图片识别）"""
     if not ZHIPU_API_KEY:
         raise HTTPException(status_code=500, detail="ZHIPU_API_KEY 未配置，请在 backend/.env.local 中设置")
 
@@ -105,7 +94,7 @@ def call_vision_llm(prompt: str, image_bytes: bytes, mimetype: str, max_tokens:
         # GLM-4.6V系列也是推理模型，关掉思考模式避免max_tokens被推理过程占满导致OCR结果被截断
         "thinking": {"type": "disabled"},
     }
-    return _call_zhipu_api(payload, timeout=90, error_prefix="视觉模型 API 错误")
+    return await zhipu_client.chat(payload, timeout=90, error_prefix="视觉模型 API 错误")
 
 
 def build_translation_prompt(article: str) -> str:
@@ -127,10 +116,13 @@ English passage:
 """
 
 
-def build_lookup_prompt(word: str, article: str) -> str:
-    return f"""You are a Chinese English teacher. A student double-clicked the word "{word}" in the following English article.
+def build_lookup_prompt(word: str, article: str, is_excerpt: bool = False) -> str:
+    """is_excerpt=True 时 article 只是被点击处附近的几句话，prompt 相应说明是文章片段"""
+    source = "excerpt from an English article" if is_excerpt else "English article"
+    label = "Excerpt" if is_excerpt else "Article"
+    return f"""You are a Chinese English teacher. A student double-clicked the word "{word}" in the following {source}.
 
-Determine the SINGLE most accurate part of speech for "{word}" as it is used in this article, then provide its Simplified Chinese meaning.
+Determine the SINGLE most accurate part of speech for "{word}" as it is used in this {"excerpt" if is_excerpt else "article"}, then provide its Simplified Chinese meaning.
 
 Rules:
 - Choose ONLY ONE part of speech: vt. OR vi. OR n. OR adj. OR adv. OR prep. OR conj.
@@ -150,33 +142,25 @@ Examples of WRONG output (never do this):
 词性: n. 释义: 质量
 词性: vt. 简体中文释义: 注意到
 
-Article:
+{label}:
 {article}
 """
 
 
-def generate_translation_sync(article: str, paragraphs: Optional[List[str]] = None) -> List[str]:
-    """同步生成按段落翻译（在 executor 中运行）
-
-    paragraphs: 调用方已经按自己的规则分好的段落列表（可选）。
-    - 阅读课不传，沿用原有按空行(\\n\\n)分段的行为，不受影响。
-    - 听力课传入按单换行分好的段落，避免与阅读课的双换行规则冲突。
-    传入时会用这份段落列表重新拼出以空行分隔的文本喂给 LLM（保证 LLM 稳定识别段落边界），
-    而不依赖原始文本本身的换行风格。
-    """
-    if paragraphs is not None:
-        en_paragraphs = [p.strip() for p in paragraphs if p.strip()]
-        article_for_prompt = "\n\n".join(en_paragraphs)
-    else:
-        en_paragraphs = [p.strip() for p in re.split(r'\n{2,}', article) if p.strip()]
-        article_for_prompt = article
+def _fit_to_count(items: List[str], expected_count: int) -> List[str]:
+    """截断或补空字符串，保证译文段数与原文段数一致"""
+    items = list(items[:expected_count])
+    while len(items) < expected_count:
+        items.append("")
+    return items
 
-    expected_count = len(en_paragraphs)
 
-    prompt = build_translation_prompt(article_for_prompt)
-    # 翻译用最大输出 token，防止长文章被截断（API 上限 4096）
-    result = call_llm(prompt, max_tokens=4096).strip()
+def _parse_translation_result(result: str, expected_count: int) -> Tuple[List[str], bool]:
+    """解析 LLM 返回的翻译 JSON 数组
 
+    返回 (译文列表, 是否完整)：只有 JSON 能直接解析且段数与原文一致时才算完整，
+    完整的结果才会写入翻译缓存，兜底解析出的结果不缓存。
+    """
     # 尝试多种方式解析 JSON 数组
     cleaned = re.sub(r"```json\s*|\s*```", "", result).strip()
 
@@ -184,7 +168,8 @@ def generate_translation_sync(article: str, paragraphs: Optional[List[str]] = No
     try:
         translations = json.loads(cleaned)
         if isinstance(translations, list) and len(translations) > 0:
-            return [str(t) for t in translations]
+            translations = [str(t) for t in translations]
+            return _fit_to_count(translations, expected_count), len(translations) == expected_count
     except Exception:
         pass
 
@@ -194,7 +179,8 @@ def generate_translation_sync(article: str, paragraphs: Optional[List[str]] = No
         end = cleaned.rindex(']') + 1
         translations = json.loads(cleaned[start:end])
         if isinstance(translations, list) and len(translations) > 0:
-            return [str(t) for t in translations]
+            translations = [str(t) for t in translations]
+            return _fit_to_count(translations, expected_count), len(translations) == expected_count
     except Exception:
         pass
 
@@ -202,26 +188,199 @@ def generate_translation_sync(article: str, paragraphs: Optional[List[str]] = No
     try:
         items = re.findall(r'"((?:[^"\\]|\\.)*)"', cleaned)
         items = [s.replace('\\"', '"').replace('\\n', '\n') for s in items if len(s) > 5]
-        if len(items) >= expected_count:
-            return items[:expected_count]
-        elif len(items) > 0:
-            while len(items) < expected_count:
-                items.append("")
-            return items[:expected_count]
+        if len(items) > 0:
+            return _fit_to_count(items, expected_count), False
     except Exception:
         pass
 
     # fallback：按空行分段（中文翻译段落通常也用空行分隔）
     chunks = [c.strip() for c in re.split(r'\n{2,}', cleaned) if c.strip()]
     if len(chunks) >= expected_count:
-        return chunks[:expected_count]
+        return chunks[:expected_count], False
 
-    # 按单换行分割
+    # 按单换行分割；最终fallback：有多少用多少，不足则补空字符串
     lines = [l.strip() for l in cleaned.split('\n') if l.strip()]
-    if len(lines) >= expected_count:
-        return lines[:expected_count]
+    return _fit_to_count(lines, expected_count), False
+
+
+class _JsonStringArrayStream:
+    """增量解析 LLM 流式输出的 JSON 字符串数组：每喂入一段文本，返回其中新完成的字符串元素
+
+    只关心顶层数组里的字符串，```json 围栏、数组前后的说明文字都会被跳过；
+    解析不了的元素（转义不合法）原样返回，最终结果仍以 _parse_translation_result 为准。
+    """
+
+    def __init__(self):
+        self._in_array = False
+        self._in_string = False
+        self._escaped = False
+        self._buf: List[str] = []
+
+    def feed(self, text: str) -> List[str]:
+        done = []
+        for ch in text:
+            if not self._in_array:
+                self._in_array = ch == "["
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                    self._buf.append(ch)
+                elif ch == "\\":
+                    self._escaped = True
+                    self._buf.append(ch)
+                elif ch == '"':
+                    raw = "".join(self._buf)
+                    self._in_string, self._buf = False, []
+                    try:
+                        done.append(json.loads(f'"{raw}"'))
+                    except Exception:
+                        done.append(raw)
+                else:
+                    self._buf.append(ch)
+            elif ch == '"':
+                self._in_string = True
+        return done
+
+
+async def _translate_paragraphs(paragraphs: List[str],
+                                on_item: Optional[ParagraphCallback] = None) -> Tuple[List[str], bool]:
+    """把一组段落拼成以空行分隔的文本整体送 LLM 翻译，返回 (译文列表, 是否完整)
+
+    传了 on_item 时改用流式调用，JSON 数组里每完成一个元素就回调一次 (块内下标, 译文)。
+    """
+    prompt = build_translation_prompt("\n\n".join(paragraphs))
+    # 翻译用最大输出 token，防止长文章被截断（API 上限 4096）
+    if on_item is None:
+        result = (await call_llm(prompt, max_tokens=4096, priority=PRIORITY_BULK)).strip()
+        return _parse_translation_result(result, len(paragraphs))
+
+    parser = _JsonStringArrayStream()
+    parts: List[str] = []
+    emitted = 0
+    async for delta in stream_llm(prompt, max_tokens=4096, priority=PRIORITY_BULK):
+        parts.append(delta)
+        for item in parser.feed(delta):
+            if emitted < len(paragraphs):
+                await on_item(emitted, item)
+            emitted += 1
+    return _parse_translation_result("".join(parts).strip(), len(paragraphs))
+
+
+def _split_into_chunks(paragraphs: List[str]) -> List[List[int]]:
+    """按顺序把段落下标切成若干块，每块的单词数/段落数都有上限
+
+    单个超长段落自成一块（不拆句，保证译文与原文段落一一对应）。
+    """
+    chunks: List[List[int]] = []
+    current: List[int] = []
+    current_words = 0
+    for i, para in enumerate(paragraphs):
+        wc = count_words(para)
+        if current and (current_words + wc > TRANSLATION_CHUNK_MAX_WORDS
+                        or len(current) >= TRANSLATION_CHUNK_MAX_PARAGRAPHS):
+            chunks.append(current)
+            current, current_words = [], 0
+        current.append(i)
+        current_words += wc
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _translate_chunk(paragraphs: List[str],
+                           on_item: Optional[ParagraphCallback] = None) -> Tuple[List[str], bool]:
+    """翻译一个分块，解析不完整时只重试这一块；重试用尽后返回最后一次的兜底解析结果
+
+    流式模式下重试会把同一下标的段落再推一次，最后再补推与最终解析结果不一致的段落，
+    所以前端按下标覆盖即可，最后一次收到的就是最终译文。
+    """
+    emitted = {}
+
+    async def emit(i: int, text: str):
+        emitted[i] = text
+        await on_item(i, text)
+
+    translated, complete = [], False
+    for _ in range(TRANSLATION_CHUNK_MAX_ATTEMPTS):
+        translated, complete = await _translate_paragraphs(paragraphs, emit if on_item else None)
+        if complete:
+            break
+
+    if on_item is not None:
+        for i, text in enumerate(translated):
+            if emitted.get(i) != text:
+                await on_item(i, text)
+    return translated, complete
+
+
+def _remap_indices(on_paragraph: ParagraphCallback, indices: List[int]) -> ParagraphCallback:
+    """把子列表里的下标换回原列表的下标再回调"""
+    async def on_item(i: int, text: str):
+        await on_paragraph(indices[i], text)
+    return on_item
+
+
+async def _translate_paragraphs_chunked(paragraphs: List[str],
+                                        on_paragraph: Optional[ParagraphCallback] = None
+                                        ) -> List[Tuple[List[int], List[str], bool]]:
+    """分块并行翻译，按原顺序返回每块的 (段落下标, 译文列表, 是否完整)
+
+    各分块同时提交，由 llm_scheduler 按批量优先级排队放行。
+    on_paragraph 收到的是 paragraphs 中的下标。
+    """
+    chunks = _split_into_chunks(paragraphs)
+
+    results = await asyncio.gather(*[
+        _translate_chunk([paragraphs[i] for i in chunk],
+                         _remap_indices(on_paragraph, chunk) if on_paragraph else None)
+        for chunk in chunks
+    ])
+    return [(chunk, *result) for chunk, result in zip(chunks, results)]
+
+
+async def generate_translation(article: str, paragraphs: Optional[List[str]] = None,
+                               on_paragraph: Optional[ParagraphCallback] = None) -> List[str]:
+    """生成按段落翻译
+
+    paragraphs: 调用方已经按自己的规则分好的段落列表（可选）。
+    - 阅读课不传，沿用原有按空行(\\n\\n)分段的行为，不受影响。
+    - 听力课传入按单换行分好的段落，避免与阅读课的双换行规则冲突。
+    传入时会用这份段落列表重新拼出以空行分隔的文本喂给 LLM（保证 LLM 稳定识别段落边界），
+    而不依赖原始文本本身的换行风格。
+
+    先按段落查翻译缓存（见 translation_cache.py），只把未命中的段落送 LLM，
+    所以重新生成/小改过的文章只为改动过的段落付费。
+    未命中的段落按长度分块并行翻译（长篇听力原文不会再撞 4096 token 上限），
+    哪一块解析失败就只重试哪一块。
+
+    on_paragraph（可选）：流式模式，命中缓存的段落立即回调，其余段落在 LLM 输出完
+    该段时回调 (段落下标, 译文)，供 SSE 接口边翻译边推送。
+    """
+    if paragraphs is not None:
+        en_paragraphs = [p.strip() for p in paragraphs if p.strip()]
+    else:
+        en_paragraphs = [p.strip() for p in re.split(r'\n{2,}', article) if p.strip()]
+
+    if not en_paragraphs:
+        return []
+
+    model = ZHIPU_MODEL
+    translations = get_cached_translations(en_paragraphs, model)
+    missing = [i for i in range(len(en_paragraphs)) if i not in translations]
+
+    if on_paragraph is not None:
+        for i in sorted(translations):
+            await on_paragraph(i, translations[i])
+
+    if missing:
+        missing_paragraphs = [en_paragraphs[i] for i in missing]
+        on_missing = _remap_indices(on_paragraph, missing) if on_paragraph else None
+
+        for chunk, translated, complete in await _translate_paragraphs_chunked(missing_paragraphs, on_missing):
+            chunk_paragraphs = [missing_paragraphs[j] for j in chunk]
+            if complete:
+                store_translations(chunk_paragraphs, translated, model)
+            for j, trans in zip(chunk, translated):
+                translations[missing[j]] = trans
 
-    # 最终fallback：有多少用多少，不足则补空字符串
-    while len(lines) < expected_count:
-        lines.append("")
-    return lines[:expected_count]
+    return [translations[i] for i in range(len(en_paragraphs))]
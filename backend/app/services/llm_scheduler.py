@@ -0,0 +1,180 @@
+"""GLM 调用调度器 - 进程级令牌桶限流 + 优先级排队
+
+以前每个请求各自遇到429就 sleep 3/6/9 秒再重试，同时到达的查词请求一起撞限流、
+一起睡、醒来再一起撞。现在所有 LLM 请求都先在这里排队：
+- 并发数（同时在途的请求）不超过 ZHIPU_MAX_CONCURRENCY；
+- 发出速率不超过 ZHIPU_MAX_QPS（令牌桶，允许短时突发到并发上限）；
+- 按优先级放行：学生双击查词 > OCR 等单次操作 > 整篇翻译/生成文章等批量任务；
+- 任何一个请求收到429时，整个调度器暂停放行一段时间（连续429时退避加倍），
+  而不是让每个线程各睡各的。
+
+stats() 给出当前排队深度和等待时间，供 /api/system/llm-queue 查看。
+"""
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from app.logger import get_logger
+
+logger = get_logger("llm_scheduler")
+
+# 优先级：数值越小越先放行
+PRIORITY_INTERACTIVE = 0  # 学生双击查词，等着看结果
+PRIORITY_NORMAL = 1       # 老师触发的单次操作（OCR识别等）
+PRIORITY_BULK = 2         # 整篇翻译、生成文章等耗时批量任务
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_BULK: "bulk",
+}
+
+LLM_MAX_CONCURRENCY = int(os.getenv("ZHIPU_MAX_CONCURRENCY", "3"))
+LLM_MAX_QPS = float(os.getenv("ZHIPU_MAX_QPS", "2"))
+
+# 收到429后全局暂停放行的时长：首次 RATE_LIMIT_COOLDOWN_SECONDS，连续429时翻倍，封顶 MAX
+RATE_LIMIT_COOLDOWN_SECONDS = 3
+RATE_LIMIT_MAX_COOLDOWN_SECONDS = 30
+
+
+class LLMScheduler:
+    """按优先级放行 LLM 请求，同时满足并发上限和令牌桶速率上限"""
+
+    def __init__(self, max_concurrency: int, max_qps: float):
+        self.max_concurrency = max_concurrency
+        self.max_qps = max_qps
+        self._burst = max(1, max_concurrency)
+        self._tokens = float(self._burst)
+        self._last_refill = time.monotonic()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._consecutive_rate_limits = 0
+
+        # 等待队列：(优先级, 入队序号, 入队时间, future)，序号保证同优先级先进先出
+        self._waiters: List[tuple] = []
+        self._seq = itertools.count()
+        self._wake_handle: Optional[asyncio.TimerHandle] = None
+
+        # 统计
+        self._served = 0
+        self._rate_limited = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._recent_wait_avg = 0.0  # 指数滑动平均，反映最近的排队情况
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._tokens = min(self._burst, self._tokens + elapsed * self.max_qps)
+
+    def _schedule_wake(self, delay: float) -> None:
+        if self._wake_handle is not None:
+            return
+        loop = asyncio.get_running_loop()
+
+        def _fire():
+            self._wake_handle = None
+            self._dispatch()
+
+        self._wake_handle = loop.call_later(max(delay, 0.0), _fire)
+
+    def _dispatch(self) -> None:
+        """在名额和令牌都允许的前提下，按优先级放行排队中的请求"""
+        while self._waiters and self._in_flight < self.max_concurrency:
+            now = time.monotonic()
+            if now < self._paused_until:
+                self._schedule_wake(self._paused_until - now)
+                return
+
+            self._refill(now)
+            if self._tokens < 1:
+                self._schedule_wake((1 - self._tokens) / self.max_qps)
+                return
+
+            _, _, enqueued_at, future = heapq.heappop(self._waiters)
+            if future.done():  # 排队期间调用方已取消（如客户端断开）
+                continue
+
+            self._tokens -= 1
+            self._in_flight += 1
+            self._record_wait(now - enqueued_at)
+            future.set_result(None)
+
+    def _record_wait(self, waited: float) -> None:
+        self._served += 1
+        self._total_wait += waited
+        self._max_wait = max(self._max_wait, waited)
+        self._recent_wait_avg = 0.8 * self._recent_wait_avg + 0.2 * waited
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), time.monotonic(), future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # 已经拿到名额之后才被取消：把名额还回去
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self._in_flight -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_NORMAL):
+        """占用一个请求名额：async with llm_scheduler.slot(PRIORITY_INTERACTIVE): ..."""
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def report_rate_limited(self) -> None:
+        """收到429：全局暂停放行，连续429时暂停时间翻倍"""
+        self._rate_limited += 1
+        self._consecutive_rate_limits += 1
+        cooldown = min(
+            RATE_LIMIT_COOLDOWN_SECONDS * (2 ** (self._consecutive_rate_limits - 1)),
+            RATE_LIMIT_MAX_COOLDOWN_SECONDS,
+        )
+        self._paused_until = max(self._paused_until, time.monotonic() + cooldown)
+        # 桶里剩余的令牌作废，恢复后按 QPS 重新攒
+        self._tokens = 0.0
+        logger.warning(f"GLM 返回429限流，暂停放行 {cooldown} 秒（连续第{self._consecutive_rate_limits}次）")
+
+    def report_success(self) -> None:
+        self._consecutive_rate_limits = 0
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        depth_by_priority = {name: 0 for name in PRIORITY_NAMES.values()}
+        oldest_wait = 0.0
+        for priority, _, enqueued_at, future in self._waiters:
+            if future.done():
+                continue
+            depth_by_priority[PRIORITY_NAMES.get(priority, str(priority))] += 1
+            oldest_wait = max(oldest_wait, now - enqueued_at)
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_qps": self.max_qps,
+            "in_flight": self._in_flight,
+            "queue_depth": sum(depth_by_priority.values()),
+            "queue_depth_by_priority": depth_by_priority,
+            "oldest_wait_seconds": round(oldest_wait, 2),
+            "paused_for_seconds": round(max(0.0, self._paused_until - now), 2),
+            "served": self._served,
+            "rate_limited": self._rate_limited,
+            "avg_wait_seconds": round(self._total_wait / self._served, 3) if self._served else 0.0,
+            "recent_avg_wait_seconds": round(self._recent_wait_avg, 3),
+            "max_wait_seconds": round(self._max_wait, 3),
+        }
+
+
+llm_scheduler = LLMScheduler(LLM_MAX_CONCURRENCY, LLM_MAX_QPS)
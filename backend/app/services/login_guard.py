@@ -0,0 +1,101 @@
+"""登录防护 - 连续失败限流，以及重复登录的密码校验快速通道
+
+/api/auth/login 以前每次都查库 + 跑一次 bcrypt（100~300ms CPU），一阵错误密码或重复登录的请求
+就是成倍的 CPU 和数据库压力。现在：
+- LoginLimiter：按用户名和客户端 IP 分别统计失败次数，超过上限后在锁定期内直接返回 429，
+  不查库、不跑 bcrypt；成功登录清零该用户名的计数。全班学生通常在同一个出口 IP 后面，
+  所以 IP 的上限比用户名宽松得多，只用来挡住换着用户名乱试的请求；
+- check_password：校验成功的 (密码哈希, 明文) 指纹在进程内缓存一小段时间，同一个人反复登录
+  （换设备、刷新页面）不用每次都跑 bcrypt。指纹是用进程随机密钥算的 HMAC，只在内存里，
+  改密码后哈希变了，旧指纹自然失效。
+"""
+import os
+import hmac
+import math
+import time
+import hashlib
+import secrets
+from typing import Optional
+
+from app.models import User
+from app.services.lru_cache import TTLCache
+from app.services.password_hashing import verify_password
+
+# 同一用户名在统计窗口内允许的失败次数
+LOGIN_MAX_FAILURES_PER_USER = int(os.getenv("LOGIN_MAX_FAILURES_PER_USER", "5"))
+# 同一 IP 在统计窗口内允许的失败次数（教室共用出口 IP，要留足余量）
+LOGIN_MAX_FAILURES_PER_IP = int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", "30"))
+# 失败计数的统计窗口（秒，从最后一次失败算起）
+LOGIN_FAILURE_WINDOW_SECONDS = int(os.getenv("LOGIN_FAILURE_WINDOW_SECONDS", "900"))
+# 达到上限后的锁定时长（秒）
+LOGIN_LOCKOUT_SECONDS = int(os.getenv("LOGIN_LOCKOUT_SECONDS", "300"))
+# 校验成功的密码指纹缓存时长（秒），0 表示关闭快速通道
+LOGIN_VERIFY_CACHE_SECONDS = int(os.getenv("LOGIN_VERIFY_CACHE_SECONDS", "600"))
+
+LOGIN_GUARD_CACHE_SIZE = 10000
+
+
+class LoginLimiter:
+    """按用户名和 IP 统计连续失败次数，超限后锁定一段时间"""
+
+    def __init__(self):
+        # (类型, 值) → (失败次数, 锁定到期的 monotonic 时间)
+        self._failures = TTLCache(LOGIN_GUARD_CACHE_SIZE, LOGIN_FAILURE_WINDOW_SECONDS)
+
+    @staticmethod
+    def _keys(username: str, ip: Optional[str]):
+        keys = [(("user", username.strip().lower()), LOGIN_MAX_FAILURES_PER_USER)]
+        if ip:
+            keys.append((("ip", ip), LOGIN_MAX_FAILURES_PER_IP))
+        return keys
+
+    def retry_after(self, username: str, ip: Optional[str]) -> int:
+        """还需要等待的秒数；没有被锁定时返回 0"""
+        now = time.monotonic()
+        wait = 0.0
+        for key, _ in self._keys(username, ip):
+            entry = self._failures.get(key)
+            if entry is not None and entry[1] > now:
+                wait = max(wait, entry[1] - now)
+        return math.ceil(wait)
+
+    def record_failure(self, username: str, ip: Optional[str]) -> None:
+        now = time.monotonic()
+        for key, limit in self._keys(username, ip):
+            count, _ = self._failures.get(key, (0, 0.0))
+            count += 1
+            if count >= limit:
+                # 锁定后计数清零，锁定期满再给一轮完整的尝试次数
+                self._failures.set(key, (0, now + LOGIN_LOCKOUT_SECONDS),
+                                   max(LOGIN_FAILURE_WINDOW_SECONDS, LOGIN_LOCKOUT_SECONDS))
+            else:
+                self._failures.set(key, (count, 0.0))
+
+    def record_success(self, username: str, ip: Optional[str]) -> None:
+        """登录成功只清用户名的计数，IP 的计数保留（同一 IP 下可能有人在乱试别人的账号）"""
+        self._failures.delete(self._keys(username, ip)[0][0])
+
+
+_verified = TTLCache(LOGIN_GUARD_CACHE_SIZE, max(LOGIN_VERIFY_CACHE_SECONDS, 1))
+_fingerprint_key = secrets.token_bytes(32)
+
+
+def _fingerprint(password: str, password_hash: str) -> bytes:
+    message = password_hash.encode("utf-8") + b"\0" + password.encode("utf-8")
+    return hmac.new(_fingerprint_key, message, hashlib.sha256).digest()
+
+
+async def check_password(user: User, password: str) -> bool:
+    """校验密码：最近校验成功过的组合直接通过，否则在线程池里跑 bcrypt"""
+    if LOGIN_VERIFY_CACHE_SECONDS <= 0:
+        return await verify_password(password, user.password_hash)
+    fingerprint = _fingerprint(password, user.password_hash)
+    if _verified.get(fingerprint):
+        return True
+    if not await verify_password(password, user.password_hash):
+        return False
+    _verified.set(fingerprint, True)
+    return True
+
+
+login_limiter = LoginLimiter()
@@ -0,0 +1,72 @@
+"""LRU + TTL 缓存工具 - 进程内的第一层缓存，以及数据库缓存表的统一淘汰
+
+TTLCache：多个请求线程会同时读写，所以所有操作都加锁；
+容量满时淘汰最久未使用的条目，过期条目在读取时惰性删除。
+prune_cache_table：数据库层缓存表（有 id / last_used_at 两列）按同样的 LRU/TTL 规则清理。
+"""
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """线程安全的 LRU 缓存，每个条目有固定的存活时间（秒）"""
+
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def prune_cache_table(db, model, ttl_days: int, max_rows: int) -> int:
+    """删除超过 ttl_days 未使用的行，再按 last_used_at 只保留最近的 max_rows 行，返回删除条数
+
+    只负责 delete，由调用方 commit。
+    """
+    cutoff = datetime.utcnow() - timedelta(days=ttl_days)
+    deleted = db.query(model).filter(model.last_used_at < cutoff).delete(synchronize_session=False)
+
+    total = db.query(model).count()
+    if total > max_rows:
+        overflow_ids = [
+            row_id for (row_id,) in db.query(model.id)
+            .order_by(model.last_used_at.asc())
+            .limit(total - max_rows)
+            .all()
+        ]
+        deleted += db.query(model).filter(model.id.in_(overflow_ids)).delete(synchronize_session=False)
+    return deleted
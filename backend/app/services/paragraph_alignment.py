@@ -1,12 +1,27 @@
 """段落级时间戳对齐 - 把ASR识别出的词/句子序列，匹配到老师人工分好的段落上
 
 场景：老师按\n\n人工分段的原文 vs 腾讯云ASR识别出的词序列(带时间戳)，
-两者是同一份文本的不同切分方式，本质是序列对齐问题（不是语义相似度问题），
-所以用 difflib.SequenceMatcher（最长公共子序列）而不是BLEU/编辑距离。
+两者是同一份文本的不同切分方式，本质是序列对齐问题（不是语义相似度问题）。
+
+段落在录音里是按顺序出现的，所以把所有段落拼成一条词序列，和ASR词序列做一次单调的全局对齐
+（patience diff 的思路），而不是每段都和整条ASR序列跑一遍 SequenceMatcher：
+1. 取两边都只出现一次的 n-gram 作为锚点，按原文顺序求ASR位置的最长递增子序列，
+   得到一条互不交叉的锚点链——重复出现的短语不会把段落拉回前面；
+2. 相邻锚点之间的空隙递归地用更短的 n-gram 找锚点，空隙足够小时才用 SequenceMatcher 精细对齐。
+整体接近线性，30分钟录音（5000+词）也在毫秒级完成。
 """
 import re
+from bisect import bisect_left
+from collections import Counter
 from difflib import SequenceMatcher
-from typing import List, Dict
+from typing import Dict, List, Sequence, Tuple
+
+# 依次尝试的锚点 n-gram 长度
+ANCHOR_NGRAM_SIZES = (3, 2, 1)
+# 空隙两边长度乘积不超过这个值时直接用 SequenceMatcher（O(n·m)，小空隙很快）
+GAP_DP_MAX_CELLS = 40000
+# 递归深度保护，正常文本远达不到
+_MAX_DEPTH = 32
 
 
 def _normalize_words(text: str) -> List[str]:
@@ -16,6 +31,85 @@ def _normalize_words(text: str) -> List[str]:
     return [w for w in text.split() if w]
 
 
+def _unique_ngrams(words: Sequence[str], lo: int, hi: int, n: int) -> Dict[Tuple[str, ...], int]:
+    """[lo, hi) 范围内只出现一次的 n-gram → 起始位置"""
+    counts: Counter = Counter()
+    first: Dict[Tuple[str, ...], int] = {}
+    for i in range(lo, hi - n + 1):
+        gram = tuple(words[i:i + n])
+        counts[gram] += 1
+        first.setdefault(gram, i)
+    return {gram: first[gram] for gram, c in counts.items() if c == 1}
+
+
+def _longest_increasing_chain(anchors: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """anchors 已按原文位置排序，求ASR位置严格递增的最长子序列（patience sorting，O(k log k)）"""
+    tails: List[int] = []      # tails[k]: 长度为 k+1 的链的最小末尾ASR位置
+    tail_idx: List[int] = []
+    prev: List[int] = [-1] * len(anchors)
+    for i, (_, a) in enumerate(anchors):
+        k = bisect_left(tails, a)
+        if k == len(tails):
+            tails.append(a)
+            tail_idx.append(i)
+        else:
+            tails[k] = a
+            tail_idx[k] = i
+        prev[i] = tail_idx[k - 1] if k > 0 else -1
+
+    chain = []
+    i = tail_idx[-1] if tail_idx else -1
+    while i >= 0:
+        chain.append(anchors[i])
+        i = prev[i]
+    chain.reverse()
+    return chain
+
+
+def _align_range(text: Sequence[str], asr: Sequence[str], t_lo: int, t_hi: int,
+                 a_lo: int, a_hi: int, depth: int = 0) -> List[Tuple[int, int]]:
+    """单调对齐 text[t_lo:t_hi] 与 asr[a_lo:a_hi]，返回两边都严格递增的匹配位置对"""
+    if t_lo >= t_hi or a_lo >= a_hi:
+        return []
+
+    if (t_hi - t_lo) * (a_hi - a_lo) <= GAP_DP_MAX_CELLS or depth >= _MAX_DEPTH:
+        if (t_hi - t_lo) * (a_hi - a_lo) > GAP_DP_MAX_CELLS * 16:
+            return []  # 递归过深且空隙仍然很大：放弃这一小段，避免退化成平方复杂度
+        matcher = SequenceMatcher(None, text[t_lo:t_hi], asr[a_lo:a_hi], autojunk=False)
+        return [
+            (t_lo + b.a + k, a_lo + b.b + k)
+            for b in matcher.get_matching_blocks() for k in range(b.size)
+        ]
+
+    for n in ANCHOR_NGRAM_SIZES:
+        text_grams = _unique_ngrams(text, t_lo, t_hi, n)
+        asr_grams = _unique_ngrams(asr, a_lo, a_hi, n)
+        anchors = sorted(
+            (t, asr_grams[gram]) for gram, t in text_grams.items() if gram in asr_grams
+        )
+        if not anchors:
+            continue
+
+        # 锚点链展开成逐词匹配对，相邻 n-gram 重叠的部分只保留一次
+        pairs: List[Tuple[int, int]] = []
+        for t, a in _longest_increasing_chain(anchors):
+            for k in range(n):
+                if not pairs or (t + k > pairs[-1][0] and a + k > pairs[-1][1]):
+                    pairs.append((t + k, a + k))
+
+        # 递归填补锚点之间（以及首尾）的空隙
+        result: List[Tuple[int, int]] = []
+        prev_t, prev_a = t_lo - 1, a_lo - 1
+        for t, a in pairs + [(t_hi, a_hi)]:
+            result.extend(_align_range(text, asr, prev_t + 1, t, prev_a + 1, a, depth + 1))
+            if t < t_hi:
+                result.append((t, a))
+            prev_t, prev_a = t, a
+        return result
+
+    return []
+
+
 def align_paragraphs_to_asr(paragraphs: List[str], asr_words: List[Dict]) -> List[Dict]:
     """
     paragraphs: 老师人工分好的段落文本列表
@@ -32,36 +126,37 @@ def align_paragraphs_to_asr(paragraphs: List[str], asr_words: List[Dict]) -> Lis
             asr_norm_words.append(w)
             asr_word_refs.append(item)
 
-    results = []
-    for idx, para in enumerate(paragraphs):
-        para_norm_words = _normalize_words(para)
-
-        if not para_norm_words or not asr_norm_words:
-            results.append({
-                "index": idx, "text": para, "start": 0.0, "end": 0.0, "match_score": 0.0
-            })
-            continue
+    # 所有段落拼成一条词序列，记录每段在其中的范围
+    text_words: List[str] = []
+    para_ranges: List[Tuple[int, int]] = []
+    for para in paragraphs:
+        start = len(text_words)
+        text_words.extend(_normalize_words(para))
+        para_ranges.append((start, len(text_words)))
 
-        matcher = SequenceMatcher(None, asr_norm_words, para_norm_words, autojunk=False)
-        blocks = [b for b in matcher.get_matching_blocks() if b.size > 0]
+    pairs = _align_range(text_words, asr_norm_words, 0, len(text_words), 0, len(asr_norm_words))
 
-        if not blocks:
+    # 匹配对按原文位置有序，逐段取出落在该段范围内的匹配
+    results = []
+    pair_idx = 0
+    for idx, (para, (p_start, p_end)) in enumerate(zip(paragraphs, para_ranges)):
+        while pair_idx < len(pairs) and pairs[pair_idx][0] < p_start:
+            pair_idx += 1
+        first = pair_idx
+        while pair_idx < len(pairs) and pairs[pair_idx][0] < p_end:
+            pair_idx += 1
+        matched = pairs[first:pair_idx]
+
+        if not matched:
             results.append({
                 "index": idx, "text": para, "start": 0.0, "end": 0.0, "match_score": 0.0
             })
             continue
 
-        # 匹配块在asr_norm_words里的位置范围，取第一个块的起点、最后一个块的终点
-        first_block = blocks[0]
-        last_block = blocks[-1]
-        start_asr_idx = first_block.a
-        end_asr_idx = last_block.a + last_block.size - 1
-
-        start_ms = asr_word_refs[start_asr_idx]["start_ms"]
-        end_ms = asr_word_refs[end_asr_idx]["end_ms"]
-
-        matched_word_count = sum(b.size for b in blocks)
-        match_score = round(matched_word_count / len(para_norm_words), 2)
+        # 匹配到的ASR范围：第一个匹配词的开头到最后一个匹配词的结尾
+        start_ms = asr_word_refs[matched[0][1]]["start_ms"]
+        end_ms = asr_word_refs[matched[-1][1]]["end_ms"]
+        match_score = round(len(matched) / (p_end - p_start), 2)
 
         results.append({
             "index": idx,
@@ -0,0 +1,71 @@
+"""密码哈希 - bcrypt 放到专用的有界线程池里执行，不阻塞事件循环
+
+bcrypt 故意设计得很慢（一次 100~300ms），以前 login / register / change-password 直接在
+async 函数里同步调用，整个事件循环在这段时间里什么都做不了；上课时全班同时登录，
+所有登录串行排队，其他请求也跟着卡住。现在：
+- 哈希/校验交给 PASSWORD_HASH_WORKERS 个线程的专用线程池（bcrypt 计算时释放 GIL），
+  不占用 FastAPI 默认线程池，登录高峰也不会挤掉普通的同步接口；
+- 加密强度由 BCRYPT_ROUNDS 配置；登录成功时如果发现已存的哈希强度和当前配置不同，
+  用刚验证过的明文重新哈希保存，调整强度后用户无感迁移。
+"""
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import bcrypt
+
+# bcrypt 的 cost factor（2 的幂次轮数），bcrypt 库默认 12
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# 专用线程池大小：同时进行的哈希计算数，超出的排队等待
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def hash_password_sync(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+
+def verify_password_sync(password: str, password_hash: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """已存哈希的强度和当前 BCRYPT_ROUNDS 不一致时返回 True（哈希格式：$2b$<rounds>$...）"""
+    parts = password_hash.split("$")
+    try:
+        return int(parts[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+        return _executor
+
+
+async def hash_password(password: str) -> str:
+    """在专用线程池里生成密码哈希"""
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), hash_password_sync, password)
+
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    """在专用线程池里校验密码"""
+    return await asyncio.get_running_loop().run_in_executor(
+        _get_executor(), verify_password_sync, password, password_hash
+    )
+
+
+def shutdown_password_pool() -> None:
+    """应用关闭时释放线程池"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
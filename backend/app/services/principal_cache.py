@@ -0,0 +1,142 @@
+"""登录用户缓存 - get_current_user 不再每个请求都验签 + 查一次 users 表
+
+课堂页面一屏就有几十个接口调用，每个都要先 jwt.decode 再按用户名查一次用户，
+处理函数还没开始就多了一次数据库往返。现在分几层缓存在进程内：
+- 令牌 → Principal：令牌里签名了用户ID、角色、学生ID和令牌版本号，验签通过后直接组装成
+  Principal，大多数处理函数（只看 id / role / student_id）拿它就够了，不用查库；
+  缓存时间不超过令牌本身的过期时间；
+- 令牌吊销表：只记录令牌版本号不为 0 的用户（改过密码/被重置过）和已删除的用户，启动时从数据库
+  加载一次，之后改密码、删除用户时直接更新内存，校验版本号不查库。访问令牌只有几分钟有效期
+  （见 auth.ACCESS_TOKEN_EXPIRE_MINUTES），进程重启后被删用户手里的旧令牌最多也只能再用这么久；
+- 用户名 → 用户快照：需要完整 User 的接口（/me、改密码）用脱离会话的 User 副本
+  （make_transient_to_detached），命中时用 db.merge(load=False) 挂到当前请求的会话上，不发 SELECT，
+  处理函数照常访问关系属性或修改后 commit。
+
+修改资料、删除用户、改密码/重置密码后调用 invalidate_principal 清掉对应用户的快照，
+下一个请求重新查库。吊销表只在本进程内更新，多开进程时其他进程要等访问令牌过期才生效。
+"""
+import os
+import time
+import threading
+from typing import Dict, Optional, Set
+
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.models import User
+from app.services.lru_cache import TTLCache
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "4096"))
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+_token_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS)
+_user_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+class Principal:
+    """当前登录用户的身份信息（来自令牌声明），不绑定数据库会话"""
+
+    __slots__ = ("id", "username", "role", "student_id", "token_version")
+
+    def __init__(self, id: str, username: str, role: str,
+                 student_id: Optional[int] = None, token_version: int = 0):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.student_id = student_id
+        self.token_version = token_version
+
+    @classmethod
+    def from_user(cls, user: User, student_id: Optional[int] = None) -> "Principal":
+        return cls(user.id, user.username, user.role, student_id, user.token_version or 0)
+
+    def claims(self) -> dict:
+        """写进访问令牌的声明"""
+        return {"typ": "access", "sub": self.username, "uid": self.id, "role": self.role,
+                "sid": self.student_id, "ver": self.token_version}
+
+
+def get_cached_principal(token: str) -> Optional[Principal]:
+    """已验签且未过期的令牌对应的 Principal；没缓存时返回 None"""
+    return _token_cache.get(token)
+
+
+def cache_principal(token: str, principal: Principal, expires_at: Optional[float]) -> None:
+    """记住验签结果；expires_at 是令牌的 exp（Unix 时间戳），缓存不会比令牌活得更久"""
+    ttl = PRINCIPAL_CACHE_TTL_SECONDS
+    if expires_at is not None:
+        ttl = min(ttl, expires_at - time.time())
+    if ttl > 0:
+        _token_cache.set(token, principal, ttl)
+
+
+class TokenRevocationList:
+    """用户ID → 令牌版本号（只存非 0 的）+ 已删除用户集合，校验时不查库"""
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        self._deleted: Set[str] = set()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self, db: Session) -> None:
+        """从 users 表加载版本号不为 0 的用户（应用启动时调用）"""
+        rows = db.query(User.id, User.token_version).filter(User.token_version > 0).all()
+        with self._lock:
+            self._versions = {user_id: version for user_id, version in rows}
+            self._loaded = True
+
+    def current_version(self, db: Session, user_id: str) -> Optional[int]:
+        """用户当前的令牌版本号；用户已被删除时返回 None"""
+        if not self._loaded:
+            self.load(db)
+        if user_id in self._deleted:
+            return None
+        return self._versions.get(user_id, 0)
+
+    def set_version(self, user_id: str, version: int) -> None:
+        with self._lock:
+            if version:
+                self._versions[user_id] = version
+            else:
+                self._versions.pop(user_id, None)
+
+    def mark_deleted(self, user_id: str) -> None:
+        with self._lock:
+            self._versions.pop(user_id, None)
+            self._deleted.add(user_id)
+
+    def __len__(self) -> int:
+        return len(self._versions) + len(self._deleted)
+
+
+token_revocations = TokenRevocationList()
+
+
+def current_token_version(db: Session, user_id: str) -> Optional[int]:
+    """用户当前的令牌版本号（读内存里的吊销表）；用户不存在时返回 None"""
+    return token_revocations.current_version(db, user_id)
+
+
+def load_cached_user(db: Session, username: str) -> Optional[User]:
+    """把缓存的用户快照合并进当前会话（不查库）；没缓存时返回 None"""
+    snapshot = _user_cache.get(username)
+    if snapshot is None:
+        return None
+    return db.merge(snapshot, load=False)
+
+
+def cache_user(user: User) -> None:
+    """保存一份脱离会话的用户快照（只复制列属性，不带关系）"""
+    snapshot = User(**{attr.key: getattr(user, attr.key) for attr in sa_inspect(User).column_attrs})
+    make_transient_to_detached(snapshot)
+    _user_cache.set(user.username, snapshot)
+
+
+def invalidate_principal(user: Optional[User] = None) -> None:
+    """用户资料/密码变化或被删除后清掉缓存；不传用户时全部清空"""
+    if user is None:
+        _token_cache.clear()
+        _user_cache.clear()
+    else:
+        _user_cache.delete(user.username)
@@ -0,0 +1,119 @@
+"""刷新令牌 - 签发、轮换、吊销
+
+访问令牌改成几分钟有效期后，前端在它过期时用刷新令牌换一对新的（POST /api/auth/refresh）。
+刷新令牌是 "<id>.<secret>" 形式的随机串，数据库只存 secret 的 sha256；每次换新都轮换：
+旧令牌标记吊销并记下新令牌 id。已轮换的旧令牌再次出现时：
+- 轮换后 REFRESH_REUSE_GRACE_SECONDS 秒内（多个标签页同时刷新）照常再签发一对；
+- 超过宽限期视为令牌被盗用，吊销该用户的全部刷新令牌，所有设备都要重新登录。
+登出、改密码、重置密码吊销的令牌（没有 replaced_by）再出现时只是拒绝。
+"""
+import os
+import hmac
+import uuid
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.logger import get_logger
+from app.models import RefreshToken, User
+
+logger = get_logger("refresh_tokens")
+
+# 刷新令牌有效期（天）：这么久没打开过系统就需要重新登录
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+# 已轮换的刷新令牌在这段时间内仍可使用一次（秒）
+REFRESH_REUSE_GRACE_SECONDS = int(os.getenv("REFRESH_REUSE_GRACE_SECONDS", "30"))
+
+
+def _hash_secret(secret: str) -> str:
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()
+
+
+def issue_refresh_token(db: Session, user_id: str) -> str:
+    """签发新的刷新令牌，返回给客户端的明文（只加到会话里，由调用方 commit）"""
+    token_id = uuid.uuid4().hex
+    secret = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        id=token_id,
+        user_id=user_id,
+        token_hash=_hash_secret(secret),
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return f"{token_id}.{secret}"
+
+
+def _lookup(db: Session, raw_token: str) -> Optional[RefreshToken]:
+    token_id, _, secret = (raw_token or "").partition(".")
+    if not token_id or not secret:
+        return None
+    record = db.query(RefreshToken).filter(RefreshToken.id == token_id).first()
+    if record is None or not hmac.compare_digest(record.token_hash, _hash_secret(secret)):
+        return None
+    return record
+
+
+def rotate_refresh_token(db: Session, raw_token: str) -> Optional[tuple]:
+    """用刷新令牌换新，返回 (用户, 新的刷新令牌明文)；令牌无效/过期/被吊销时返回 None（已 commit）"""
+    record = _lookup(db, raw_token)
+    now = datetime.utcnow()
+    if record is None or record.expires_at <= now:
+        return None
+
+    if record.revoked_at is not None:
+        in_grace = (
+            record.replaced_by is not None
+            and now - record.revoked_at <= timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS)
+        )
+        if not in_grace:
+            if record.replaced_by is not None:
+                revoked = revoke_user_refresh_tokens(db, record.user_id)
+                db.commit()
+                logger.warning(f"已轮换的刷新令牌被再次使用，吊销该用户全部刷新令牌: 用户ID={record.user_id}, 数量={revoked}")
+            return None
+
+    user = db.query(User).filter(User.id == record.user_id).first()
+    if user is None:
+        return None
+
+    new_token = issue_refresh_token(db, user.id)
+    if record.revoked_at is None:
+        record.revoked_at = now
+        record.replaced_by = new_token.partition(".")[0]
+    db.commit()
+    return user, new_token
+
+
+def revoke_refresh_token(db: Session, raw_token: str) -> bool:
+    """登出：吊销这一个刷新令牌（由调用方 commit）"""
+    record = _lookup(db, raw_token)
+    if record is None or record.revoked_at is not None:
+        return False
+    record.revoked_at = datetime.utcnow()
+    return True
+
+
+def revoke_user_refresh_tokens(db: Session, user_id: str) -> int:
+    """吊销用户所有未吊销的刷新令牌（改密码/重置密码时），由调用方 commit"""
+    return db.query(RefreshToken).filter(
+        RefreshToken.user_id == user_id,
+        RefreshToken.revoked_at.is_(None),
+    ).update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+
+
+def delete_user_refresh_tokens(db: Session, user_id: str) -> int:
+    """删除用户时一并删除刷新令牌，由调用方 commit"""
+    return db.query(RefreshToken).filter(RefreshToken.user_id == user_id).delete(synchronize_session=False)
+
+
+def prune_refresh_tokens(db: Session) -> int:
+    """删除已过期的刷新令牌（应用启动时调用）"""
+    deleted = db.query(RefreshToken).filter(RefreshToken.expires_at < datetime.utcnow()).delete(
+        synchronize_session=False
+    )
+    if deleted:
+        db.commit()
+        logger.info(f"清理过期刷新令牌 {deleted} 个")
+    return deleted
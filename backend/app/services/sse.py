@@ -0,0 +1,82 @@
+"""Server-Sent Events 工具 - 把"边生成边回调"的协程转成 text/event-stream 响应
+
+生成文章/翻译要几十秒，流式接口让前端先看到已经生成的内容：
+- 业务协程（producer）通过 emit(event, data) 推送事件，不需要关心 HTTP；
+- 事件经 asyncio.Queue 转给 StreamingResponse，producer 正常结束时补发 done，
+  抛异常时补发 error（HTTPException 只给 detail）；
+- 浏览器断开连接时 starlette 会取消响应生成器，这里顺带取消 producer，
+  不再继续占用 LLM 调度名额；
+- 长时间没有事件（排队等限流）时发注释行心跳，防止反向代理按空闲超时断开。
+"""
+import json
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from fastapi.responses import StreamingResponse
+
+from app.logger import get_logger
+
+logger = get_logger("sse")
+
+# 多久没有事件就发一次心跳（秒）
+SSE_HEARTBEAT_SECONDS = 15
+
+Emit = Callable[[str, Any], Awaitable[None]]
+Producer = Callable[[Emit], Awaitable[Any]]
+
+_END = object()
+
+
+def format_sse(event: str, data: Any) -> str:
+    """按 SSE 协议格式化一条事件，data 统一 JSON 编码（保留中文）"""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+async def _run_sse(producer: Producer) -> AsyncIterator[str]:
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def emit(event: str, data: Any) -> None:
+        await queue.put(format_sse(event, data))
+
+    async def run() -> None:
+        try:
+            result = await producer(emit)
+            await emit("done", result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            logger.error(f"流式任务失败: {detail}")
+            await emit("error", {"detail": detail})
+        finally:
+            await queue.put(_END)
+
+    task = asyncio.get_running_loop().create_task(run())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if item is _END:
+                break
+            yield item
+    finally:
+        if not task.done():
+            task.cancel()
+            logger.info("客户端已断开，取消流式任务")
+
+
+def sse_response(producer: Producer) -> StreamingResponse:
+    """producer(emit) 的返回值作为最后一条 done 事件的数据"""
+    return StreamingResponse(
+        _run_sse(producer),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # nginx 默认会缓冲响应体，关掉才能逐条推送
+            "X-Accel-Buffering": "no",
+        },
+    )
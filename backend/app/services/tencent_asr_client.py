@@ -15,19 +15,20 @@ ResTextFormat=1 时返回 ResultDetail，每个识别片段(可能包含多句
 换算成整段音频的绝对时间戳，这样才能拿到真正的词级精度（而不是整个片段共用一个时间戳）。
 """
 import os
-import time
 import base64
 import json
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from fastapi import HTTPException
 
 TENCENT_SECRET_ID = os.getenv("TENCENT_SECRET_ID", "")
 TENCENT_SECRET_KEY = os.getenv("TENCENT_SECRET_KEY", "")
 TENCENT_ASR_REGION = os.getenv("TENCENT_ASR_REGION", "ap-guangzhou")
 
-# 轮询设置：最多等待5分钟（150次 x 2秒），超过视为异常
-POLL_INTERVAL_SECONDS = 2
-MAX_POLL_ATTEMPTS = 150
+# 内联上传（SourceType=1，base64 放在请求体里）允许的最大文件，更大的文件必须走签名链接
+ASR_INLINE_MAX_BYTES = 5 * 1024 * 1024
+
+# 提交任务和轮询状态拆成两个同步函数（create_rec_task / describe_task_status），
+# 由 app/services/asr_jobs.py 的后台轮询器在事件循环里统一调度，不再在请求线程里 sleep 轮询
 
 
 def _ensure_credentials():
@@ -57,13 +58,7 @@ def _parse_result_detail(result_detail: List[Dict]) -> List[Dict]:
     return words
 
 
-def call_tencent_asr(audio_path: str) -> List[Dict]:
-    """调用腾讯云录音文件识别（异步任务），返回词级时间戳列表。
-
-    返回格式: [{"text": str, "start_ms": int, "end_ms": int}, ...]（每项是一个词）
-    """
-    _ensure_credentials()
-
+def _get_sdk():
     try:
         from tencentcloud.common import credential
         from tencentcloud.common.profile.client_profile import ClientProfile
@@ -74,53 +69,88 @@ def call_tencent_asr(audio_path: str) -> List[Dict]:
             status_code=500,
             detail="腾讯云SDK未安装，请运行: pip install tencentcloud-sdk-python-asr"
         )
+    return credential, ClientProfile, HttpProfile, asr_client, models
 
-    with open(audio_path, "rb") as f:
-        audio_bytes = f.read()
-    audio_b64 = base64.b64encode(audio_bytes).decode("utf-8")
 
-    try:
+_client = None
+
+
+def _get_client():
+    """AsrClient 可以复用（内部只保存密钥和 endpoint），所有任务共用一个"""
+    global _client
+    if _client is None:
+        credential, ClientProfile, HttpProfile, asr_client, _ = _get_sdk()
         cred = credential.Credential(TENCENT_SECRET_ID, TENCENT_SECRET_KEY)
         http_profile = HttpProfile()
         http_profile.endpoint = "asr.tencentcloudapi.com"
         client_profile = ClientProfile()
         client_profile.httpProfile = http_profile
-        client = asr_client.AsrClient(cred, TENCENT_ASR_REGION, client_profile)
+        _client = asr_client.AsrClient(cred, TENCENT_ASR_REGION, client_profile)
+    return _client
+
 
-        # 1. 提交录音文件识别任务（ResTextFormat=1 才会返回带词级时间戳的 ResultDetail）
-        req = models.CreateRecTaskRequest()
-        req.EngineModelType = "16k_en"
-        req.ChannelNum = 1
-        req.ResTextFormat = 1
+def create_rec_task(audio_path: str, audio_url: Optional[str] = None) -> str:
+    """提交录音文件识别任务，返回腾讯云 TaskId（同步的一次 HTTP 调用，调用方放到线程里执行）
+
+    - 传了 audio_url（本服务签名的音频下载链接）：SourceType=0，腾讯云自己来下载，
+      本进程不读文件，内存占用与文件大小无关；
+    - 否则 SourceType=1 把文件 base64 内联在请求里，只允许不超过 ASR_INLINE_MAX_BYTES 的小文件
+      （腾讯云对内联数据本身也有 5MB 上限）。
+    """
+    _ensure_credentials()
+    models = _get_sdk()[4]
+
+    # ResTextFormat=1 才会返回带词级时间戳的 ResultDetail
+    req = models.CreateRecTaskRequest()
+    req.EngineModelType = "16k_en"
+    req.ChannelNum = 1
+    req.ResTextFormat = 1
+
+    if audio_url:
+        req.SourceType = 0
+        req.Url = audio_url
+    else:
+        size = os.path.getsize(audio_path)
+        if size > ASR_INLINE_MAX_BYTES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"音频超过 {ASR_INLINE_MAX_BYTES // (1024 * 1024)}MB，需要配置 ASR_AUDIO_PUBLIC_BASE_URL "
+                       f"让腾讯云通过链接下载音频"
+            )
+        with open(audio_path, "rb") as f:
+            audio_bytes = f.read()
         req.SourceType = 1
-        req.Data = audio_b64
+        req.Data = base64.b64encode(audio_bytes).decode("utf-8")
         req.DataLen = len(audio_bytes)
 
-        resp = client.CreateRecTask(req)
+    try:
+        resp = _get_client().CreateRecTask(req)
         data = json.loads(resp.to_json_string())
-        task_id = data["Data"]["TaskId"]
-
-        # 2. 轮询任务状态（异步接口，长音频需要一定处理时间）
-        for _ in range(MAX_POLL_ATTEMPTS):
-            time.sleep(POLL_INTERVAL_SECONDS)
-
-            query_req = models.DescribeTaskStatusRequest()
-            query_req.TaskId = task_id
-            query_resp = client.DescribeTaskStatus(query_req)
-            query_data = json.loads(query_resp.to_json_string())
-
-            status = query_data.get("Data", {}).get("Status")
-            if status == 2:  # 成功
-                result_detail = query_data["Data"].get("ResultDetail") or []
-                return _parse_result_detail(result_detail)
-            elif status == 3:  # 失败
-                error_msg = query_data["Data"].get("ErrorMsg", "未知错误")
-                raise HTTPException(status_code=502, detail=f"腾讯云语音识别任务失败: {error_msg}")
-            # status 0/1 是等待中/处理中，继续轮询
-
-        raise HTTPException(status_code=504, detail="腾讯云语音识别超时（超过5分钟未完成），请重试")
-
-    except HTTPException:
-        raise
+        return str(data["Data"]["TaskId"])
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"调用腾讯云语音识别失败: {str(e)}")
+
+
+def describe_task_status(task_id: str) -> Tuple[str, Optional[List[Dict]], Optional[str]]:
+    """查询一次识别任务状态，返回 (状态, 词级时间戳, 错误信息)
+
+    状态: "running"（腾讯云 0/1 等待中/处理中）/ "succeeded" / "failed"
+    """
+    _ensure_credentials()
+    models = _get_sdk()[4]
+
+    try:
+        query_req = models.DescribeTaskStatusRequest()
+        query_req.TaskId = int(task_id)
+        query_resp = _get_client().DescribeTaskStatus(query_req)
+        query_data = json.loads(query_resp.to_json_string())
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"调用腾讯云语音识别失败: {str(e)}")
+
+    data = query_data.get("Data", {})
+    status = data.get("Status")
+    if status == 2:
+        return "succeeded", _parse_result_detail(data.get("ResultDetail") or []), None
+    if status == 3:
+        return "failed", None, f"腾讯云语音识别任务失败: {data.get('ErrorMsg', '未知错误')}"
+    return "running", None, None
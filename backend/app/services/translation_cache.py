@@ -0,0 +1,152 @@
+"""段落级翻译缓存 - 内容寻址（按段落原文哈希），两层：进程内 LRU + 数据库表
+
+老师经常"重新生成"或小改文章后再翻译，每次整篇送 LLM 要 10~40 秒且占用免费额度的并发。
+缓存键是 sha256(模型名 + 归一化段落)，所以：
+- 同一段落无论出现在哪篇文章里都能复用译文；
+- 编辑过的文章只有改动过的段落会缓存未命中，需要重新翻译。
+
+缓存读写失败（如数据库被锁）只记日志，不影响翻译本身。
+"""
+import os
+import re
+import hashlib
+from datetime import datetime
+from typing import Dict, List
+
+from app.database import SessionLocal
+from app.logger import get_logger
+from app.models import TranslationCache
+from app.services.lru_cache import TTLCache, prune_cache_table
+
+logger = get_logger("translation_cache")
+
+# 数据库层：超过 TTL 未被使用的条目、以及超出最大条数的最久未使用条目会被清理
+TRANSLATION_CACHE_TTL_DAYS = int(os.getenv("TRANSLATION_CACHE_TTL_DAYS", "90"))
+TRANSLATION_CACHE_MAX_ROWS = int(os.getenv("TRANSLATION_CACHE_MAX_ROWS", "20000"))
+# 进程内层：只放最近用过的段落，挡掉"连续重新生成同一篇"这种最常见的重复请求
+TRANSLATION_MEMORY_CACHE_SIZE = 2000
+TRANSLATION_MEMORY_CACHE_TTL_SECONDS = 6 * 3600
+
+# 每写入多少次顺带清理一次过期条目，避免每次写入都扫表
+_PRUNE_EVERY_N_WRITES = 50
+
+_memory_cache = TTLCache(TRANSLATION_MEMORY_CACHE_SIZE, TRANSLATION_MEMORY_CACHE_TTL_SECONDS)
+_writes_since_prune = 0
+
+
+def normalize_paragraph(text: str) -> str:
+    """合并空白字符，保证只是换行/空格差异的段落命中同一条缓存"""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_cache_key(paragraph: str, model: str) -> str:
+    raw = f"{model}\n{normalize_paragraph(paragraph)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_cached_translations(paragraphs: List[str], model: str) -> Dict[int, str]:
+    """返回 {段落下标: 译文}，只包含命中缓存的段落"""
+    found: Dict[int, str] = {}
+    keys = {i: make_cache_key(p, model) for i, p in enumerate(paragraphs)}
+
+    db_lookup: Dict[str, List[int]] = {}
+    for i, key in keys.items():
+        cached = _memory_cache.get(key)
+        if cached is not None:
+            found[i] = cached
+        else:
+            db_lookup.setdefault(key, []).append(i)
+
+    if not db_lookup:
+        return found
+
+    db = SessionLocal()
+    try:
+        rows = db.query(TranslationCache).filter(
+            TranslationCache.cache_key.in_(list(db_lookup.keys()))
+        ).all()
+        now = datetime.utcnow()
+        for row in rows:
+            for i in db_lookup[row.cache_key]:
+                found[i] = row.translation
+            _memory_cache.set(row.cache_key, row.translation)
+            row.hit_count = (row.hit_count or 0) + 1
+            row.last_used_at = now
+        if rows:
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"读取翻译缓存失败，按未命中处理: {e}")
+    finally:
+        db.close()
+
+    return found
+
+
+def store_translations(paragraphs: List[str], translations: List[str], model: str) -> None:
+    """把一批 (段落, 译文) 写入两层缓存；空译文不缓存（通常是解析失败补的占位）"""
+    global _writes_since_prune
+
+    entries = {}
+    for para, trans in zip(paragraphs, translations):
+        if not trans or not trans.strip():
+            continue
+        entries[make_cache_key(para, model)] = (normalize_paragraph(para), trans)
+    if not entries:
+        return
+
+    for key, (_, trans) in entries.items():
+        _memory_cache.set(key, trans)
+
+    db = SessionLocal()
+    try:
+        existing = {
+            row.cache_key: row
+            for row in db.query(TranslationCache).filter(
+                TranslationCache.cache_key.in_(list(entries.keys()))
+            ).all()
+        }
+        now = datetime.utcnow()
+        for key, (source, trans) in entries.items():
+            row = existing.get(key)
+            if row:
+                row.translation = trans
+                row.last_used_at = now
+            else:
+                db.add(TranslationCache(
+                    cache_key=key, model=model, source_text=source,
+                    translation=trans, created_at=now, last_used_at=now,
+                ))
+        db.commit()
+
+        _writes_since_prune += 1
+        if _writes_since_prune >= _PRUNE_EVERY_N_WRITES:
+            _writes_since_prune = 0
+            prune_translation_cache(db)
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"写入翻译缓存失败: {e}")
+    finally:
+        db.close()
+
+
+def prune_translation_cache(db=None) -> int:
+    """清理数据库层：删除超过 TTL 未使用的条目，再按 last_used_at 只保留最近的 MAX_ROWS 条"""
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        deleted = prune_cache_table(
+            db, TranslationCache, TRANSLATION_CACHE_TTL_DAYS, TRANSLATION_CACHE_MAX_ROWS
+        )
+        db.commit()
+        if deleted:
+            logger.info(f"翻译缓存清理: 删除 {deleted} 条")
+        return deleted
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"清理翻译缓存失败: {e}")
+        return 0
+    finally:
+        if own_session:
+            db.close()
@@ -0,0 +1,247 @@
+"""双击查词 - 两层缓存（进程内 LRU + 数据库表）+ 保存文章时预热
+
+同一篇文章上课时，全班学生会反复双击同样的几个目标词，每次都把整篇文章送 LLM。
+这里按 (单词, 所在句子) 缓存查词结果：同一个词在同一句话里的词性/释义是确定的，
+所以同一学生重复点、其他同学点同一个词都直接命中缓存。
+
+保存阅读课文章时可以顺带把所有目标词预热进缓存（批量优先级，不和学生的实时查词抢名额）。
+"""
+import os
+import re
+import hashlib
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from app.database import SessionLocal
+from app.logger import get_logger
+from app.models import WordLookupCache
+from app.services.llm_common import ZHIPU_MODEL, call_llm, build_lookup_prompt
+from app.services.llm_scheduler import PRIORITY_INTERACTIVE, PRIORITY_BULK
+from app.services.lru_cache import TTLCache, prune_cache_table
+
+logger = get_logger("word_lookup")
+
+LOOKUP_CACHE_TTL_DAYS = int(os.getenv("LOOKUP_CACHE_TTL_DAYS", "180"))
+LOOKUP_CACHE_MAX_ROWS = int(os.getenv("LOOKUP_CACHE_MAX_ROWS", "50000"))
+LOOKUP_MEMORY_CACHE_SIZE = 5000
+LOOKUP_MEMORY_CACHE_TTL_SECONDS = 12 * 3600
+
+# 查词上下文窗口：被点击的句子前后各取几句，窗口过长时只保留当前句
+LOOKUP_CONTEXT_SENTENCES = 1
+LOOKUP_CONTEXT_MAX_CHARS = 1200
+# 前端传来的 offset 与原文中该词实际位置允许的偏差（字符数）
+LOOKUP_OFFSET_TOLERANCE = 2
+
+# 保存文章时是否预热目标词，以及单篇文章最多预热多少个 (单词, 句子) 组合
+LOOKUP_PREWARM_ON_SAVE = os.getenv("LOOKUP_PREWARM_ON_SAVE", "1") == "1"
+LOOKUP_PREWARM_MAX_ITEMS = 40
+
+_PRUNE_EVERY_N_WRITES = 200
+
+_memory_cache = TTLCache(LOOKUP_MEMORY_CACHE_SIZE, LOOKUP_MEMORY_CACHE_TTL_SECONDS)
+_writes_since_prune = 0
+
+
+# ── 句子切分 / 上下文窗口 ─────────────────────────────────────
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n+")
+
+
+def sentence_spans(text: str) -> List[Tuple[int, int]]:
+    """按句末标点和换行粗略切句，返回每句在原文中的 [start, end) 字符区间（已去掉首尾空白）
+
+    查词只需要足够稳定的句子边界，不追求语言学上的精确。
+    """
+    spans = []
+    cursor = 0
+    for m in _SENTENCE_BOUNDARY.finditer(text):
+        spans.append((cursor, m.start()))
+        cursor = m.end()
+    spans.append((cursor, len(text)))
+
+    result = []
+    for start, end in spans:
+        segment = text[start:end]
+        stripped = segment.strip()
+        if not stripped:
+            continue
+        lead = len(segment) - len(segment.lstrip())
+        result.append((start + lead, start + lead + len(stripped)))
+    return result
+
+
+def split_sentences(text: str) -> List[str]:
+    return [text[start:end] for start, end in sentence_spans(text)]
+
+
+def _word_pattern(word: str) -> re.Pattern:
+    return re.compile(rf"(?<![A-Za-z']){re.escape(word)}(?![A-Za-z'])", re.IGNORECASE)
+
+
+def resolve_lookup_context(word: str, article: str, word_offset: Optional[int] = None) -> Tuple[str, str]:
+    """确定查词用的 (缓存句子, 送给 LLM 的上下文)
+
+    - 前端传了 word_offset（被点击的那个词在原文中的字符位置）且与原文对得上：
+      取该词所在句子及前后各 LOOKUP_CONTEXT_SENTENCES 句作为上下文；
+    - 没传 offset，但该词只出现在一个句子里：同样取这句的局部窗口；
+    - 其余情况（同一个词出现在多句里无法确定是哪一处、或原文里找不到该词）：
+      退化为整篇文章，与以前的行为一致；缓存也按整篇文章记，不能记在第一句名下，
+      否则别处的释义会被当成第一句的释义返回。
+    """
+    spans = sentence_spans(article)
+    occurrences = [m.start() for m in _word_pattern(word.strip()).finditer(article)]
+
+    def sentence_index_at(pos: int) -> int:
+        for i, (start, end) in enumerate(spans):
+            if start <= pos < end:
+                return i
+        return -1
+
+    sentence_idx = -1
+    if word_offset is not None:
+        nearest = min(occurrences, key=lambda pos: abs(pos - word_offset), default=None)
+        if nearest is not None and abs(nearest - word_offset) <= LOOKUP_OFFSET_TOLERANCE:
+            sentence_idx = sentence_index_at(nearest)
+    else:
+        candidates = {sentence_index_at(pos) for pos in occurrences}
+        if len(candidates) == 1:
+            sentence_idx = candidates.pop()
+
+    if sentence_idx < 0:
+        return article, article
+
+    start_idx = max(0, sentence_idx - LOOKUP_CONTEXT_SENTENCES)
+    end_idx = min(len(spans) - 1, sentence_idx + LOOKUP_CONTEXT_SENTENCES)
+    sentence = article[spans[sentence_idx][0]:spans[sentence_idx][1]]
+    context = article[spans[start_idx][0]:spans[end_idx][1]]
+    if len(context) > LOOKUP_CONTEXT_MAX_CHARS:
+        # 前后句太长时只留当前句；当前句本身就超长（如没有标点的转写稿）时按字符截断
+        context = sentence[:LOOKUP_CONTEXT_MAX_CHARS]
+    return sentence, context
+
+
+def _normalize_word(word: str) -> str:
+    return word.strip().strip(".,!?;:\"'()[]").lower()
+
+
+def _normalize_sentence(sentence: str) -> str:
+    return re.sub(r"\s+", " ", sentence).strip()
+
+
+def make_lookup_key(word: str, sentence: str, model: str) -> str:
+    raw = f"{model}\n{_normalize_word(word)}\n{_normalize_sentence(sentence)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ── 缓存读写 ──────────────────────────────────────────────────
+
+def get_cached_lookup(word: str, sentence: str, model: str) -> Optional[str]:
+    key = make_lookup_key(word, sentence, model)
+    cached = _memory_cache.get(key)
+    if cached is not None:
+        return cached
+
+    db = SessionLocal()
+    try:
+        row = db.query(WordLookupCache).filter(WordLookupCache.cache_key == key).first()
+        if not row:
+            return None
+        row.hit_count = (row.hit_count or 0) + 1
+        row.last_used_at = datetime.utcnow()
+        db.commit()
+        _memory_cache.set(key, row.meaning)
+        return row.meaning
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"读取查词缓存失败，按未命中处理: {e}")
+        return None
+    finally:
+        db.close()
+
+
+def store_lookup(word: str, sentence: str, model: str, meaning: str) -> None:
+    global _writes_since_prune
+
+    if not meaning:
+        return
+    key = make_lookup_key(word, sentence, model)
+    _memory_cache.set(key, meaning)
+
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        row = db.query(WordLookupCache).filter(WordLookupCache.cache_key == key).first()
+        if row:
+            row.meaning = meaning
+            row.last_used_at = now
+        else:
+            db.add(WordLookupCache(
+                cache_key=key, model=model, word=_normalize_word(word),
+                sentence=_normalize_sentence(sentence), meaning=meaning,
+                created_at=now, last_used_at=now,
+            ))
+        db.commit()
+
+        _writes_since_prune += 1
+        if _writes_since_prune >= _PRUNE_EVERY_N_WRITES:
+            _writes_since_prune = 0
+            deleted = prune_cache_table(db, WordLookupCache, LOOKUP_CACHE_TTL_DAYS, LOOKUP_CACHE_MAX_ROWS)
+            db.commit()
+            if deleted:
+                logger.info(f"查词缓存清理: 删除 {deleted} 条")
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"写入查词缓存失败: {e}")
+    finally:
+        db.close()
+
+
+# ── 查词入口 ──────────────────────────────────────────────────
+
+async def lookup_word_meaning(word: str, article: str, word_offset: Optional[int] = None,
+                              priority: int = PRIORITY_INTERACTIVE) -> str:
+    """返回 word 在 article 中的 "词性. 释义"，优先走缓存
+
+    只把被点击处附近的几句话送给 LLM（见 resolve_lookup_context），
+    长篇阅读/听力原文的 prompt 因此缩小好几倍。
+    """
+    sentence, context = resolve_lookup_context(word, article, word_offset)
+
+    model = ZHIPU_MODEL
+    cached = get_cached_lookup(word, sentence, model)
+    if cached is not None:
+        return cached
+
+    prompt = build_lookup_prompt(word, context, is_excerpt=context != article)
+    meaning = (await call_llm(prompt, priority=priority)).strip()
+    store_lookup(word, sentence, model, meaning)
+    return meaning
+
+
+async def prewarm_word_lookups(words: List[str], article: str) -> None:
+    """把文章的目标词（每个出现过的句子各一次）预热进查词缓存
+
+    保存文章后在后台执行，失败只记日志。
+    """
+    if not LOOKUP_PREWARM_ON_SAVE:
+        return
+
+    prewarmed = 0
+    for word in words:
+        if not word or not word.strip():
+            continue
+        seen_sentences = set()
+        for m in _word_pattern(word.strip()).finditer(article):
+            if prewarmed >= LOOKUP_PREWARM_MAX_ITEMS:
+                break
+            sentence, _ = resolve_lookup_context(word, article, m.start())
+            if sentence in seen_sentences:
+                continue
+            seen_sentences.add(sentence)
+            try:
+                await lookup_word_meaning(word, article, m.start(), priority=PRIORITY_BULK)
+                prewarmed += 1
+            except Exception as e:
+                logger.warning(f"预热查词缓存失败: {word} - {e}")
+    if prewarmed:
+        logger.info(f"查词缓存预热完成: {prewarmed} 条")
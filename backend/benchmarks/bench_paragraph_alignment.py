@@ -0,0 +1,243 @@
+"""段落时间戳对齐基准 - 合成带ASR噪声的转写稿，测 align_paragraphs_to_asr 的耗时、内存和边界精度
+
+不是单元测试，不连腾讯云：按固定随机种子生成"原文段落 + 模拟ASR词序列(带时间戳)"，
+噪声包括漏词、插入语气词、同音词替换、随机错词，以及跨段落重复出现的句子（最容易把段落对错位置）。
+每个规模分别跑当前的对齐实现和旧版"逐段 SequenceMatcher"实现，便于比较和发现性能回退。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_paragraph_alignment
+    python -m benchmarks.bench_paragraph_alignment --sizes 1000,5000,10000 --repeat 5 --json result.json
+    python -m benchmarks.bench_paragraph_alignment --strategies current --deletion-rate 0.1
+
+指标：
+- time_ms：对齐耗时中位数（不含数据生成）；bridge_ms：其中 _bridge_gaps 单独的耗时
+- peak_kb：tracemalloc 统计的对齐过程内存峰值
+- start_mae / end_mae：段落起止时间与真实值的平均绝对误差（秒），真实值同样经过 _bridge_gaps 处理
+- within_0.5s：起止时间误差都在 0.5 秒内的段落比例
+- backwards：开始时间早于上一段开始时间的段落数（对齐跳回前面的重复短语时会出现）
+"""
+import re
+import json
+import time
+import random
+import argparse
+import statistics
+import tracemalloc
+from difflib import SequenceMatcher
+from typing import Callable, Dict, List, Tuple
+
+from app.services.paragraph_alignment import align_paragraphs_to_asr, _bridge_gaps, _normalize_words
+
+_VOCAB = (
+    "the a an and but so because when then after before of to in on at for with from about "
+    "i you he she we they it my your his her our their this that these those "
+    "is was are were be been have has had do did can could will would should "
+    "go went come came see saw look looked make made take took get got give gave "
+    "say said tell told know knew think thought want like love need find found "
+    "day night morning time year week school home house room door window garden street city "
+    "friend family mother father teacher student child children people dog cat bird tree "
+    "book story letter picture music game lunch dinner breakfast water rain sun wind snow "
+    "happy sad big small little old new young long short good bad nice quiet loud warm cold "
+    "very really always often never sometimes again together slowly quickly soon now here there"
+).split()
+
+_HOMOPHONES = {
+    "to": ["too", "two"], "too": ["to"], "two": ["to"],
+    "there": ["their", "they're"], "their": ["there"],
+    "write": ["right"], "right": ["write"], "know": ["no"], "no": ["know"],
+    "see": ["sea"], "sea": ["see"], "for": ["four"], "four": ["for"],
+    "hear": ["here"], "here": ["hear"], "sun": ["son"], "son": ["sun"],
+    "one": ["won"], "won": ["one"], "by": ["buy", "bye"], "new": ["knew"], "knew": ["new"],
+    "week": ["weak"], "night": ["knight"], "would": ["wood"], "made": ["maid"],
+}
+_FILLERS = ["uh", "um", "er", "ah", "like", "so"]
+
+
+def make_paragraphs(rng: random.Random, total_words: int, repeat_rate: float) -> List[str]:
+    """生成约 total_words 词的原文，每段 40~120 词；部分句子在后面的段落里原样重复"""
+    sentences: List[str] = []
+    paragraphs: List[str] = []
+    words = 0
+    while words < total_words:
+        target = rng.randint(40, 120)
+        para_sentences: List[str] = []
+        para_words = 0
+        while para_words < target:
+            if sentences and rng.random() < repeat_rate:
+                sentence = rng.choice(sentences)
+            else:
+                n = rng.randint(6, 16)
+                sentence = " ".join(rng.choice(_VOCAB) for _ in range(n)).capitalize() + "."
+                sentences.append(sentence)
+            para_sentences.append(sentence)
+            para_words += len(sentence.split())
+        paragraphs.append(" ".join(para_sentences))
+        words += para_words
+    return paragraphs
+
+
+def simulate_asr(rng: random.Random, paragraphs: List[str], deletion_rate: float, insertion_rate: float,
+                 homophone_rate: float, substitution_rate: float) -> Tuple[List[Dict], List[Dict]]:
+    """按段落朗读生成ASR词序列，返回 (asr_words, 每段真实起止时间)"""
+    asr_words: List[Dict] = []
+    truth: List[Dict] = []
+    t = rng.randint(200, 1500)
+    for idx, para in enumerate(paragraphs):
+        para_start, para_end = None, None
+        for word in _normalize_words(para):
+            duration = rng.randint(180, 420)
+            spoken_start, spoken_end = t, t + duration
+            t = spoken_end + rng.randint(20, 120)
+            if para_start is None:
+                para_start = spoken_start
+            para_end = spoken_end
+
+            if rng.random() < insertion_rate:
+                asr_words.append({"text": rng.choice(_FILLERS), "start_ms": t, "end_ms": t + 150})
+                t += 200
+            if rng.random() < deletion_rate:
+                continue
+            text = word
+            if word in _HOMOPHONES and rng.random() < homophone_rate:
+                text = rng.choice(_HOMOPHONES[word])
+            elif rng.random() < substitution_rate:
+                text = rng.choice(_VOCAB)
+            asr_words.append({"text": text, "start_ms": spoken_start, "end_ms": spoken_end})
+        truth.append({
+            "index": idx, "text": para,
+            "start": round((para_start or 0) / 1000, 2), "end": round((para_end or 0) / 1000, 2),
+        })
+        t += rng.randint(500, 1500)  # 段落之间的停顿
+    _bridge_gaps(truth)
+    return asr_words, truth
+
+
+def legacy_align(paragraphs: List[str], asr_words: List[Dict]) -> List[Dict]:
+    """旧版实现：每段都和整条ASR词序列跑一次 SequenceMatcher，作为对比基线"""
+    asr_norm, refs = [], []
+    for item in asr_words:
+        for w in _normalize_words(item.get("text", "")):
+            asr_norm.append(w)
+            refs.append(item)
+
+    results = []
+    for idx, para in enumerate(paragraphs):
+        para_norm = _normalize_words(para)
+        blocks = []
+        if para_norm and asr_norm:
+            matcher = SequenceMatcher(None, asr_norm, para_norm, autojunk=False)
+            blocks = [b for b in matcher.get_matching_blocks() if b.size > 0]
+        if not blocks:
+            results.append({"index": idx, "text": para, "start": 0.0, "end": 0.0, "match_score": 0.0})
+            continue
+        start_ms = refs[blocks[0].a]["start_ms"]
+        end_ms = refs[blocks[-1].a + blocks[-1].size - 1]["end_ms"]
+        results.append({
+            "index": idx, "text": para,
+            "start": round(start_ms / 1000, 2), "end": round(end_ms / 1000, 2),
+            "match_score": round(sum(b.size for b in blocks) / len(para_norm), 2),
+        })
+    _bridge_gaps(results)
+    return results
+
+
+STRATEGIES: Dict[str, Callable[[List[str], List[Dict]], List[Dict]]] = {
+    "current": align_paragraphs_to_asr,
+    "legacy": legacy_align,
+}
+
+
+def score(result: List[Dict], truth: List[Dict]) -> Dict:
+    start_err = [abs(r["start"] - g["start"]) for r, g in zip(result, truth)]
+    end_err = [abs(r["end"] - g["end"]) for r, g in zip(result, truth)]
+    within = sum(1 for s, e in zip(start_err, end_err) if s <= 0.5 and e <= 0.5)
+    backwards = sum(1 for i in range(1, len(result)) if result[i]["start"] < result[i - 1]["start"])
+    return {
+        "start_mae": round(statistics.mean(start_err), 3),
+        "end_mae": round(statistics.mean(end_err), 3),
+        "within_0.5s": round(within / len(truth), 3),
+        "backwards": backwards,
+    }
+
+
+def run_case(strategy: str, paragraphs: List[str], asr_words: List[Dict], truth: List[Dict],
+             repeat: int) -> Dict:
+    align = STRATEGIES[strategy]
+    timings, result = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = align(paragraphs, asr_words)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # _bridge_gaps 单独计时（对齐函数内部已调用过一次，这里在副本上重跑）
+    copies = [dict(r) for r in result]
+    start = time.perf_counter()
+    _bridge_gaps(copies)
+    bridge_ms = (time.perf_counter() - start) * 1000
+
+    tracemalloc.start()
+    align(paragraphs, asr_words)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "strategy": strategy,
+        "time_ms": round(statistics.median(timings), 2),
+        "bridge_ms": round(bridge_ms, 3),
+        "peak_kb": round(peak / 1024, 1),
+        **score(result, truth),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="段落时间戳对齐基准")
+    parser.add_argument("--sizes", default="500,2000,5000,10000", help="转写稿词数，逗号分隔")
+    parser.add_argument("--strategies", default="current,legacy", help=f"可选: {','.join(STRATEGIES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="每个规模重复计时次数（取中位数）")
+    parser.add_argument("--seed", type=int, default=20240601)
+    parser.add_argument("--deletion-rate", type=float, default=0.05)
+    parser.add_argument("--insertion-rate", type=float, default=0.03)
+    parser.add_argument("--homophone-rate", type=float, default=0.3)
+    parser.add_argument("--substitution-rate", type=float, default=0.04)
+    parser.add_argument("--repeat-rate", type=float, default=0.08, help="句子跨段落重复出现的概率")
+    parser.add_argument("--legacy-max-words", type=int, default=5000,
+                        help="旧实现超过这个规模就跳过（平方复杂度，太慢）")
+    parser.add_argument("--json", help="把结果写入 JSON 文件，便于不同版本之间比较")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in re.split(r"[,\s]+", args.sizes) if s]
+    strategies = [s for s in args.strategies.split(",") if s]
+    unknown = [s for s in strategies if s not in STRATEGIES]
+    if unknown:
+        parser.error(f"未知的对齐策略: {', '.join(unknown)}")
+
+    rows = []
+    header = f"{'words':>7} {'paras':>6} {'strategy':>9} {'time_ms':>9} {'bridge_ms':>9} {'peak_kb':>9} " \
+             f"{'start_mae':>9} {'end_mae':>8} {'within_0.5s':>11} {'backwards':>9}"
+    print(header)
+    print("-" * len(header))
+    for size in sizes:
+        rng = random.Random(args.seed + size)
+        paragraphs = make_paragraphs(rng, size, args.repeat_rate)
+        asr_words, truth = simulate_asr(
+            rng, paragraphs, args.deletion_rate, args.insertion_rate,
+            args.homophone_rate, args.substitution_rate,
+        )
+        for strategy in strategies:
+            if strategy == "legacy" and size > args.legacy_max_words:
+                continue
+            row = {"words": size, "paragraphs": len(paragraphs), "asr_words": len(asr_words),
+                   **run_case(strategy, paragraphs, asr_words, truth, args.repeat)}
+            rows.append(row)
+            print(f"{size:>7} {len(paragraphs):>6} {strategy:>9} {row['time_ms']:>9} {row['bridge_ms']:>9} "
+                  f"{row['peak_kb']:>9} {row['start_mae']:>9} {row['end_mae']:>8} "
+                  f"{row['within_0.5s']:>11} {row['backwards']:>9}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": rows}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,10 @@ from app.database import get_db, create_tables
 from app.models import (
     User, Student, WordSet, Word, StudentWord,
     Schedule, LearningSession, LearningRecord,
-    LearningProgress, AntiForgetSession, StudentReview, ReadingArticle, ListeningArticle
+    LearningProgress, AntiForgetSession, StudentReview, ReadingArticle, ListeningArticle,
+    TranslationCache, WordLookupCache, AudioUpload, AudioUploadSession, AsrJob, RefreshToken
 )
-from app.routes import auth, students_api, words_api, schedule_api, progress_api, anti_forget_api, student_reviews_api, reading_api, listening_api
+from app.routes import auth, students_api, words_api, schedule_api, progress_api, anti_forget_api, student_reviews_api, reading_api, listening_api, system_api
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -48,6 +49,56 @@ async def startup_event():
     from app.init_db import create_default_admin
     create_default_admin()
 
+    # 4. 清理过期的翻译缓存（写入时也会定期清理，这里保证长期不翻译时也能回收）
+    from app.services.translation_cache import prune_translation_cache
+    prune_translation_cache()
+
+    # 5. 建立 GLM 共用长连接池（阅读课/听力课的所有 LLM 调用都复用它）
+    from app.services.llm_client import zhipu_client
+    await zhipu_client.start()
+
+    # 6. 启动腾讯云ASR任务轮询器（继续轮询重启前未完成的识别任务）
+    from app.services.asr_jobs import asr_poller
+    asr_poller.start()
+
+    # 7. 启动音频存储清理器（定期删除没有绑定文章的过期上传音频）
+    from app.services.audio_gc import audio_gc
+    audio_gc.start()
+
+    # 8. 启动最后登录时间的批量写入器
+    from app.services.last_login import last_login_recorder
+    last_login_recorder.start()
+
+    # 9. 加载令牌吊销表（校验访问令牌时不再查库），清理过期的刷新令牌
+    from app.database import SessionLocal
+    from app.services.principal_cache import token_revocations
+    from app.services.refresh_tokens import prune_refresh_tokens
+    db = SessionLocal()
+    try:
+        token_revocations.load(db)
+        prune_refresh_tokens(db)
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时释放共用的连接池，停止后台轮询"""
+    from app.services.last_login import last_login_recorder
+    await last_login_recorder.stop()
+
+    from app.services.audio_gc import audio_gc
+    await audio_gc.stop()
+
+    from app.services.asr_jobs import asr_poller
+    await asr_poller.stop()
+
+    from app.services.llm_client import zhipu_client
+    await zhipu_client.close()
+
+    from app.services.password_hashing import shutdown_password_pool
+    shutdown_password_pool()
+
 # 注册路由
 app.include_router(auth.router)
 app.include_router(students_api.router)
@@ -58,6 +109,7 @@ app.include_router(anti_forget_api.router)
 app.include_router(student_reviews_api.router)
 app.include_router(reading_api.router)
 app.include_router(listening_api.router)
+app.include_router(system_api.router)
 
 @app.get("/")
 async def root():
@@ -2,7 +2,7 @@
  * API配置文件
  * 统一管理所有HTTP请求
  */
-import axios, { type AxiosInstance, type AxiosError } from 'axios'
+import axios, { type AxiosInstance, type AxiosError, type InternalAxiosRequestConfig } from 'axios'
 import { ElMessage } from 'element-plus'
 
 // API基础URL - 自动检测
@@ -40,6 +40,34 @@ const api: AxiosInstance = axios.create({
   }
 })
 
+/**
+ * 用刷新令牌换新的访问令牌（访问令牌只有十几分钟有效期）
+ * 同一时间只发一个刷新请求，并发的401请求共用结果；成功返回新的访问令牌，失败返回null
+ */
+let refreshing: Promise<string | null> | null = null
+
+export const refreshAccessToken = (): Promise<string | null> => {
+  const refreshToken = localStorage.getItem('refresh_token')
+  if (!refreshToken) return Promise.resolve(null)
+
+  if (!refreshing) {
+    // 用裸axios发请求，避免刷新失败的401再次进入下面的拦截器
+    refreshing = axios
+      .post(`${API_BASE_URL}/api/auth/refresh`, { refresh_token: refreshToken })
+      .then((response) => {
+        const { access_token, refresh_token } = response.data
+        localStorage.setItem('auth_token', access_token)
+        localStorage.setItem('refresh_token', refresh_token)
+        return access_token as string
+      })
+      .catch(() => null)
+      .finally(() => {
+        refreshing = null
+      })
+  }
+  return refreshing
+}
+
 // 请求拦截器 - 自动添加token
 api.interceptors.request.use(
   (config) => {
@@ -61,7 +89,24 @@ api.interceptors.response.use(
   (response) => {
     return response
   },
-  (error: AxiosError<{ detail: string }>) => {
+  async (error: AxiosError<{ detail: string }>) => {
+    // 访问令牌过期：用刷新令牌换新后重发一次（登录/刷新接口本身的401不重试）
+    const original = error.config as (InternalAxiosRequestConfig & { _retried?: boolean }) | undefined
+    if (
+      error.response?.status === 401 &&
+      original &&
+      !original._retried &&
+      !original.url?.includes('/api/auth/login') &&
+      !original.url?.includes('/api/auth/refresh')
+    ) {
+      original._retried = true
+      const token = await refreshAccessToken()
+      if (token) {
+        original.headers.Authorization = `Bearer ${token}`
+        return api(original)
+      }
+    }
+
     // 处理不同的错误状态码
     if (error.response) {
       const { status, data } = error.response
@@ -70,6 +115,7 @@ api.interceptors.response.use(
         case 401:
           // 未授权 - 清除token并跳转到登录页
           localStorage.removeItem('auth_token')
+          localStorage.removeItem('refresh_token')
           localStorage.removeItem('current_user')
           ElMessage.error('登录已过期，请重新登录')
           // 跳转到登录页（通过window.location避免循环导入）
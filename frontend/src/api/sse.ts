@@ -0,0 +1,83 @@
+/**
+ * 流式接口（Server-Sent Events）
+ * 后端的 *-stream 接口是 POST + text/event-stream，浏览器自带的 EventSource 只支持 GET，
+ * 所以这里用 fetch 读响应流，自己按空行切分事件
+ */
+import { API_BASE_URL, refreshAccessToken } from './config'
+
+export interface StreamEvent {
+  event: string
+  data: any
+}
+
+/**
+ * 发起流式请求，每收到一条事件回调一次 onEvent
+ * 正常结束时返回 done 事件的数据；收到 error 事件或 HTTP 出错时抛出 Error(detail)
+ */
+export async function postEventStream(
+  path: string,
+  body: unknown,
+  onEvent: (evt: StreamEvent) => void,
+  signal?: AbortSignal
+): Promise<any> {
+  const send = (token: string | null) =>
+    fetch(`${API_BASE_URL}${path}`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Accept: 'text/event-stream',
+        ...(token ? { Authorization: `Bearer ${token}` } : {})
+      },
+      body: JSON.stringify(body),
+      signal
+    })
+
+  let res = await send(localStorage.getItem('auth_token'))
+  if (res.status === 401) {
+    // 访问令牌过期：换新后重发一次
+    const token = await refreshAccessToken()
+    if (token) res = await send(token)
+  }
+
+  if (!res.ok || !res.body) {
+    const data = await res.json().catch(() => null)
+    throw new Error(data?.detail || `请求失败（${res.status}）`)
+  }
+
+  const reader = res.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let doneData: any = undefined
+
+  const handleBlock = (block: string) => {
+    let event = 'message'
+    const dataLines: string[] = []
+    for (const line of block.split('\n')) {
+      // 冒号开头的是心跳注释行
+      if (line.startsWith(':')) continue
+      if (line.startsWith('event:')) event = line.slice(6).trim()
+      else if (line.startsWith('data:')) dataLines.push(line.slice(5).trimStart())
+    }
+    if (!dataLines.length) return
+    const data = JSON.parse(dataLines.join('\n'))
+    if (event === 'error') throw new Error(data?.detail || '请求失败')
+    if (event === 'done') doneData = data
+    onEvent({ event, data })
+  }
+
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    let sep = buffer.indexOf('\n\n')
+    while (sep >= 0) {
+      handleBlock(buffer.slice(0, sep))
+      buffer = buffer.slice(sep + 2)
+      sep = buffer.indexOf('\n\n')
+    }
+  }
+  if (buffer.trim()) handleBlock(buffer)
+
+  if (doneData === undefined) throw new Error('连接中断，请重试')
+  return doneData
+}
@@ -48,11 +48,12 @@ export const useAuthStore = defineStore('auth', () => {
         }
       })
 
-      const { access_token } = response.data
+      const { access_token, refresh_token } = response.data
 
-      // 保存token
+      // 保存token（访问令牌过期后由 api/config.ts 用刷新令牌自动换新）
       authToken.value = access_token
       localStorage.setItem('auth_token', access_token)
+      localStorage.setItem('refresh_token', refresh_token)
 
       // 获取当前用户信息
       await fetchCurrentUser()
@@ -87,9 +88,15 @@ export const useAuthStore = defineStore('auth', () => {
    * 登出
    */
   const logout = () => {
+    // 通知服务器吊销刷新令牌（失败也不影响本地登出）
+    const refreshToken = localStorage.getItem('refresh_token')
+    if (refreshToken) {
+      api.post('/api/auth/logout', { refresh_token: refreshToken }).catch(() => {})
+    }
     currentUser.value = null
     authToken.value = null
     localStorage.removeItem('auth_token')
+    localStorage.removeItem('refresh_token')
     localStorage.removeItem('current_user')
   }
 
@@ -203,10 +210,16 @@ export const useAuthStore = defineStore('auth', () => {
     }
 
     try {
-      await api.post('/api/auth/change-password', {
+      const response = await api.post('/api/auth/change-password', {
         old_password: oldPassword,
         new_password: newPassword
       })
+      // 改密码后旧令牌失效，换成服务器新签发的令牌
+      if (response.data?.access_token) {
+        authToken.value = response.data.access_token
+        localStorage.setItem('auth_token', response.data.access_token)
+        localStorage.setItem('refresh_token', response.data.refresh_token)
+      }
       return { success: true, message: '密码修改成功' }
     } catch (error: any) {
       console.error('Change password error:', error)
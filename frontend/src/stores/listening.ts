@@ -5,6 +5,7 @@
 import { defineStore } from 'pinia'
 import { ref } from 'vue'
 import api from '@/api/config'
+import { postEventStream } from '@/api/sse'
 
 export interface ParagraphTimestamp {
   index: number
@@ -31,6 +32,55 @@ export interface AntiForgetWordItem {
   chinese: string
 }
 
+export interface AlignTimestampsResult {
+  job_id: number
+  status: 'pending' | 'submitted' | 'succeeded' | 'failed'
+  paragraphs: ParagraphTimestamp[]
+  audio_duration_seconds: number
+  error: string | null
+}
+
+export interface AudioPeaksLevel {
+  samples_per_bucket: number
+  min: number[]
+  max: number[]
+}
+
+// 后端上传时预先算好的波形峰值：多级缩放，min/max 归一化到 -127..127
+export interface AudioPeaks {
+  version: number
+  sample_rate: number
+  duration: number
+  levels: AudioPeaksLevel[]
+}
+
+export interface UploadAudioResult {
+  temp_audio_id: string
+  duration_seconds: number
+  original_filename: string
+}
+
+interface UploadSessionStatus {
+  upload_id: string
+  chunk_size: number
+  total_size: number
+  total_chunks: number
+  received_bytes: number
+  next_chunk: number
+  status: 'uploading' | 'finalized'
+}
+
+const ASR_JOB_POLL_INTERVAL_MS = 3000
+
+// 分块上传：单个分块失败后最多重试几次（每次等待时间翻倍，封顶 UPLOAD_RETRY_MAX_DELAY_MS）
+const UPLOAD_CHUNK_MAX_RETRIES = 6
+const UPLOAD_RETRY_MAX_DELAY_MS = 15000
+const UPLOAD_CHUNK_TIMEOUT_MS = 120000
+// 未完成的上传会话ID存在 localStorage，刷新页面后重新选择同一个文件可以续传
+const UPLOAD_RESUME_KEY_PREFIX = 'listening_upload:'
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms))
+
 export const useListeningStore = defineStore('listening', () => {
   const loading = ref(false)
 
@@ -57,26 +107,122 @@ export const useListeningStore = defineStore('listening', () => {
   }
 
   /**
-   * 上传音频文件
+   * 流式按段落翻译（SSE）：每翻译完一段回调 onParagraph，同一段可能回调多次，以最后一次为准
    */
-  async function uploadAudio(audioFile: File) {
-    const formData = new FormData()
-    formData.append('audio', audioFile)
-    const res = await api.post('/api/listening/upload-audio', formData, {
-      headers: { 'Content-Type': 'multipart/form-data' }
+  async function translateArticleStream(
+    articleContent: string,
+    onParagraph: (index: number, text: string) => void,
+    signal?: AbortSignal
+  ) {
+    const result = await postEventStream(
+      '/api/listening/translate-stream',
+      { article_content: articleContent },
+      (evt) => {
+        if (evt.event === 'paragraph') onParagraph(evt.data.index, evt.data.text)
+      },
+      signal
+    )
+    return result as { translation: string[] }
+  }
+
+  /**
+   * 上传音频文件（分块断点续传：断网后自动重试，刷新页面后重新选择同一文件从断点继续）
+   */
+  async function uploadAudio(audioFile: File, onProgress?: (percent: number) => void) {
+    const resumeKey = `${UPLOAD_RESUME_KEY_PREFIX}${audioFile.name}:${audioFile.size}:${audioFile.lastModified}`
+    const base = '/api/listening/uploads'
+
+    let session: UploadSessionStatus | null = null
+    const savedId = localStorage.getItem(resumeKey)
+    if (savedId) {
+      try {
+        session = (await api.get(`${base}/${savedId}`)).data
+      } catch {
+        localStorage.removeItem(resumeKey)
+      }
+    }
+    if (!session) {
+      session = (await api.post(`${base}/init`, {
+        filename: audioFile.name,
+        size: audioFile.size,
+        mimetype: audioFile.type || null
+      })).data as UploadSessionStatus
+      localStorage.setItem(resumeKey, session.upload_id)
+    }
+    onProgress?.(Math.round((session.received_bytes / session.total_size) * 100))
+
+    let retries = 0
+    while (session.next_chunk < session.total_chunks) {
+      const index: number = session.next_chunk
+      const start = index * session.chunk_size
+      const chunk = audioFile.slice(start, Math.min(audioFile.size, start + session.chunk_size))
+      try {
+        session = (await api.put(`${base}/${session.upload_id}/chunks/${index}`, chunk, {
+          headers: { 'Content-Type': 'application/octet-stream' },
+          timeout: UPLOAD_CHUNK_TIMEOUT_MS
+        })).data as UploadSessionStatus
+        retries = 0
+        onProgress?.(Math.round((session.received_bytes / session.total_size) * 100))
+      } catch (e: any) {
+        const status = e?.response?.status
+        // 网络错误、超时、5xx、409（顺序错乱）可以重试；其他 4xx 说明会话已失效或文件不合法
+        const retryable = !status || status >= 500 || status === 409
+        if (!retryable || ++retries > UPLOAD_CHUNK_MAX_RETRIES) {
+          if (status === 404) localStorage.removeItem(resumeKey)
+          throw e
+        }
+        await sleep(Math.min(1000 * 2 ** retries, UPLOAD_RETRY_MAX_DELAY_MS))
+        // 以服务器记录的进度为准（上一个分块可能其实已经写入成功，只是响应丢了）
+        try {
+          session = (await api.get(`${base}/${session.upload_id}`)).data as UploadSessionStatus
+        } catch {
+          // 仍然断网：保持当前进度，下一轮重试同一分块
+        }
+      }
+    }
+
+    const res = await api.post(`${base}/${session.upload_id}/finalize`, null, {
+      timeout: UPLOAD_CHUNK_TIMEOUT_MS
     })
-    return res.data as { temp_audio_id: string; duration_seconds: number; original_filename: string }
+    localStorage.removeItem(resumeKey)
+    return res.data as UploadAudioResult
+  }
+
+  /**
+   * 获取已上传音频的波形峰值（无法解码的音频返回 null，时间轴退回无波形显示）
+   */
+  async function getAudioPeaks(tempAudioId: string) {
+    try {
+      const res = await api.get('/api/listening/peaks', { params: { temp_audio_id: tempAudioId } })
+      return res.data as AudioPeaks
+    } catch {
+      return null
+    }
   }
 
   /**
    * 自动对齐时间戳（调用腾讯云ASR + 文本相似度匹配）
    */
   async function alignTimestamps(tempAudioId: string, articleContent: string) {
-    const res = await api.post('/api/listening/align-timestamps', {
-      temp_audio_id: tempAudioId,
-      article_content: articleContent
-    })
-    return res.data as { paragraphs: ParagraphTimestamp[]; audio_duration_seconds: number }
+    const body = { temp_audio_id: tempAudioId, article_content: articleContent }
+    let res = await api.post('/api/listening/align-timestamps', body)
+    let result = res.data as AlignTimestampsResult
+
+    // 识别在后台进行：轮询任务状态，完成后再请求一次拿对齐结果（识别结果会被复用，不会重复识别）
+    if (result.status === 'pending' || result.status === 'submitted') {
+      let job: { status: string; error: string | null }
+      do {
+        await new Promise(resolve => setTimeout(resolve, ASR_JOB_POLL_INTERVAL_MS))
+        job = (await api.get(`/api/listening/asr-jobs/${result.job_id}`)).data
+      } while (job.status === 'pending' || job.status === 'submitted')
+
+      if (job.status !== 'succeeded') throw new Error(job.error || '语音识别失败')
+      res = await api.post('/api/listening/align-timestamps', body)
+      result = res.data as AlignTimestampsResult
+    }
+
+    if (result.status !== 'succeeded') throw new Error(result.error || '语音识别失败')
+    return result
   }
 
   /**
@@ -144,10 +290,11 @@ export const useListeningStore = defineStore('listening', () => {
   /**
    * 双击单词，AI给出上下文中的中文释义
    */
-  async function lookupWord(word: string, articleContext: string) {
+  async function lookupWord(word: string, articleContext: string, wordOffset: number | null = null) {
     const res = await api.post('/api/listening/lookup-word', {
       word,
-      article_context: articleContext
+      article_context: articleContext,
+      word_offset: wordOffset
     })
     return res.data as { word: string; chinese_meaning: string }
   }
@@ -174,7 +321,9 @@ export const useListeningStore = defineStore('listening', () => {
     loading,
     ocrImage,
     translateArticle,
+    translateArticleStream,
     uploadAudio,
+    getAudioPeaks,
     alignTimestamps,
     saveArticle,
     updateArticle,
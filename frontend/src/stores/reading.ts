@@ -5,6 +5,7 @@
 import { defineStore } from 'pinia'
 import { ref } from 'vue'
 import api from '@/api/config'
+import { postEventStream, type StreamEvent } from '@/api/sse'
 
 export interface WordItem {
   english: string
@@ -22,32 +23,106 @@ export interface ReadingArticle {
   created_at: string
 }
 
+export interface GenerateResult {
+  article: string
+  translation: string[]
+  word_count: number
+  words_used: WordItem[]
+}
+
+export interface GenerateJob {
+  job_id: string
+  status: 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled'
+  stage: string | null
+  stages: string[]
+  partial: { article?: string; word_count?: number; translation?: string[] }
+  result: GenerateResult | null
+  error: string | null
+  created_at: string
+  updated_at: string
+}
+
+const GENERATE_JOB_POLL_INTERVAL_MS = 2000
+
 export const useReadingStore = defineStore('reading', () => {
   const loading = ref(false)
+  const currentJobId = ref<string | null>(null)
 
   /**
-   * 调用后端 Gemini 接口生成文章
+   * 生成文章 + 翻译：提交后台任务后轮询结果，HTTP 请求不再一直挂着等LLM
+   * onProgress 会收到阶段性结果（文章生成完即可先展示，再等翻译）
    */
-  async function generateArticle(wordSetName: string, words: WordItem[]) {
+  async function generateArticle(
+    wordSetName: string,
+    words: WordItem[],
+    onProgress?: (job: GenerateJob) => void
+  ) {
     loading.value = true
     try {
-      const res = await api.post('/api/reading/generate', {
+      const submitRes = await api.post('/api/reading/generate-jobs', {
         word_set_name: wordSetName,
         words
       })
-      return res.data as { article: string; translation: string[]; word_count: number; words_used: WordItem[] }
+      let job = submitRes.data as GenerateJob
+      currentJobId.value = job.job_id
+
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, GENERATE_JOB_POLL_INTERVAL_MS))
+        const res = await api.get(`/api/reading/generate-jobs/${job.job_id}`)
+        job = res.data as GenerateJob
+        onProgress?.(job)
+      }
+
+      if (job.status !== 'succeeded' || !job.result) {
+        throw new Error(job.error || (job.status === 'cancelled' ? '已取消生成' : '生成失败'))
+      }
+      return job.result
     } finally {
+      currentJobId.value = null
       loading.value = false
     }
   }
 
+  /**
+   * 流式生成文章 + 翻译（SSE）：边生成边回调，几秒内就能看到文章开头
+   * onEvent 事件：article_delta / article_revised / article / paragraph（见后端 /generate-stream）
+   */
+  async function generateArticleStream(
+    wordSetName: string,
+    words: WordItem[],
+    onEvent: (evt: StreamEvent) => void,
+    signal?: AbortSignal
+  ) {
+    loading.value = true
+    try {
+      const result = await postEventStream(
+        '/api/reading/generate-stream',
+        { word_set_name: wordSetName, words },
+        onEvent,
+        signal
+      )
+      return result as GenerateResult
+    } finally {
+      loading.value = false
+    }
+  }
+
+  /**
+   * 取消正在进行的生成任务
+   */
+  async function cancelGenerate() {
+    if (!currentJobId.value) return
+    await api.delete(`/api/reading/generate-jobs/${currentJobId.value}`)
+  }
+
   /**
    * 双击单词，AI 给出上下文中的中文释义
    */
-  async function lookupWord(word: string, articleContext: string) {
+  async function lookupWord(word: string, articleContext: string, wordOffset: number | null = null) {
     const res = await api.post('/api/reading/lookup-word', {
       word,
-      article_context: articleContext
+      article_context: articleContext,
+      word_offset: wordOffset
     })
     return res.data as { word: string; chinese_meaning: string }
   }
@@ -140,6 +215,8 @@ export const useReadingStore = defineStore('reading', () => {
   return {
     loading,
     generateArticle,
+    generateArticleStream,
+    cancelGenerate,
     lookupWord,
     saveArticle,
     updateArticle,